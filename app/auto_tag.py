@@ -0,0 +1,57 @@
+import argparse
+import time
+
+from tqdm import tqdm
+
+from config import TAGGER_BATCH_SIZE, TAGGER_PROCESSES
+from db.engine import engine
+from db.ingest import tag_untagged_images
+from db.migrate import migrate
+from db.models import Base
+from db.query import count_untagged_images, reset_tagged_at
+from utils.tagger import TAGGERS
+
+
+# 登録済みで未処理の画像にタガーを流し、タグと埋め込みを保存する（中断しても再開できる）
+def auto_tag(args: argparse.Namespace):
+    Base.metadata.create_all(engine)
+    migrate(engine)
+    if args.redo:
+        reset_tagged_at()
+
+    options = {"cost_ms": args.cost_ms} if args.cost_ms is not None else {}
+    total = count_untagged_images()
+    if args.limit is not None:
+        total = min(total, args.limit)
+    start = time.perf_counter()
+    with tqdm(total=total, unit="枚") as progress:
+        tagged = tag_untagged_images(
+            args.tagger,
+            processes=args.processes,
+            batch_size=args.batch_size,
+            limit=args.limit,
+            on_batch=progress.update,
+            **options,
+        )
+    seconds = time.perf_counter() - start
+    print(
+        f"✅ {tagged} 件にタグを付与（{seconds:.1f} 秒 / "
+        f"{tagged / seconds if seconds else 0:,.1f} 枚/秒）"
+    )
+    if tagged < total:
+        print(f"⚠ 読み込めなかった画像 {total - tagged} 件は次回に再試行します")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="画像に自動でタグを付ける")
+    parser.add_argument(
+        "--tagger", default="hash", help=f"{' / '.join(TAGGERS)} か module:Class"
+    )
+    parser.add_argument("--processes", type=int, default=TAGGER_PROCESSES)
+    parser.add_argument("--batch-size", type=int, default=TAGGER_BATCH_SIZE)
+    parser.add_argument("--limit", type=int, help="処理する最大件数")
+    parser.add_argument(
+        "--cost-ms", type=float, help="hash タガーで模擬する1枚あたりの推論時間"
+    )
+    parser.add_argument("--redo", action="store_true", help="処理済みの画像もやり直す")
+    auto_tag(parser.parse_args())
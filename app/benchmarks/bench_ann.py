@@ -0,0 +1,87 @@
+"""近似最近傍索引 (IVF-PQ) の再現率と速度を総当たり検索と比較
+
+使い方:
+    python -m benchmarks.bench_ann --vectors 200000 --queries 200
+    python -m benchmarks.bench_ann --nprobe 8 16 32 --rerank 0 100 400
+
+索引は一時ディレクトリに保存して mmap で開き直してから計測する。
+nprobe と rerank の組み合わせごとに recall@k と1クエリあたりの時間を報告する。
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.measure import peak_rss_mb
+from benchmarks.synthetic import create_embeddings
+from config import ANN_PQ_M, EMBEDDING_DIM
+
+
+def recall_at_k(truth: list[list[tuple[int, float]]], found) -> float:
+    hits = [
+        len({i for i, _ in t} & {i for i, _ in f}) / max(1, len(t))
+        for t, f in zip(truth, found)
+    ]
+    return float(np.mean(hits))
+
+
+def timed(search, queries) -> tuple[list, float]:
+    """1クエリずつ検索し、結果と1件あたりのミリ秒を返す"""
+    start = time.perf_counter()
+    results = [search(q) for q in queries]
+    return results, (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def main():
+    from utils.ann import IVFPQIndex
+    from utils.embedding import EmbeddingIndex
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIM)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--lists", type=int, default=0, help="リスト数（既定は自動）")
+    parser.add_argument("--m", type=int, default=ANN_PQ_M)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 16, 64])
+    parser.add_argument("--rerank", type=int, nargs="+", default=[0, 100, 400])
+    args = parser.parse_args()
+
+    print(f"🧪 合成埋め込み作成中: {args.vectors} 件 × {args.dim} 次元")
+    ids, vectors = create_embeddings(args.vectors + args.queries, args.dim)
+    queries = vectors[: args.queries]
+    ids, vectors = ids[args.queries :], vectors[args.queries :]
+
+    exact = EmbeddingIndex(ids, vectors)
+    truth, exact_ms = timed(lambda q: exact.search(q, args.k)[0], queries)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        IVFPQIndex.build(ids, vectors, n_lists=args.lists, m=args.m).save(Path(tmp))
+        build_sec = time.perf_counter() - start
+        index = IVFPQIndex.open(Path(tmp))
+        print(
+            f"リスト {index.n_lists} / サブ空間 {index.m} / 構築 {build_sec:.1f} 秒"
+            f" / 総当たり {exact_ms:.2f} ms/クエリ"
+        )
+        print(f"{'nprobe':>8}{'rerank':>8}{f'recall@{args.k}':>12}{'ms/query':>10}")
+        for nprobe in args.nprobe:
+            for rerank in args.rerank:
+                found, ms = timed(
+                    lambda q, nprobe=nprobe, rerank=rerank: index.search(
+                        q, args.k, nprobe, rerank
+                    )[0],
+                    queries,
+                )
+                print(
+                    f"{nprobe:>8}{rerank:>8}"
+                    f"{recall_at_k(truth, found):>12.3f}{ms:>10.2f}"
+                )
+    print(f"最大RSS {peak_rss_mb():.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
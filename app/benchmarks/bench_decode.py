@@ -0,0 +1,92 @@
+"""サムネイル生成のデコード方式ごとの速度とメモリ使用量の比較
+
+使い方:
+    python -m benchmarks.bench_decode --jpeg 20 --png 5
+    python -m benchmarks.bench_decode --dir images/linked  # 既存の画像で計測
+
+各方式は別プロセスで実行し、1コアあたりの images/sec と最大RSSを報告する。
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.measure import peak_rss_mb
+from config import SUPPORTED_FORMATS, THUMBNAIL_SIZE
+
+
+def run_worker(mode: str, image_dir: Path) -> None:
+    """1つのデコード方式で全画像をサムネイル化し、結果をJSONで出力"""
+    from utils.image import ImageProcessor
+
+    processor = ImageProcessor(THUMBNAIL_SIZE, decode_mode=mode)
+    paths = sorted(
+        p for p in image_dir.rglob("*") if p.suffix.lower() in SUPPORTED_FORMATS
+    )
+    start = time.perf_counter()
+    for path in paths:
+        processor.resize_image(path, THUMBNAIL_SIZE, channel="RGB")
+    elapsed = time.perf_counter() - start
+    print(
+        json.dumps(
+            {
+                "mode": mode,
+                "images": len(paths),
+                "seconds": elapsed,
+                "images_per_sec": len(paths) / elapsed if elapsed else 0.0,
+                "peak_rss_mb": peak_rss_mb(),
+            }
+        )
+    )
+
+
+def run(image_dir: Path, modes: list[str]) -> None:
+    print(f"{'mode':<10}{'images':>8}{'images/sec':>12}{'peak RSS(MB)':>14}")
+    for mode in modes:
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_decode", "--worker", mode]
+            + ["--dir", str(image_dir)],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        print(
+            f"{r['mode']:<10}{r['images']:>8}"
+            f"{r['images_per_sec']:>12.2f}{r['peak_rss_mb']:>14.1f}"
+        )
+
+
+def main():
+    from utils.image import DECODE_MODES
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jpeg", type=int, default=20, help="24MPのJPEGの枚数")
+    parser.add_argument("--png", type=int, default=5, help="12MPのPNGの枚数")
+    parser.add_argument("--modes", nargs="+", default=list(DECODE_MODES))
+    parser.add_argument("--dir", type=Path, help="合成せずに既存の画像を計測")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.dir)
+        return
+    if args.dir:
+        run(args.dir, args.modes)
+        return
+
+    from benchmarks.synthetic import create_images
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"🧪 合成画像作成中: JPEG(6000x4000) {args.jpeg} 枚 / PNG {args.png} 枚")
+        create_images(Path(tmp) / "jpeg", args.jpeg, (6000, 4000), "JPEG")
+        create_images(Path(tmp) / "png", args.png, (4000, 3000), "PNG")
+        run(Path(tmp), args.modes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+"""取り込みとギャラリー表示の主要な処理を合成ライブラリで計測し、基準の結果と比較
+
+使い方:
+    python -m benchmarks.bench_suite --images 300 --rows 100000
+    python -m benchmarks.bench_suite --save-baseline   # 今回の結果を基準として保存
+    python -m benchmarks.bench_suite --cases gallery_page_deep add_image_entries
+    python -m benchmarks.bench_suite --workdir /tmp/bench  # 合成データを残して使い回す
+
+実画像の合成ライブラリと、画像エントリを --rows 件登録した data.db を作り、
+各ケースを --repeat 回ずつ計測して中央値を JSON に書き出す。
+基準 (--baseline) があれば比較し、中央値が --tolerance を超えて遅くなった
+ケースがあれば終了コード 1 を返す。
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+from benchmarks.measure import peak_rss_mb
+from benchmarks.synthetic import (
+    DEFAULT_FORMAT_MIX,
+    create_image_library,
+    parse_format_mix,
+    populate_database,
+)
+from config import GALLERY_PAGE_SIZE, SHADOW_OFFSET, THUMBNAIL_SIZE
+
+RESULTS_PATH = Path(__file__).with_name("results.json")
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+RESULTS_VERSION = 1
+# ギャラリーのクエリは1回が短いので、1回の計測でこの回数だけ繰り返す
+QUERIES_PER_RUN = 200
+JUMPS_PER_RUN = 20  # ページ番号への移動（OFFSET で数える）は重いので少なくする
+
+
+@dataclass
+class Case:
+    name: str
+    run: Callable[[], int]  # 処理した件数を返す
+    setup: Callable[[], None] | None = None  # 毎回の計測の前に呼ぶ（時間に含めない）
+
+
+@dataclass(slots=True)
+class Comparison:
+    name: str
+    baseline_sec: float
+    current_sec: float
+    ratio: float
+    regressed: bool
+
+
+def measure(case: Case, repeat: int) -> dict:
+    runs = []
+    items = 0
+    for _ in range(repeat):
+        if case.setup:
+            case.setup()
+        start = time.perf_counter()
+        items = case.run()
+        runs.append(time.perf_counter() - start)
+    median = statistics.median(runs)
+    return {
+        "items": items,
+        "runs_sec": runs,
+        "median_sec": median,
+        "min_sec": min(runs),
+        "ms_per_item": median * 1000 / items if items else None,
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[Comparison]:
+    """両方にあるケースの中央値を比べる（ratio > 1 なら遅くなった）"""
+    comparisons = []
+    for name, result in current["cases"].items():
+        base = baseline["cases"].get(name)
+        if base is None or not base["median_sec"]:
+            continue
+        ratio = result["median_sec"] / base["median_sec"]
+        comparisons.append(
+            Comparison(
+                name,
+                base["median_sec"],
+                result["median_sec"],
+                ratio,
+                ratio > 1 + tolerance,
+            )
+        )
+    return comparisons
+
+
+class Workload:
+    """合成ライブラリとDBを用意し、計測するケースを組み立てる"""
+
+    def __init__(self, workdir: Path, args: argparse.Namespace):
+        from sqlalchemy import create_engine
+
+        from db import query
+        from db.engine import configure_sqlite
+        from utils.image import ImageFileManager, ImageProcessor
+
+        self.workdir = workdir
+        self.rows = args.rows
+        image_dir = workdir / "images"
+        if not image_dir.exists():
+            print(
+                f"🧪 合成ライブラリ作成中: {args.images} 枚"
+                f" ({args.size[0]}x{args.size[1]}, {args.formats})"
+            )
+            create_image_library(workdir, args.images, args.size, args.formats)
+
+        db_path = workdir / "data.db"
+        is_new = not db_path.exists()
+        self.engine = configure_sqlite(create_engine(f"sqlite:///{db_path}"))
+        if is_new:
+            print(f"🧪 合成DB作成中: {args.rows:,} 件")
+            populate_database(self.engine, args.rows)
+        else:
+            # 使い回すDBからは、前回の計測で取り込んだ分を消しておく
+            with self.engine.begin() as conn:
+                conn.exec_driver_sql("DELETE FROM images WHERE id > ?", (self.rows,))
+        # クエリ関数は db.query.engine を使うので、合成DBに差し替える
+        query.engine = self.engine
+
+        self.processor = ImageProcessor(THUMBNAIL_SIZE)
+        self.file_manager = ImageFileManager(image_dir, workdir / "thumbnails")
+        self.image_paths = self.file_manager.find_unregistered_images(set())
+        self.entries: list[tuple[Path, Path]] = []
+
+    def close(self) -> None:
+        self.engine.dispose()
+
+    # ---------------- Library ----------------
+
+    def _find_unregistered(self) -> int:
+        return len(self.file_manager.find_unregistered_images(set()))
+
+    def _clear_thumbnails(self) -> None:
+        shutil.rmtree(self.file_manager.thumb_dir, ignore_errors=True)
+
+    def _generate_thumbnails(self) -> int:
+        self.entries = self.file_manager.generate_thumbnails(
+            self.image_paths, self.processor
+        )
+        return len(self.entries)
+
+    def _ensure_thumbnails(self) -> None:
+        if not self.entries:
+            self._clear_thumbnails()
+            self._generate_thumbnails()
+
+    def _reset_ingested(self) -> None:
+        """前回の計測で登録した実画像のエントリを消す（合成分は残す）"""
+        from db import query
+
+        self._ensure_thumbnails()
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql("DELETE FROM images WHERE id > ?", (self.rows,))
+        query.invalidate_entry_counts()
+
+    def _add_image_entries(self) -> int:
+        from db.query import add_image_entries
+
+        return add_image_entries(self.entries)
+
+    def _clear_renders(self) -> None:
+        from utils.image import rendered_paths
+
+        self._ensure_thumbnails()
+        for _, thumb in self.entries:
+            for path in rendered_paths(thumb, THUMBNAIL_SIZE, SHADOW_OFFSET):
+                path.unlink(missing_ok=True)
+
+    def _create_thumbnails_with_shadow(self) -> int:
+        for _, thumb in self.entries:
+            self.processor.create_thumbnail_with_shadow(
+                thumb, THUMBNAIL_SIZE, SHADOW_OFFSET
+            )
+        return len(self.entries)
+
+    # ---------------- Gallery ----------------
+
+    def _anchors(self, count: int) -> list[int]:
+        # 毎回同じ位置を引くよう、呼び出しごとに同じ種から作る
+        rng = random.Random(0)
+        return [rng.randrange(self.rows) for _ in range(count)]
+
+    def _pages(self, anchors: list[int], favorites_only: bool = False) -> int:
+        from db.query import get_gallery_page
+
+        for anchor in anchors:
+            get_gallery_page(anchor, GALLERY_PAGE_SIZE, favorites_only)
+        return len(anchors)
+
+    def _jumps(self) -> int:
+        from db.query import get_page_anchor
+
+        for offset in self._anchors(JUMPS_PER_RUN):
+            get_page_anchor(offset)
+        return JUMPS_PER_RUN
+
+    def _counts(self) -> int:
+        from db.query import count_image_entries, invalidate_entry_counts
+
+        for i in range(QUERIES_PER_RUN):
+            invalidate_entry_counts()
+            count_image_entries(favorites_only=bool(i % 2))
+        return QUERIES_PER_RUN
+
+    def _first_pages(self) -> int:
+        return self._pages([0] * QUERIES_PER_RUN)
+
+    def _deep_pages(self) -> int:
+        return self._pages(self._anchors(QUERIES_PER_RUN))
+
+    def _favorite_pages(self) -> int:
+        return self._pages(self._anchors(QUERIES_PER_RUN), favorites_only=True)
+
+    def cases(self, names: list[str] | None = None) -> list[Case]:
+        return [
+            Case(name, getattr(self, run), setup and getattr(self, setup))
+            for name, (run, setup) in CASES.items()
+            if not names or name in names
+        ]
+
+
+# ケース名 → (計測するメソッド, 毎回の前準備)。
+# ギャラリーは合成分だけの状態で測るため、取り込みより先に並べる
+CASES = {
+    "gallery_page_first": ("_first_pages", None),
+    "gallery_page_deep": ("_deep_pages", None),
+    "gallery_page_favorites": ("_favorite_pages", None),
+    "gallery_page_jump": ("_jumps", None),
+    "gallery_count": ("_counts", None),
+    "find_unregistered_images": ("_find_unregistered", None),
+    "generate_thumbnails": ("_generate_thumbnails", "_clear_thumbnails"),
+    "add_image_entries": ("_add_image_entries", "_reset_ingested"),
+    "create_thumbnail_with_shadow": (
+        "_create_thumbnails_with_shadow",
+        "_clear_renders",
+    ),
+    "create_thumbnail_with_shadow_cached": (
+        "_create_thumbnails_with_shadow",
+        "_ensure_thumbnails",
+    ),
+}
+
+
+def run(workdir: Path, args: argparse.Namespace) -> dict:
+    workload = Workload(workdir, args)
+    results = {}
+    try:
+        print(f"{'case':<38}{'items':>8}{'median(s)':>12}{'ms/item':>10}")
+        for case in workload.cases(args.cases):
+            r = measure(case, args.repeat)
+            results[case.name] = r
+            per_item = f"{r['ms_per_item']:.3f}" if r["ms_per_item"] else "-"
+            print(
+                f"{case.name:<38}{r['items']:>8}{r['median_sec']:>12.4f}{per_item:>10}"
+            )
+    finally:
+        workload.close()
+    return {
+        "version": RESULTS_VERSION,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "params": {
+            "images": args.images,
+            "size": list(args.size),
+            "formats": args.formats,
+            "rows": args.rows,
+            "repeat": args.repeat,
+        },
+        "peak_rss_mb": peak_rss_mb(),
+        "cases": results,
+    }
+
+
+def report_comparison(current: dict, baseline: dict, tolerance: float) -> bool:
+    """比較結果を表示し、遅くなったケースがあれば True を返す"""
+    if current["params"] != baseline.get("params"):
+        print("⚠ 基準と合成データの条件が異なるため、比較は参考値です")
+    comparisons = compare(current, baseline, tolerance)
+    print(f"{'case':<38}{'baseline(s)':>12}{'current(s)':>12}{'ratio':>8}")
+    for c in comparisons:
+        mark = "  ⚠ 遅くなりました" if c.regressed else ""
+        print(
+            f"{c.name:<38}{c.baseline_sec:>12.4f}{c.current_sec:>12.4f}"
+            f"{c.ratio:>8.2f}{mark}"
+        )
+    return any(c.regressed for c in comparisons)
+
+
+def parse_size(text: str) -> tuple[int, int]:
+    width, _, height = text.lower().partition("x")
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=300, help="合成画像の枚数")
+    parser.add_argument("--size", type=parse_size, default=(1600, 1200))
+    parser.add_argument(
+        "--formats",
+        type=parse_format_mix,
+        default=DEFAULT_FORMAT_MIX,
+        help='形式の比率（例: "JPEG=0.7,PNG=0.3"）',
+    )
+    parser.add_argument("--rows", type=int, default=100_000, help="合成DBの件数")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--cases", nargs="+", choices=list(CASES))
+    parser.add_argument("--output", type=Path, default=RESULTS_PATH)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="遅くなったとみなす割合"
+    )
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="結果を基準としても保存"
+    )
+    parser.add_argument(
+        "--workdir", type=Path, help="合成データの置き場所（既にあれば使い回す）"
+    )
+    args = parser.parse_args()
+
+    if args.workdir:
+        args.workdir.mkdir(parents=True, exist_ok=True)
+        results = run(args.workdir, args)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            results = run(Path(tmp), args)
+
+    args.output.write_text(json.dumps(results, indent=2, ensure_ascii=False))
+    print(f"💾 結果を保存しました: {args.output}")
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2, ensure_ascii=False))
+        print(f"💾 基準を保存しました: {args.baseline}")
+        return
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        if report_comparison(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
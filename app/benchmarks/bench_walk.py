@@ -0,0 +1,81 @@
+"""rglob による走査と ParallelWalker の速度比較
+
+使い方:
+    python -m benchmarks.bench_walk --files 200000
+    python -m benchmarks.bench_walk --dir images  # 既存ライブラリ（NAS等）で計測
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.synthetic import create_file_tree
+from config import SCAN_MAX_WORKERS, SUPPORTED_FORMATS
+from utils.scanner import ParallelWalker
+
+
+def rglob_walk(image_dir: Path) -> list[Path]:
+    """従来の find_unregistered_images と同じ走査"""
+
+    def is_image(p: Path) -> bool:
+        return p.suffix.lower() in SUPPORTED_FORMATS and "_thumbnail" not in p.stem
+
+    found: list[Path] = []
+    for img_path in image_dir.rglob("*"):
+        if img_path.is_symlink():
+            found.extend(c for c in img_path.rglob("*") if is_image(c))
+        elif is_image(img_path):
+            found.append(img_path)
+    return found
+
+
+def parallel_walk(image_dir: Path, workers: int) -> tuple[int, float]:
+    """件数と最初の1件が得られるまでの時間を返す"""
+    start = time.perf_counter()
+    first = None
+    count = 0
+    for _ in ParallelWalker(image_dir, max_workers=workers).iter_image_paths():
+        if first is None:
+            first = time.perf_counter() - start
+        count += 1
+    return count, first or 0.0
+
+
+def run(image_dir: Path, workers: int) -> None:
+    start = time.perf_counter()
+    n_rglob = len(rglob_walk(image_dir))
+    t_rglob = time.perf_counter() - start
+    print(f"rglob          : {n_rglob:>8} 件  {t_rglob:8.3f} s")
+
+    start = time.perf_counter()
+    n_parallel, first = parallel_walk(image_dir, workers)
+    t_parallel = time.perf_counter() - start
+    print(
+        f"ParallelWalker : {n_parallel:>8} 件  {t_parallel:8.3f} s"
+        f"  (workers={workers}, 最初の1件まで {first * 1000:.1f} ms)"
+    )
+    if n_rglob != n_parallel:
+        print("⚠ 検出件数が一致しません")
+    print(f"速度比         : x{t_rglob / t_parallel:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=200_000)
+    parser.add_argument("--roots", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=SCAN_MAX_WORKERS)
+    parser.add_argument("--dir", type=Path, help="合成せずに既存のディレクトリを計測")
+    args = parser.parse_args()
+
+    if args.dir:
+        run(args.dir, args.workers)
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"🧪 合成ツリー作成中: {args.files} ファイル / {args.roots} ルート")
+        image_dir = create_file_tree(Path(tmp), args.files, n_roots=args.roots)
+        run(image_dir, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+import sys
+
+
+def peak_rss_mb() -> float:
+    """このプロセスの最大常駐メモリ(MB)"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        import psutil
+
+        return psutil.Process().memory_info().peak_wset / 1024 / 1024
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS はバイト、Linux はキロバイト単位
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
@@ -0,0 +1,181 @@
+import os
+import random
+from pathlib import Path
+
+# 画像以外のファイルも混ぜて、拡張子フィルタの効果を測れるようにする
+DEFAULT_EXTENSIONS = (".jpg", ".png", ".gif", ".txt", ".json", ".xmp")
+
+
+def create_file_tree(
+    base: Path,
+    n_files: int,
+    n_roots: int = 4,
+    files_per_dir: int = 200,
+    depth: int = 3,
+    extensions: tuple[str, ...] = DEFAULT_EXTENSIONS,
+    seed: int = 0,
+) -> Path:
+    """空ファイルで構成された合成ライブラリを作成し、images ディレクトリを返す
+
+    base/sources/root_N に実体を置き、
+    base/images/root_N からシンボリックリンクで参照する。
+    """
+    rng = random.Random(seed)
+    image_dir = base / "images"
+    image_dir.mkdir(parents=True, exist_ok=True)
+    per_root = -(-n_files // n_roots)
+
+    created = 0
+    for r in range(n_roots):
+        source = base / "sources" / f"root_{r}"
+        count = min(per_root, n_files - created)
+        for i in range(count):
+            d = i // files_per_dir
+            parts = [
+                f"d{(d // files_per_dir**k) % files_per_dir}" for k in range(depth)
+            ]
+            directory = source.joinpath(*parts)
+            if i % files_per_dir == 0:
+                directory.mkdir(parents=True, exist_ok=True)
+            ext = rng.choice(extensions)
+            (directory / f"img_{r}_{i}{ext}").touch()
+        created += count
+
+        link = image_dir / f"root_{r}"
+        if not link.exists():
+            os.symlink(source.resolve(), link, target_is_directory=True)
+    return image_dir
+
+
+def create_images(
+    directory: Path,
+    count: int,
+    size: tuple[int, int],
+    fmt: str = "JPEG",
+    seed: int = 0,
+) -> list[Path]:
+    """ノイズとグラデーションを含む実画像を count 枚作成"""
+    from PIL import Image
+
+    directory.mkdir(parents=True, exist_ok=True)
+    ext = {"JPEG": ".jpg", "PNG": ".png", "GIF": ".gif", "BMP": ".bmp"}[fmt]
+    # 同じ絵を使い回し、ファイル名だけ変えて作成時間を抑える
+    noise = Image.effect_noise(size, 64)
+    gradient = Image.linear_gradient("L").resize(size)
+    base = Image.merge("RGB", (noise, gradient, gradient.transpose(0)))
+    rng = random.Random(seed)
+    paths = []
+    for i in range(count):
+        path = directory / f"img_{i:05d}_{rng.randrange(1 << 16):04x}{ext}"
+        if fmt == "JPEG":
+            base.save(path, quality=90)
+        elif fmt == "PNG":
+            base.save(path, compress_level=1)
+        elif fmt == "GIF":
+            base.convert("P").save(path)
+        else:
+            base.save(path)
+        paths.append(path)
+    return paths
+
+
+def create_embeddings(
+    count: int, dim: int, n_clusters: int = 256, noise: float = 0.5, seed: int = 0
+):
+    """クラスタ構造を持つ埋め込みを作成し、(id配列, count×dim行列) を返す
+
+    実際のタグ埋め込みと同じく似た画像同士が固まるよう、重心の周りに散らす。
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, n_clusters, count)]
+    vectors += noise * rng.standard_normal((count, dim)).astype(np.float32)
+    return np.arange(1, count + 1, dtype=np.int64), vectors
+
+
+# 実ライブラリに近い形式の比率（合計は 1 でなくてもよい）
+DEFAULT_FORMAT_MIX = {"JPEG": 0.7, "PNG": 0.2, "GIF": 0.05, "BMP": 0.05}
+
+
+def parse_format_mix(spec: str) -> dict[str, float]:
+    """ "JPEG=0.7,PNG=0.3" の形式を {形式: 比率} にする"""
+    mix = {}
+    for item in spec.split(","):
+        fmt, _, weight = item.partition("=")
+        mix[fmt.strip().upper()] = float(weight or 1)
+    return mix
+
+
+def create_image_library(
+    base: Path,
+    n_images: int,
+    size: tuple[int, int],
+    format_mix: dict[str, float] = DEFAULT_FORMAT_MIX,
+    n_roots: int = 2,
+    seed: int = 0,
+) -> Path:
+    """形式の比率に従って実画像を作成し、create_file_tree と同じ構成で並べる
+
+    base/sources/root_N/<形式> に実体を置き、base/images/root_N からリンクする。
+    images ディレクトリを返す。
+    """
+    image_dir = base / "images"
+    image_dir.mkdir(parents=True, exist_ok=True)
+    total = sum(format_mix.values())
+    counts = {fmt: int(n_images * w / total) for fmt, w in format_mix.items()}
+    # 端数は比率の大きい形式に寄せて、合計を n_images に合わせる
+    counts[max(format_mix, key=format_mix.get)] += n_images - sum(counts.values())
+
+    for r in range(n_roots):
+        source = base / "sources" / f"root_{r}"
+        for i, (fmt, count) in enumerate(counts.items()):
+            share = count // n_roots + (r < count % n_roots)
+            if share:
+                create_images(source / fmt.lower(), share, size, fmt, seed + i + r)
+        link = image_dir / f"root_{r}"
+        if not link.exists():
+            source.mkdir(parents=True, exist_ok=True)
+            os.symlink(source.resolve(), link, target_is_directory=True)
+    return image_dir
+
+
+def populate_database(
+    engine, count: int, favorite_ratio: float = 0.1, seed: int = 0
+) -> None:
+    """ファイルの実体を持たない画像エントリを count 件登録した、最新スキーマのDBを作る
+
+    ページ送りなどのクエリの計測用。お気に入りは favorite_ratio の割合で散らす。
+    """
+    from datetime import datetime, timedelta
+
+    from db.migrate import stamp_latest_version
+    from db.models import Base
+
+    Base.metadata.create_all(engine)
+    stamp_latest_version(engine)
+    rng = random.Random(seed)
+    start = datetime(2020, 1, 1)
+    # SQLAlchemy の DateTime と同じ表記で保存する
+    fmt = "%Y-%m-%d %H:%M:%S.%f"
+    rows = (
+        (
+            f"images/synthetic/{i:08d}.jpg",
+            f"thumbnails/synthetic/{i:08d}.webp",
+            "webp",
+            (start + timedelta(minutes=i)).strftime(fmt),
+            start.strftime(fmt),
+            rng.random() < favorite_ratio,
+            False,
+        )
+        for i in range(count)
+    )
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO images (image_path, thumbnail_path, thumbnail_format, "
+            "created_at, registered_at, is_favorite, is_r18) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            list(rows),
+        )
+        conn.exec_driver_sql("ANALYZE")
@@ -0,0 +1,58 @@
+import argparse
+import time
+from pathlib import Path
+
+from config import ANN_INDEX_DIR, ANN_PQ_M, ANN_TRAIN_SAMPLE
+from db.engine import engine
+from db.migrate import migrate
+from db.models import Base
+from db.query import load_embeddings
+from utils.ann import IVFPQIndex
+
+
+# タグ埋め込みから近似最近傍の索引を作り直す
+def build_ann_index(path: Path, n_lists: int, m: int, sample: int):
+    Base.metadata.create_all(engine)
+    migrate(engine)
+
+    ids, vectors = load_embeddings()
+    if len(ids) == 0:
+        print("⚠ 埋め込みを持つ画像がありません")
+        return
+    print(f"🧮 {len(ids)} 件から索引を学習中...")
+    start = time.perf_counter()
+    index = IVFPQIndex.build(ids, vectors, n_lists=n_lists, m=m, sample=sample)
+    index.save(path)
+    print(
+        f"✅ {path} に保存しました"
+        f"（リスト {index.n_lists} / サブ空間 {index.m} / "
+        f"{time.perf_counter() - start:.1f} 秒）"
+    )
+
+
+# 保存済みの索引に新しい行と差分を取り込む（学習はやり直さない）
+def update_ann_index(path: Path):
+    Base.metadata.create_all(engine)
+    migrate(engine)
+
+    index = IVFPQIndex.open(path)
+    index.add(*load_embeddings(after_id=index.max_id))
+    print(f"🔄 差分 {index.delta_size} 件を取り込み中...")
+    index.compact()
+    print(f"✅ {len(index)} 件の索引を更新しました")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="類似画像検索の近似索引を作成")
+    parser.add_argument("--path", type=Path, default=ANN_INDEX_DIR)
+    parser.add_argument("--lists", type=int, default=0, help="リスト数（既定は自動）")
+    parser.add_argument("--m", type=int, default=ANN_PQ_M, help="サブ空間数")
+    parser.add_argument("--sample", type=int, default=ANN_TRAIN_SAMPLE)
+    parser.add_argument(
+        "--update", action="store_true", help="作り直さずに追加分だけ取り込む"
+    )
+    args = parser.parse_args()
+    if args.update:
+        update_ann_index(args.path)
+    else:
+        build_ann_index(args.path, args.lists, args.m, args.sample)
@@ -3,10 +3,76 @@ from pathlib import Path
 FONT_TYPE = "meiryo"
 FONT_SIZE = 13
 THUMBNAIL_SIZE = (190, 190)
+# サムネイル生成時のデコード方式
+#   "quality": 元の解像度でデコードしてから縮小（従来の動作）
+#   "balanced": JPEGのdraftと reducing_gap=3.0 で見た目をほぼ変えずに高速化
+#   "fast": 画質より速度を優先
+THUMBNAIL_DECODE_MODE = "balanced"
+# サムネイルの保存形式 ("webp" / "jpeg" / "png") と品質（1〜100、pngでは無視）
+THUMBNAIL_FORMAT = "webp"
+THUMBNAIL_QUALITY = 80
 IMAGE_DIR = Path("images")
 THUMB_DIR = Path("thumbnails")
 DB_PATH = "data.db"
+EMBEDDING_DIM = 256  # タグ埋め込み（画像・タグ共通）の次元数
+POSE_EMBEDDING_DIM = 34  # ポーズ埋め込み: 17キーポイント × (x, y)
+SIMILAR_IMAGE_COUNT = 30  # 類似画像パネルに表示する件数
+TAG_SEARCH_INCLUDE_R18 = False  # タグ検索の結果にR18の画像を含めるか
+TAG_SUGGESTION_COUNT = 20  # 検索欄で補完候補として表示するタグの数
+TAG_COMPLETER_POLL_MS = 50  # 補完の索引ができたかを確認する間隔（ミリ秒）
+# 近似最近傍 (IVF-PQ) の索引。build_ann_index.py で作成すると類似画像検索に使う
+ANN_INDEX_DIR = Path("ann_index")
+ANN_NPROBE = 16  # 検索するリスト数（増やすと再現率↑・速度↓）
+ANN_RERANK = 100  # 元ベクトルで再計算する候補数（0 なら量子化の値のまま）
+ANN_PQ_M = 32  # 直積量子化のサブ空間数（1件あたりのコードのバイト数）
+ANN_TRAIN_SAMPLE = 100_000  # 重心とコード表の学習に使う件数
+# 接続ごとに設定するSQLiteのPRAGMA
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",  # 読み込みが書き込みを待たない
+    "synchronous": "NORMAL",  # WALでは電源断時も破損しない
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,  # 負の値はKiB単位（64MB）
+    "temp_store": "MEMORY",
+}
 SUPPORTED_FORMATS = (".jpg", ".jpeg", ".png", ".bmp", ".gif")
+SCAN_MAX_WORKERS = 8  # ディレクトリ走査の並列スレッド数
+INGEST_BATCH_SIZE = 500  # 取り込み時に1トランザクションで登録する件数
+# 起動時の取り込みを、画面を開いてからバックグラウンドで行う
+BACKGROUND_INGEST = True
+BACKGROUND_INGEST_POLL_MS = 200  # 取り込みの進捗を画面に反映する間隔（ミリ秒）
+# 起動中に IMAGE_DIR とリンク先を監視し、追加・削除された画像を取り込む（要 watchdog）
+LIBRARY_WATCH = True
+LIBRARY_WATCH_DEBOUNCE_SEC = 1.0  # 変更が途切れてからまとめて取り込むまでの時間
+LIBRARY_WATCH_MAX_DELAY_SEC = 10.0  # 変更が続いても、最初の変更からこの時間で取り込む
+LIBRARY_WATCH_POLL_MS = 500  # 取り込み結果を画面に反映する間隔（ミリ秒）
+# 取り込み後に実行する自動タグ付け（None なら行わない）。
+# "hash" はモデルを使わない動作確認用。"module:Class" でプラグインを指定できる
+AUTO_TAGGER: str | None = None
+TAGGER_BATCH_SIZE = 32  # 1回の推論にまとめる画像数
+TAGGER_PROCESSES = 2  # タガーを常駐させるプロセス数（モデルのメモリに合わせる）
+TAG_IMPORT_CHUNK_SIZE = 5000  # タグの一括取り込みで1トランザクションに含める画像数
 MARGIN = 10
 SHADOW_OFFSET = 4
 ENABLE_IMAGE_CACHE = True
+# サムネイルの読み込みをバックグラウンドで行い、完了までプレースホルダを表示
+ASYNC_THUMBNAIL_LOADING = True
+THUMBNAIL_LOADER_WORKERS = 4
+THUMBNAIL_LOADER_POLL_MS = 16  # 読み込み結果を確認する間隔（ミリ秒）
+# ギャラリーの表示方式
+#   "pages": 1ページ36枚のページ送り
+#   "virtual": 見えている行だけを描画する無限スクロール
+GALLERY_MODE = "pages"
+GALLERY_PAGE_SIZE = 36
+VIRTUAL_OVERSCAN_ROWS = 2  # 表示範囲の上下に余分に用意しておく行数
+# ページ描画後に前後のページ（と入力中のページ番号）のサムネイルを先読み
+PREFETCH_ADJACENT_PAGES = True
+PREFETCH_WORKERS = 1
+PAGE_INPUT_PREFETCH_DELAY_MS = (
+    300  # ページ番号の入力が止まってから先読みするまで（ミリ秒）
+)
+IMAGE_CACHE_MAX_BYTES = 256 * 1024 * 1024  # デコード済みサムネイルを保持する上限
+# DBクエリ・サムネイル読み込み・ページ描画などの処理時間と件数を集計する
+METRICS_ENABLED = False
+# 集計結果を書き出すファイル。拡張子が .json なら JSON、それ以外は Prometheus 形式
+METRICS_DUMP_PATH = Path("metrics.prom")
+METRICS_DUMP_INTERVAL_SEC = 15
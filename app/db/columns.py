@@ -0,0 +1,39 @@
+import json
+
+import numpy as np
+from sqlalchemy import LargeBinary
+from sqlalchemy.types import TypeDecorator
+
+
+def parse_legacy_vector(value: str) -> np.ndarray:
+    """旧形式（JSON配列・カンマ/空白区切り）の文字列をベクトルに変換"""
+    text = value.strip()
+    if text.startswith("["):
+        return np.asarray(json.loads(text), dtype=np.float32)
+    return np.asarray(text.replace(",", " ").split(), dtype=np.float32)
+
+
+class Float32Vector(TypeDecorator):
+    """固定次元のfloat32ベクトルをリトルエンディアンのBLOBとして保存する列型"""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def __init__(self, dim: int):
+        super().__init__()
+        self.dim = dim
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        vector = np.asarray(value, dtype="<f4").ravel()
+        if vector.shape[0] != self.dim:
+            raise ValueError(f"次元数が {self.dim} ではありません: {vector.shape[0]}")
+        return vector.tobytes()
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            return parse_legacy_vector(value)
+        return np.frombuffer(value, dtype="<f4")
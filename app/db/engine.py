@@ -1,5 +1,20 @@
 # db/engine.py
-from config import DB_PATH
-from sqlalchemy import create_engine
+from sqlalchemy import Engine, create_engine, event
 
-engine = create_engine(f"sqlite:///{DB_PATH}", echo=False)
+from config import DB_PATH, SQLITE_PRAGMAS
+
+
+def configure_sqlite(engine: Engine, pragmas: dict = SQLITE_PRAGMAS) -> Engine:
+    """新しい接続を開くたびにPRAGMAを設定する"""
+
+    @event.listens_for(engine, "connect")
+    def _apply_pragmas(dbapi_connection, _connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    return engine
+
+
+engine = configure_sqlite(create_engine(f"sqlite:///{DB_PATH}", echo=False))
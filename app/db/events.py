@@ -0,0 +1,47 @@
+import threading
+from collections.abc import Callable
+
+
+class Signal:
+    """書き込みの後に呼ばれるコールバックの登録先
+
+    索引やキャッシュなど、DBから派生したデータを差分で更新するために使う。
+    コールバックは書き込んだスレッドでコミット後に呼ばれる。
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._receivers: list[Callable] = []
+        self._lock = threading.Lock()
+
+    def connect(self, receiver: Callable) -> Callable:
+        with self._lock:
+            if receiver not in self._receivers:
+                self._receivers.append(receiver)
+        return receiver
+
+    def disconnect(self, receiver: Callable) -> None:
+        with self._lock:
+            if receiver in self._receivers:
+                self._receivers.remove(receiver)
+
+    def emit(self, *args) -> None:
+        with self._lock:
+            receivers = list(self._receivers)
+        for receiver in receivers:
+            try:
+                receiver(*args)
+            except Exception as e:  # noqa: BLE001 ほかの通知先には届ける
+                print(f"⚠ {self.name} の通知先でエラー: {e}")
+
+
+# 画像を登録した（引数なし）
+images_added = Signal("images_added")
+# 画像を削除した (image_ids)
+images_deleted = Signal("images_deleted")
+# タグを登録した (list[TagInfo])
+tags_added = Signal("tags_added")
+# 画像にタグを付けた (image_ids, tag_ids)。同じ位置の要素が1組
+image_tags_added = Signal("image_tags_added")
+# 埋め込みを更新した (column, image_ids, vectors)
+embeddings_updated = Signal("embeddings_updated")
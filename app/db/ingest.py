@@ -0,0 +1,229 @@
+import os
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass, replace
+from itertools import chain, islice
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from config import INGEST_BATCH_SIZE, TAGGER_BATCH_SIZE, TAGGER_PROCESSES
+from db.query import (
+    add_image_entries,
+    delete_image_entries_by_paths,
+    get_image_ids_by_paths,
+    get_image_paths_under,
+    get_max_image_id,
+    get_registered_image_paths,
+    iter_untagged_images,
+    load_scan_manifest,
+    save_scan_result,
+    save_tagger_results,
+)
+from utils.image import get_image_manager
+from utils.profiling import counter
+from utils.scanner import (
+    RETRY_MTIME_NS,
+    DirState,
+    FileState,
+    ParallelWalker,
+    ScanResult,
+    stat_file_state,
+)
+
+if TYPE_CHECKING:  # watchdog は監視を始めるときに読み込む
+    from utils.library_watcher import LibraryChanges
+
+_tagged_images = counter("auto_tagged_images_total", "自動タグ付けで保存した件数")
+
+
+def _skip_failed(
+    results: Iterable[tuple[Path, Path | None]],
+    file_states: dict[str, FileState] | None,
+    dir_states: dict[str, DirState] | None = None,
+) -> Iterator[tuple[Path, Path]]:
+    """サムネイル化に失敗した画像を除外し、次回のスキャンで再試行されるようにする
+
+    画像のマニフェストを記録せず、ディレクトリも次回は必ず列挙し直すようにする
+    （mtime をそのまま記録すると、次回の差分スキャンで読み飛ばされてしまう）。
+    """
+    for img_path, thumb_path in results:
+        if thumb_path is None:
+            state = file_states.pop(str(img_path), None) if file_states else None
+            if state is not None and dir_states and state.directory in dir_states:
+                dir_states[state.directory] = replace(
+                    dir_states[state.directory], mtime_ns=RETRY_MTIME_NS
+                )
+            continue
+        yield img_path, thumb_path
+
+
+def ingest_images(
+    image_paths: Iterable[Path],
+    file_states: dict[str, FileState] | None = None,
+    batch_size: int = INGEST_BATCH_SIZE,
+    on_batch: Callable[[int], None] | None = None,
+    processes: int | None = None,
+    dir_states: dict[str, DirState] | None = None,
+) -> int:
+    """画像を サムネイル → メタデータ → DB の順に流し、batch_size 件ずつコミット
+
+    各段はジェネレータで繋がっているため、入力の件数によらずメモリ使用量は一定で、
+    DBへの書き込みが進まない間はサムネイル生成も先へ進まない。
+    """
+    thumbnails = get_image_manager().iter_thumbnails(image_paths, processes=processes)
+    return add_image_entries(
+        _skip_failed(thumbnails, file_states, dir_states),
+        batch_size=batch_size,
+        file_states=file_states,
+        on_batch=on_batch,
+    )
+
+
+def sync_library(
+    full_scan: bool = False,
+    batch_size: int = INGEST_BATCH_SIZE,
+    on_batch: Callable[[int], None] | None = None,
+) -> tuple[ScanResult, int]:
+    """ライブラリの差分を走査しながら取り込み、(スキャン結果, 登録件数) を返す"""
+    manifest = load_scan_manifest()
+    # マニフェスト未作成（旧バージョンのDB）は登録済みパスと突き合わせる
+    registered = get_registered_image_paths() if not manifest.files else set()
+
+    result = ScanResult()
+    changes = get_image_manager().iter_library_changes(manifest, result, full=full_scan)
+    inserted = ingest_images(
+        (p for p in changes if str(p) not in registered),
+        file_states=result.file_states,
+        batch_size=batch_size,
+        on_batch=on_batch,
+        dir_states=result.dir_states,
+    )
+
+    if result.removed:
+        delete_image_entries_by_paths(result.removed)
+    save_scan_result(result)
+    return result, inserted
+
+
+@dataclass
+class LibraryUpdate:
+    """監視で取り込んだ変更の結果"""
+
+    added: int = 0
+    removed: int = 0
+    # 表示が変わる最初の画像の id（一覧は id 順なので、これより前のページはそのまま）
+    first_changed_id: int | None = None
+
+    def merge(self, other: "LibraryUpdate") -> "LibraryUpdate":
+        ids = [i for i in (self.first_changed_id, other.first_changed_id) if i]
+        return LibraryUpdate(
+            self.added + other.added,
+            self.removed + other.removed,
+            min(ids) if ids else None,
+        )
+
+
+def _rescan_directory(directory: str) -> tuple[set[str], set[str]]:
+    """directory を歩き直し、(見つかった画像, 消えたと確かめられた登録済みの画像) を返す
+
+    LibraryScanner と同じく、最後まで列挙できたディレクトリに
+    もう無いものだけを消えたとみなす。開けなかったディレクトリの中身は残す。
+    """
+    directory = os.fspath(Path(directory))
+    found: set[str] = set()
+    visited: dict[str, set[str] | None] = {}  # 列挙できなかったものは None
+    for listing in ParallelWalker(Path(directory)).iter_listings():
+        found.update(listing.files)
+        visited[listing.path] = (
+            None
+            if listing.failed
+            else set(listing.files) | {sub for sub, _ in listing.subdirs}
+        )
+
+    gone = set()
+    for path in get_image_paths_under(directory) - found:
+        # 歩けた最も近い祖先で、その子がもう無いかを確かめる
+        child, parent = path, os.path.dirname(path)
+        while parent not in visited and parent != directory and parent != child:
+            child, parent = parent, os.path.dirname(parent)
+        entries = visited.get(parent)
+        if entries is not None and child not in entries:
+            gone.add(path)
+    return found, gone
+
+
+def apply_library_changes(
+    changes: "LibraryChanges", batch_size: int = INGEST_BATCH_SIZE
+) -> LibraryUpdate:
+    """監視で検出した変更を、削除 → 追加の順にDBとマニフェストへ反映する
+
+    通知から時間が経っているので、ファイルの有無は反映する時点で確かめ直す。
+    消えたディレクトリがまた見えていれば、削除せずに走査し直す。
+    """
+    added = {p for p in changes.added if os.path.isfile(p)}
+    removed = {p for p in changes.removed if not os.path.exists(p)}
+    removed_dirs = {d for d in changes.removed_dirs if not os.path.exists(d)}
+    for directory in removed_dirs:
+        removed |= get_image_paths_under(directory)
+    for directory in changes.rescan_dirs | (changes.removed_dirs - removed_dirs):
+        found, gone = _rescan_directory(directory)
+        added |= found
+        removed |= gone
+    added -= removed
+
+    update = LibraryUpdate()
+    changed_ids: list[int] = []
+    if removed:
+        changed_ids.extend(get_image_ids_by_paths(removed).values())
+        update.removed = delete_image_entries_by_paths(removed)
+        save_scan_result(
+            ScanResult(
+                removed={Path(p) for p in removed},
+                removed_dirs=removed_dirs,
+            )
+        )
+    new = sorted(added - get_image_ids_by_paths(added).keys())
+    if new:
+        first_new_id = get_max_image_id() + 1
+        file_states = {}
+        for path in new:
+            try:
+                file_states[path] = stat_file_state(path)
+            except OSError:
+                continue
+        update.added = ingest_images(
+            (Path(p) for p in file_states),
+            file_states=dict(file_states),
+            batch_size=batch_size,
+            processes=min(len(file_states), os.cpu_count() or 1) or 1,
+        )
+        if update.added:
+            changed_ids.append(first_new_id)
+    update.first_changed_id = min(changed_ids) if changed_ids else None
+    return update
+
+
+def tag_untagged_images(
+    tagger: str,
+    processes: int = TAGGER_PROCESSES,
+    batch_size: int = TAGGER_BATCH_SIZE,
+    limit: int | None = None,
+    on_batch: Callable[[int], None] | None = None,
+    **options,
+) -> int:
+    """自動タグ付けがまだの画像をタガーに流し、バッチごとに結果を保存する
+
+    保存と同時に完了日時を書くので、中断しても次回は未処理の画像から再開する。
+    読めなかった画像は未処理のまま残し、次回に再試行する。
+    """
+    images = chain.from_iterable(iter_untagged_images(batch_size * processes))
+    from utils.tagger import TaggerPool  # プロセスプールは使うときだけ読み込む
+
+    saved = 0
+    with TaggerPool(tagger, processes, batch_size, **options) as pool:
+        for batch in pool.iter_results(islice(images, limit)):
+            count = save_tagger_results([(i, r) for i, r in batch if r is not None])
+            saved += count
+            _tagged_images.inc(count)
+            if on_batch:
+                on_batch(count)
+    return saved
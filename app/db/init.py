@@ -1,36 +1,68 @@
+from sqlalchemy import inspect
+
+from config import AUTO_TAGGER
 from db.engine import engine
+from db.ingest import sync_library, tag_untagged_images
+from db.migrate import migrate, stamp_latest_version
 from db.models import Base
-from db.query import add_image_entries, get_registered_image_paths
-from tqdm import tqdm
-from utils.folder import image_link_manager
-from utils.image import image_manager
+from db.query import count_untagged_images, has_image_entries
+from utils.folder import get_image_link_manager
+from utils.image import get_image_manager
+
 
+def prepare_database(parent=None):
+    """スキーマの作成・更新など、ギャラリーを表示する前に済ませておく短い処理
 
-def initialize_database():
+    parent を渡すと、フォルダ選択のダイアログをそのウィンドウの上に開く。
+    """
     print("📦 初期化処理開始: データベース作成")
+    is_new = not inspect(engine).has_table("images")
     Base.metadata.create_all(engine)
+    if is_new:
+        stamp_latest_version(engine)
+    for description in migrate(engine):
+        print(f"🛠 スキーマを更新: {description}")
+    removed = get_image_manager().invalidate_stale_renders()
+    if removed:
+        print(f"🧹 サムネイルの表示設定が変わったため {removed} 件の影付き画像を削除")
 
-    print("🔍 未登録画像パスを取得中...")
-    registered = get_registered_image_paths()
-    if not registered:
+    link_manager = get_image_link_manager()  # 作成時にリンク切れを掃除する
+    if not has_image_entries():
         print("⚠️ 画像がまだ登録されていません。画像フォルダを選択してください。")
-        selected_folder = image_link_manager.select_image_folder()
+        selected_folder = link_manager.select_image_folder(parent)
         if selected_folder:
-            image_link_manager.create_symlink(selected_folder)
-    unregistered = image_manager.find_unregistered_images(registered)
-    if not unregistered:
-        print("✅ すでに全ての画像が登録されています。")
-        return
+            link_manager.create_symlink(selected_folder)
 
-    print("🖼 サムネイル画像の生成中...")
-    image_paths = image_manager.generate_thumbnails(tqdm(unregistered))
 
-    print(f"📥 {len(image_paths)} 件の画像をDBに登録中...")
-    add_image_entries(tqdm(image_paths))
+def initialize_database(full_scan: bool = False):
+    """ライブラリの取り込みまでを終えてから戻る（画面を開く前に全件を登録する）"""
+    from tqdm import tqdm
 
+    prepare_database()
+    print("🔍 ライブラリの変更を検出しながら登録中...")
+    with tqdm(unit="枚") as progress:
+        result, inserted = sync_library(full_scan=full_scan, on_batch=progress.update)
+    print(
+        f"   新規・変更 {inserted} 件を登録 / 削除 {len(result.removed)} 件 "
+        f"（変更のないディレクトリ {result.skipped_dirs} 件をスキップ）"
+    )
+
+    untagged = count_untagged_images() if AUTO_TAGGER else 0
+    if untagged:
+        print(f"🏷 自動タグ付け中（{AUTO_TAGGER}）...")
+        with tqdm(total=untagged, unit="枚") as progress:
+            tagged = tag_untagged_images(AUTO_TAGGER, on_batch=progress.update)
+        print(f"   {tagged} 件にタグを付与")
+
+    if not result.has_changes:
+        print("✅ すでに全ての画像が登録されています。")
+        return
     print("\n✅ 初期化完了")
 
 
 def dispose_engine():
     print("🧹 Disposing SQLAlchemy engine...")
+    with engine.connect() as conn:
+        # 終了時に統計情報を必要な分だけ更新しておく
+        conn.exec_driver_sql("PRAGMA optimize")
     engine.dispose()
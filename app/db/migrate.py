@@ -0,0 +1,114 @@
+from collections.abc import Callable
+
+from sqlalchemy import Connection, Engine, inspect
+
+from config import EMBEDDING_DIM, POSE_EMBEDDING_DIM
+from db.columns import parse_legacy_vector
+
+# PRAGMA user_version に記録したバージョンより新しいものだけを順に適用する。
+# 途中で中断しても再実行できるよう、各マイグレーションは冪等に書くこと。
+# 新しいDBは create_all で最新のスキーマが作られるため stamp_latest_version で記録する。
+
+
+def _add_thumbnail_format(conn: Connection) -> None:
+    columns = {c["name"] for c in inspect(conn).get_columns("images")}
+    if "thumbnail_format" not in columns:
+        conn.exec_driver_sql(
+            "ALTER TABLE images ADD COLUMN thumbnail_format VARCHAR DEFAULT 'png'"
+        )
+
+
+def _add_gallery_and_tag_indexes(conn: Connection) -> None:
+    # 一意索引を張る前に重複したタグ付けを1件に絞る
+    conn.exec_driver_sql(
+        "DELETE FROM image_tags WHERE id NOT IN "
+        "(SELECT MIN(id) FROM image_tags GROUP BY image_id, tag_id)"
+    )
+    for sql in (
+        "CREATE INDEX IF NOT EXISTS ix_images_favorite_id ON images (is_favorite, id)",
+        "CREATE INDEX IF NOT EXISTS ix_images_r18_id ON images (is_r18, id)",
+        "CREATE INDEX IF NOT EXISTS ix_images_created_at_id ON images (created_at, id)",
+        (
+            "CREATE UNIQUE INDEX IF NOT EXISTS ux_image_tags_image_tag "
+            "ON image_tags (image_id, tag_id)"
+        ),
+        (
+            "CREATE INDEX IF NOT EXISTS ix_image_tags_tag_image "
+            "ON image_tags (tag_id, image_id)"
+        ),
+    ):
+        conn.exec_driver_sql(sql)
+    conn.exec_driver_sql("ANALYZE")
+
+
+def _convert_embeddings_to_blobs(conn: Connection) -> None:
+    """文字列で保存されていた埋め込みをfloat32のBLOBに変換"""
+    for table, column, dim in (
+        ("images", "tag_embedding", EMBEDDING_DIM),
+        ("images", "pose_embedding", POSE_EMBEDDING_DIM),
+        ("tags", "embedding", EMBEDDING_DIM),
+    ):
+        rows = conn.exec_driver_sql(
+            f"SELECT id, {column} FROM {table} WHERE typeof({column}) = 'text'"
+        ).fetchall()
+        updates = []
+        for row_id, text in rows:
+            try:
+                vector = parse_legacy_vector(text)
+            except ValueError:
+                vector = None
+            # 読めない値や次元の違う値は捨てて、再計算の対象にする
+            blob = (
+                vector.astype("<f4").tobytes()
+                if vector is not None and vector.shape == (dim,)
+                else None
+            )
+            updates.append((blob, row_id))
+        if updates:
+            conn.exec_driver_sql(
+                f"UPDATE {table} SET {column} = ? WHERE id = ?", updates
+            )
+
+
+def _add_tagged_at(conn: Connection) -> None:
+    columns = {c["name"] for c in inspect(conn).get_columns("images")}
+    if "tagged_at" not in columns:
+        conn.exec_driver_sql("ALTER TABLE images ADD COLUMN tagged_at DATETIME")
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_images_tagged_at_id ON images (tagged_at, id)"
+    )
+
+
+MIGRATIONS: list[tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "images.thumbnail_format を追加", _add_thumbnail_format),
+    (2, "ギャラリーとタグ検索用の索引を追加", _add_gallery_and_tag_indexes),
+    (3, "埋め込みをfloat32のBLOBに変換", _convert_embeddings_to_blobs),
+    (4, "images.tagged_at（自動タグ付けの再開位置）を追加", _add_tagged_at),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: Connection) -> int:
+    return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def stamp_latest_version(engine: Engine) -> None:
+    """create_all で作ったばかりのDBを最新バージョンとして記録"""
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"PRAGMA user_version = {LATEST_VERSION}")
+
+
+def migrate(engine: Engine) -> list[str]:
+    """未適用のマイグレーションを適用し、適用したものの説明を返す"""
+    with engine.connect() as conn:
+        version = get_schema_version(conn)
+    applied = []
+    for target, description, upgrade in MIGRATIONS:
+        if target <= version:
+            continue
+        with engine.begin() as conn:
+            upgrade(conn)
+            conn.exec_driver_sql(f"PRAGMA user_version = {target}")
+        applied.append(description)
+    return applied
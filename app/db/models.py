@@ -1,8 +1,19 @@
 from datetime import datetime
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+)
 from sqlalchemy.orm import declarative_base, relationship
 
+from config import EMBEDDING_DIM, POSE_EMBEDDING_DIM
+from db.columns import Float32Vector
+
 Base = declarative_base()
 
 
@@ -11,16 +22,26 @@ class ImageEntry(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     image_path = Column(String, unique=True, nullable=False)
     thumbnail_path = Column(String, unique=True, nullable=False)
-    tag_embedding = Column(Text)
-    pose_embedding = Column(Text)
+    thumbnail_format = Column(String, default="png")
+    tag_embedding = Column(Float32Vector(EMBEDDING_DIM))
+    pose_embedding = Column(Float32Vector(POSE_EMBEDDING_DIM))
     created_at = Column(DateTime)
     registered_at = Column(DateTime, default=datetime.now())
     is_favorite = Column(Boolean, default=False)
     is_r18 = Column(Boolean, default=False)
+    tagged_at = Column(DateTime)  # 自動タグ付けの完了日時（未処理なら NULL）
     image_tags = relationship(
         "ImageTag", back_populates="image", cascade="all, delete-orphan"
     )
 
+    __table_args__ = (
+        # お気に入り・R18での絞り込みをidのキーセット順のまま引く
+        Index("ix_images_favorite_id", "is_favorite", "id"),
+        Index("ix_images_r18_id", "is_r18", "id"),
+        Index("ix_images_created_at_id", "created_at", "id"),
+        Index("ix_images_tagged_at_id", "tagged_at", "id"),
+    )
+
 
 class Tag(Base):
     __tablename__ = "tags"
@@ -29,7 +50,7 @@ class Tag(Base):
     tag = Column(String, unique=True, nullable=False)
     tag_ja = Column(String)
     genre = Column(String)
-    embedding = Column(Text)
+    embedding = Column(Float32Vector(EMBEDDING_DIM))
     registered_at = Column(DateTime, default=datetime.now())
     is_r18 = Column(Boolean, default=False)
     disable = Column(Boolean, default=False)
@@ -51,10 +72,35 @@ class ImageTag(Base):
     image = relationship("ImageEntry", back_populates="image_tags")
     tag = relationship("Tag", back_populates="image_tags")
 
+    __table_args__ = (
+        # 画像→タグ、タグ→画像のどちらもテーブル本体を読まずに引ける
+        Index("ux_image_tags_image_tag", "image_id", "tag_id", unique=True),
+        Index("ix_image_tags_tag_image", "tag_id", "image_id"),
+    )
+
 
 class Genre(Base):
     __tablename__ = "genres"
 
     name_en = Column(String, primary_key=True)
     name_ja = Column(String)
-    registered_at = Column(DateTime, default=lambda: datetime.now().isoformat())
+    registered_at = Column(DateTime, default=datetime.now)
+
+
+class ScanDirectory(Base):
+    __tablename__ = "scan_directories"
+
+    path = Column(String, primary_key=True)
+    parent = Column(String, index=True)
+    mtime_ns = Column(Integer, nullable=False)
+    in_link = Column(Boolean, default=False)
+
+
+class ScanFile(Base):
+    __tablename__ = "scan_files"
+
+    path = Column(String, primary_key=True)
+    directory = Column(String, nullable=False, index=True)
+    size = Column(Integer, nullable=False)
+    mtime_ns = Column(Integer, nullable=False)
+    inode = Column(Integer, nullable=False)
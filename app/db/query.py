@@ -1,11 +1,34 @@
+import os
+from collections.abc import Callable, Generator, Iterable
 from contextlib import contextmanager
+from datetime import datetime
 from pathlib import Path
-from typing import Generator
 
-from db.engine import engine
-from db.models import ImageEntry
+import numpy as np
+from sqlalchemy import LargeBinary, func, select, type_coerce, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
-from utils.image import image_manager
+
+from config import EMBEDDING_DIM, INGEST_BATCH_SIZE
+from db import events
+from db.engine import engine
+from db.models import ImageEntry, ImageTag, ScanDirectory, ScanFile, Tag
+from db.rows import GalleryRow
+from utils.image import get_image_manager, thumbnail_format_of
+from utils.parallel import chunked
+from utils.profiling import counter, histogram, timed
+from utils.scanner import DirState, FileState, ScanManifest, ScanResult
+from utils.tag_index import TagInfo
+from utils.tagger import TaggerResult
+
+# IN句に渡すパラメータ数の上限（SQLiteの変数上限対策）
+IN_CLAUSE_CHUNK_SIZE = 500
+# 大きな表を numpy 配列に読み込むときに1回で取り出す行数
+FETCH_PARTITION_SIZE = 100_000
+
+_ingest_batch_seconds = histogram("ingest_batch_seconds", "取り込み1バッチの登録時間")
+_ingested_images = counter("ingested_images_total", "登録した画像の件数")
 
 # ---------------------------- Session Management ----------------------------
 
@@ -22,24 +45,101 @@ def get_session() -> Generator[Session, None, None]:
 # ---------------------------- Query: Fetch Entries ----------------------------
 
 
-def get_all_image_entries() -> list[ImageEntry]:
+@timed()
+def get_image_entry_by_id(image_id: int) -> ImageEntry | None:
     with get_session() as session:
-        return session.query(ImageEntry).order_by(ImageEntry.id).all()
+        return session.query(ImageEntry).filter_by(id=image_id).first()
+
+
+# ---------------------------- Query: Gallery Pages ----------------------------
+
 
+# 絞り込み条件ごとの件数。書き込みのたびに破棄する
+_entry_counts: dict[bool, int] = {}
 
-def get_favorite_image_entries() -> list[ImageEntry]:
+
+def _gallery_filter(favorites_only: bool) -> list:
+    return [ImageEntry.is_favorite.is_(True)] if favorites_only else []
+
+
+_GALLERY_COLUMNS = (
+    ImageEntry.id,
+    ImageEntry.image_path,
+    ImageEntry.thumbnail_path,
+    ImageEntry.is_favorite,
+    ImageEntry.is_r18,
+)
+
+
+def _to_gallery_row(r) -> GalleryRow:
+    return GalleryRow(
+        r.id, r.image_path, r.thumbnail_path, bool(r.is_favorite), bool(r.is_r18)
+    )
+
+
+@timed()
+def get_gallery_page(
+    after_id: int, limit: int, favorites_only: bool = False
+) -> list[GalleryRow]:
+    """id が after_id より大きいエントリを id 順に limit 件取得（キーセット方式）"""
     with get_session() as session:
-        return (
-            session.query(ImageEntry)
-            .filter_by(is_favorite=True)
+        rows = (
+            session.query(*_GALLERY_COLUMNS)
+            .filter(ImageEntry.id > after_id, *_gallery_filter(favorites_only))
             .order_by(ImageEntry.id)
+            .limit(limit)
             .all()
         )
+    return [_to_gallery_row(r) for r in rows]
 
 
-def get_image_entry_by_id(image_id: int) -> ImageEntry | None:
+@timed()
+def get_gallery_rows_by_ids(image_ids: Iterable[int]) -> list[GalleryRow]:
+    """指定した id の行を、渡した順に並べて返す"""
+    image_ids = list(image_ids)
+    found: dict[int, GalleryRow] = {}
     with get_session() as session:
-        return session.query(ImageEntry).filter_by(id=image_id).first()
+        for chunk in chunked(image_ids, IN_CLAUSE_CHUNK_SIZE):
+            for r in session.query(*_GALLERY_COLUMNS).filter(ImageEntry.id.in_(chunk)):
+                found[r.id] = _to_gallery_row(r)
+    return [found[i] for i in image_ids if i in found]
+
+
+@timed()
+def get_page_anchor(offset: int, favorites_only: bool = False) -> int | None:
+    """offset 件目の直前のエントリの id を返す（ページへ直接移動するときの起点）"""
+    if offset <= 0:
+        return 0
+    with get_session() as session:
+        row = (
+            session.query(ImageEntry.id)
+            .filter(*_gallery_filter(favorites_only))
+            .order_by(ImageEntry.id)
+            .offset(offset - 1)
+            .limit(1)
+            .first()
+        )
+    return row.id if row else None
+
+
+@timed()
+def count_image_entries(favorites_only: bool = False) -> int:
+    """エントリ数（キャッシュ済みならDBに問い合わせない）"""
+    count = _entry_counts.get(favorites_only)
+    if count is None:
+        with get_session() as session:
+            count = (
+                session.query(func.count(ImageEntry.id))
+                .filter(*_gallery_filter(favorites_only))
+                .scalar()
+            )
+        _entry_counts[favorites_only] = count
+    return count
+
+
+def invalidate_entry_counts() -> None:
+    """件数のキャッシュを破棄"""
+    _entry_counts.clear()
 
 
 # ---------------------------- Query: Favorite Flags ----------------------------
@@ -51,6 +151,7 @@ def get_favorite_flag(image_id: int) -> bool:
         return entry.is_favorite if entry else False
 
 
+@timed()
 def toggle_favorite_flag(image_id: int) -> bool | None:
     with get_session() as session:
         entry = session.query(ImageEntry).filter_by(id=image_id).first()
@@ -58,57 +159,610 @@ def toggle_favorite_flag(image_id: int) -> bool | None:
             entry.is_favorite = not entry.is_favorite
             try:
                 session.commit()
+                invalidate_entry_counts()
                 return entry.is_favorite
-            except Exception:
+            except SQLAlchemyError:
                 session.rollback()
     return None
 
 
+@timed()
+def set_favorite_flag(image_id: int, is_favorite: bool) -> bool:
+    """お気に入りフラグを1回のUPDATEで設定し、対象が存在したかを返す"""
+    with get_session() as session:
+        result = session.execute(
+            update(ImageEntry)
+            .where(ImageEntry.id == image_id)
+            .values(is_favorite=is_favorite)
+        )
+        session.commit()
+    invalidate_entry_counts()
+    return result.rowcount > 0
+
+
 # ---------------------------- Query: Image Registration ----------------------------
 
 
+def has_image_entries() -> bool:
+    with get_session() as session:
+        return session.query(ImageEntry.id).first() is not None
+
+
+@timed()
 def get_registered_image_paths() -> set[str]:
     with get_session() as session:
         return {r.image_path for r in session.query(ImageEntry.image_path).all()}
 
 
+def get_image_paths_under(directory: str) -> set[str]:
+    """ディレクトリ配下に登録されている画像のパス"""
+    prefix = directory.rstrip(os.sep) + os.sep
+    with get_session() as session:
+        rows = session.query(ImageEntry.image_path).filter(
+            ImageEntry.image_path.startswith(prefix, autoescape=True)
+        )
+        return {r.image_path for r in rows}
+
+
+def get_image_ids_by_paths(image_paths: Iterable[str]) -> dict[str, int]:
+    """画像パス → id（未登録のパスは含まない）"""
+    found: dict[str, int] = {}
+    with get_session() as session:
+        for chunk in chunked(list(image_paths), IN_CLAUSE_CHUNK_SIZE):
+            rows = session.query(ImageEntry.image_path, ImageEntry.id).filter(
+                ImageEntry.image_path.in_(chunk)
+            )
+            found.update((r.image_path, r.id) for r in rows)
+    return found
+
+
+def get_max_image_id() -> int:
+    with get_session() as session:
+        return session.query(func.max(ImageEntry.id)).scalar() or 0
+
+
 def add_image_entry(image_path: Path, thumbnail_path: Path) -> None:
     with get_session() as session:
         session.add(
             ImageEntry(image_path=str(image_path), thumbnail_path=str(thumbnail_path))
         )
         session.commit()
+    invalidate_entry_counts()
+    events.images_added.emit()
 
 
-def add_image_entries(entries: list[tuple[Path, Path]]) -> None:
-    with get_session() as session:
-        image_objects = [
-            ImageEntry(
-                image_path=str(orig),
-                thumbnail_path=str(thumb),
-                created_at=image_manager.extract_captured_at(orig),
-            )
-            for orig, thumb in entries
-        ]
-        session.add_all(image_objects)
-        session.commit()
+def add_image_entries(
+    entries: Iterable[tuple[Path, Path]],
+    batch_size: int = INGEST_BATCH_SIZE,
+    file_states: dict[str, FileState] | None = None,
+    on_batch: Callable[[int], None] | None = None,
+) -> int:
+    """画像エントリをbatch_size件ずつ登録し、バッチごとに登録・更新した件数を返す
+
+    変更された画像（登録済みのパス）は行のサムネイルと日時を更新し、保存形式が
+    変わって不要になった古いサムネイルを削除する。内容が同じ行は書き換えないため、
+    途中で失敗しても同じ入力で再実行すれば続きから登録できる。
+    file_states を渡すと、登録した画像のマニフェストも同じトランザクションで保存する。
+    """
+    stmt = sqlite_insert(ImageEntry)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["image_path"],
+        set_={
+            "thumbnail_path": stmt.excluded.thumbnail_path,
+            "thumbnail_format": stmt.excluded.thumbnail_format,
+            "created_at": stmt.excluded.created_at,
+        },
+    )
+    total = 0
+    for batch in chunked(entries, batch_size):
+        # 入力の待ち時間（前段のサムネイル生成）は含めず、登録だけを測る
+        with _ingest_batch_seconds.time():
+            rows = [
+                {
+                    "image_path": str(orig),
+                    "thumbnail_path": str(thumb),
+                    "thumbnail_format": thumbnail_format_of(thumb),
+                    "created_at": get_image_manager().extract_captured_at(orig),
+                }
+                for orig, thumb in batch
+            ]
+            with get_session() as session:
+                existing = {
+                    r.image_path: r
+                    for chunk in chunked(
+                        [row["image_path"] for row in rows], IN_CLAUSE_CHUNK_SIZE
+                    )
+                    for r in session.execute(
+                        select(
+                            ImageEntry.image_path,
+                            ImageEntry.thumbnail_path,
+                            ImageEntry.thumbnail_format,
+                            ImageEntry.created_at,
+                        ).where(ImageEntry.image_path.in_(chunk))
+                    )
+                }
+                written = [
+                    row
+                    for row in rows
+                    if (old := existing.get(row["image_path"])) is None
+                    or (old.thumbnail_path, old.thumbnail_format, old.created_at)
+                    != (
+                        row["thumbnail_path"],
+                        row["thumbnail_format"],
+                        row["created_at"],
+                    )
+                ]
+                if written:
+                    session.execute(stmt, written)
+                if file_states:
+                    states = {
+                        row["image_path"]: file_states.pop(row["image_path"])
+                        for row in rows
+                        if row["image_path"] in file_states
+                    }
+                    _upsert_file_states(session, states)
+                session.commit()
+        for row in written:
+            old = existing.get(row["image_path"])
+            if old is None:
+                continue
+            # 作り直したサムネイルをキャッシュから外し、形式が変わった古いファイルは消す
+            get_image_manager().invalidate_thumbnail(Path(row["thumbnail_path"]))
+            if old.thumbnail_path != row["thumbnail_path"]:
+                get_image_manager().invalidate_thumbnail(Path(old.thumbnail_path))
+                get_image_manager().delete_thumbnail_file(Path(old.thumbnail_path))
+        _ingested_images.inc(len(written))
+        invalidate_entry_counts()
+        if written:
+            events.images_added.emit()
+        total += len(written)
+        if on_batch:
+            on_batch(len(written))
+    return total
 
 
+@timed()
 def delete_image_entry(image_id: int) -> bool:
     with get_session() as session:
         entry = session.query(ImageEntry).filter_by(id=image_id).first()
         if entry:
-            image_manager.delete_image_files(entry.image_path, entry.thumbnail_path)
+            get_image_manager().delete_image_files(
+                entry.image_path, entry.thumbnail_path
+            )
+            get_image_manager().invalidate_thumbnail(entry.thumbnail_path)
             session.delete(entry)
             session.commit()
+            invalidate_entry_counts()
+            events.images_deleted.emit([image_id])
             return True
     return False
 
 
+@timed()
+def delete_image_entries_by_paths(image_paths: Iterable[Path]) -> int:
+    """ディスクから消えた画像のエントリとサムネイルを削除"""
+    deleted: list[int] = []
+    with get_session() as session:
+        for chunk in chunked((str(p) for p in image_paths), IN_CLAUSE_CHUNK_SIZE):
+            entries = (
+                session.query(ImageEntry).filter(ImageEntry.image_path.in_(chunk)).all()
+            )
+            for entry in entries:
+                get_image_manager().delete_thumbnail_file(Path(entry.thumbnail_path))
+                get_image_manager().invalidate_thumbnail(entry.thumbnail_path)
+                deleted.append(entry.id)
+                session.delete(entry)
+        session.commit()
+    invalidate_entry_counts()
+    if deleted:
+        events.images_deleted.emit(deleted)
+    return len(deleted)
+
+
+def iter_thumbnails_to_reencode(
+    target_format: str, batch_size: int = INGEST_BATCH_SIZE
+) -> Generator[list[tuple[int, Path, Path]], None, None]:
+    """保存形式が target_format でないサムネイルを (id, 元画像, サムネイル) で返す"""
+    last_id = 0
+    while True:
+        with get_session() as session:
+            rows = (
+                session.query(
+                    ImageEntry.id, ImageEntry.image_path, ImageEntry.thumbnail_path
+                )
+                .filter(
+                    ImageEntry.id > last_id,
+                    func.coalesce(ImageEntry.thumbnail_format, "png") != target_format,
+                )
+                .order_by(ImageEntry.id)
+                .limit(batch_size)
+                .all()
+            )
+        if not rows:
+            return
+        last_id = rows[-1].id
+        yield [(r.id, Path(r.image_path), Path(r.thumbnail_path)) for r in rows]
+
+
+def update_thumbnail_paths(updates: list[tuple[int, Path]]) -> None:
+    """サムネイルのパスと保存形式をまとめて更新"""
+    if not updates:
+        return
+    with get_session() as session:
+        session.execute(
+            update(ImageEntry),
+            [
+                {
+                    "id": image_id,
+                    "thumbnail_path": str(path),
+                    "thumbnail_format": thumbnail_format_of(path),
+                }
+                for image_id, path in updates
+            ],
+        )
+        session.commit()
+
+
+# ---------------------------- Query: Auto Tagging ----------------------------
+
+
+def iter_untagged_images(
+    batch_size: int = INGEST_BATCH_SIZE,
+) -> Generator[list[tuple[int, Path]], None, None]:
+    """自動タグ付けがまだの画像を (id, 元画像) で id 順に返す"""
+    last_id = 0
+    while True:
+        with get_session() as session:
+            rows = (
+                session.query(ImageEntry.id, ImageEntry.image_path)
+                .filter(ImageEntry.tagged_at.is_(None), ImageEntry.id > last_id)
+                .order_by(ImageEntry.id)
+                .limit(batch_size)
+                .all()
+            )
+        if not rows:
+            return
+        last_id = rows[-1].id
+        yield [(r.id, Path(r.image_path)) for r in rows]
+
+
+def count_untagged_images() -> int:
+    with get_session() as session:
+        return (
+            session.query(func.count(ImageEntry.id))
+            .filter(ImageEntry.tagged_at.is_(None))
+            .scalar()
+        )
+
+
+def reset_tagged_at() -> None:
+    """全画像を自動タグ付けのやり直し対象にする"""
+    with get_session() as session:
+        session.query(ImageEntry).update({ImageEntry.tagged_at: None})
+        session.commit()
+
+
+@timed()
+def save_tagger_results(results: list[tuple[int, TaggerResult]]) -> int:
+    """タガーの結果をタグ・埋め込み・完了日時として1トランザクションで保存
+
+    完了日時は結果と同時に書くので、途中で止めても再実行すれば続きから処理できる。
+    """
+    if not results:
+        return 0
+    tagged_at = datetime.now()
+    with get_session() as session:
+        tag_ids, inserted = _upsert_tags(
+            session, (tag for _, result in results for tag in result.tags)
+        )
+        pairs = sorted(
+            {
+                (image_id, tag_ids[tag])
+                for image_id, result in results
+                for tag in result.tags
+            }
+        )
+        if pairs:
+            session.connection().exec_driver_sql(
+                "INSERT INTO image_tags (image_id, tag_id) VALUES (?, ?) "
+                "ON CONFLICT DO NOTHING",
+                pairs,
+            )
+        session.execute(
+            update(ImageEntry),
+            [
+                {"id": image_id, "tagged_at": tagged_at}
+                | (
+                    {"tag_embedding": result.embedding}
+                    if result.embedding is not None
+                    else {}
+                )
+                for image_id, result in results
+            ],
+        )
+        session.commit()
+    _emit_tags_added(tag_ids, inserted)
+    if pairs:
+        image_ids, tags = zip(*pairs)
+        events.image_tags_added.emit(list(image_ids), list(tags))
+    embedded = [(i, r.embedding) for i, r in results if r.embedding is not None]
+    if embedded:
+        ids, vectors = zip(*embedded)
+        events.embeddings_updated.emit("tag_embedding", list(ids), np.stack(vectors))
+    return len(results)
+
+
+# ---------------------------- Query: Embeddings ----------------------------
+
+
+@timed()
+def load_embeddings(
+    column: str = "tag_embedding", dim: int = EMBEDDING_DIM, after_id: int = 0
+) -> tuple[np.ndarray, np.ndarray]:
+    """埋め込みを持つ画像の (id配列, n×dim行列) を1回の読み込みで返す
+
+    after_id を指定すると、それより後に登録した画像だけを返す。
+    """
+    vector = type_coerce(getattr(ImageEntry, column), LargeBinary)
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(ImageEntry.id, vector)
+            .where(ImageEntry.id > after_id, vector.is_not(None))
+            .order_by(ImageEntry.id)
+        ).all()
+    rows = [r for r in rows if len(r[1]) == dim * 4]
+    ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    matrix = np.frombuffer(b"".join(r[1] for r in rows), dtype="<f4")
+    return ids, matrix.reshape(len(rows), dim)
+
+
+def set_embeddings(
+    updates: Iterable[tuple[int, np.ndarray]], column: str = "tag_embedding"
+) -> None:
+    """画像の埋め込みをまとめて更新"""
+    updates = list(updates)
+    with get_session() as session:
+        for chunk in chunked(updates, INGEST_BATCH_SIZE):
+            session.execute(
+                update(ImageEntry),
+                [{"id": image_id, column: vector} for image_id, vector in chunk],
+            )
+        session.commit()
+    if updates:
+        ids, vectors = zip(*updates)
+        events.embeddings_updated.emit(column, list(ids), np.stack(vectors))
+
+
+# ---------------------------- Query: Scan Manifest ----------------------------
+
+
+@timed()
+def load_scan_manifest() -> ScanManifest:
+    with get_session() as session:
+        dirs = {
+            r.path: DirState(r.parent, r.mtime_ns, bool(r.in_link))
+            for r in session.query(
+                ScanDirectory.path,
+                ScanDirectory.parent,
+                ScanDirectory.mtime_ns,
+                ScanDirectory.in_link,
+            )
+        }
+        files = {
+            r.path: FileState(r.directory, r.size, r.mtime_ns, r.inode)
+            for r in session.query(
+                ScanFile.path,
+                ScanFile.directory,
+                ScanFile.size,
+                ScanFile.mtime_ns,
+                ScanFile.inode,
+            )
+        }
+    return ScanManifest(dirs=dirs, files=files)
+
+
+@timed()
+def save_scan_result(result: ScanResult) -> None:
+    """スキャン差分をマニフェストテーブルに反映"""
+    with get_session() as session:
+        for chunk in chunked((str(p) for p in result.removed), IN_CLAUSE_CHUNK_SIZE):
+            session.query(ScanFile).filter(ScanFile.path.in_(chunk)).delete(
+                synchronize_session=False
+            )
+        for chunk in chunked(result.removed_dirs, IN_CLAUSE_CHUNK_SIZE):
+            session.query(ScanDirectory).filter(ScanDirectory.path.in_(chunk)).delete(
+                synchronize_session=False
+            )
+
+        _upsert_dir_states(session, result.dir_states)
+        _upsert_file_states(session, result.file_states)
+        session.commit()
+
+
+def _upsert_dir_states(session: Session, states: dict[str, DirState]) -> None:
+    if not states:
+        return
+    stmt = sqlite_insert(ScanDirectory)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ScanDirectory.path],
+        set_={
+            "parent": stmt.excluded.parent,
+            "mtime_ns": stmt.excluded.mtime_ns,
+            "in_link": stmt.excluded.in_link,
+        },
+    )
+    session.execute(
+        stmt,
+        [
+            {
+                "path": path,
+                "parent": state.parent,
+                "mtime_ns": state.mtime_ns,
+                "in_link": state.in_link,
+            }
+            for path, state in states.items()
+        ],
+    )
+
+
+def _upsert_file_states(session: Session, states: dict[str, FileState]) -> None:
+    if not states:
+        return
+    stmt = sqlite_insert(ScanFile)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ScanFile.path],
+        set_={
+            "directory": stmt.excluded.directory,
+            "size": stmt.excluded.size,
+            "mtime_ns": stmt.excluded.mtime_ns,
+            "inode": stmt.excluded.inode,
+        },
+    )
+    session.execute(
+        stmt,
+        [
+            {
+                "path": path,
+                "directory": state.directory,
+                "size": state.size,
+                "mtime_ns": state.mtime_ns,
+                "inode": state.inode,
+            }
+            for path, state in states.items()
+        ],
+    )
+
+
 # ---------------------------- Query: Tag ----------------------------
+
+
+def _fetch_int_columns(stmt, n_columns: int) -> np.ndarray:
+    """整数の列だけを選ぶクエリの結果を n×n_columns の配列で返す"""
+    chunks = [np.empty((0, n_columns), dtype=np.int64)]
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True).execute(stmt)
+        for rows in result.partitions(FETCH_PARTITION_SIZE):
+            chunks.append(np.array(rows, dtype=np.int64).reshape(-1, n_columns))
+    return np.concatenate(chunks)
+
+
+@timed()
+def load_image_tags() -> tuple[np.ndarray, np.ndarray]:
+    """image_tags 全体を (画像id配列, タグid配列) で返す（タグ→画像の索引順）"""
+    pairs = _fetch_int_columns(
+        select(ImageTag.image_id, ImageTag.tag_id).order_by(
+            ImageTag.tag_id, ImageTag.image_id
+        ),
+        2,
+    )
+    return pairs[:, 0], pairs[:, 1]
+
+
+def load_image_ids(after_id: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """after_id より後の画像の (id配列, R18の画像のid配列) を返す"""
+    rows = _fetch_int_columns(
+        select(ImageEntry.id, func.coalesce(ImageEntry.is_r18, False))
+        .where(ImageEntry.id > after_id)
+        .order_by(ImageEntry.id),
+        2,
+    )
+    return rows[:, 0], rows[rows[:, 1] != 0, 0]
+
+
+def get_favorite_ids() -> np.ndarray:
+    """お気に入りの画像の id を昇順で返す"""
+    rows = _fetch_int_columns(
+        select(ImageEntry.id)
+        .where(*_gallery_filter(favorites_only=True))
+        .order_by(ImageEntry.id),
+        1,
+    )
+    return rows[:, 0]
+
+
+@timed()
+def load_tags(tag_ids: Iterable[int] | None = None) -> list[TagInfo]:
+    """タグの名前とフラグを返す（tag_ids を省略すると全件）"""
+    stmt = select(Tag.id, Tag.tag, Tag.tag_ja, Tag.is_r18, Tag.disable)
+    with engine.connect() as conn:
+        if tag_ids is None:
+            rows = conn.execute(stmt).all()
+        else:
+            rows = [
+                row
+                for chunk in chunked(tag_ids, IN_CLAUSE_CHUNK_SIZE)
+                for row in conn.execute(stmt.where(Tag.id.in_(chunk)))
+            ]
+    return [
+        TagInfo(r.id, r.tag, r.tag_ja, bool(r.is_r18), bool(r.disable)) for r in rows
+    ]
+
+
+def count_tag_usage() -> dict[int, int]:
+    """タグごとの使用回数（タグ→画像の索引だけで数える）"""
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(ImageTag.tag_id, func.count()).group_by(ImageTag.tag_id)
+        ).all()
+    return dict(rows)
+
+
+def add_tags(names: Iterable[str]) -> dict[str, int]:
+    """タグを登録し、名前 → id を返す（登録済みのタグはそのまま）"""
+    with get_session() as session:
+        ids, inserted = _upsert_tags(session, names)
+        session.commit()
+    _emit_tags_added(ids, inserted)
+    return ids
+
+
+def _upsert_tags(
+    session: Session, names: Iterable[str]
+) -> tuple[dict[str, int], list[str]]:
+    """コミットせずにタグを登録し、名前 → id と新しく登録した名前を返す"""
+    names = list(dict.fromkeys(names))
+    stmt = sqlite_insert(Tag).on_conflict_do_nothing(index_elements=["tag"])
+    ids: dict[str, int] = {}
+    inserted: list[str] = []
+    for chunk in chunked(names, IN_CLAUSE_CHUNK_SIZE):
+        found = dict(session.query(Tag.tag, Tag.id).filter(Tag.tag.in_(chunk)))
+        new = [name for name in chunk if name not in found]
+        if new:
+            session.execute(stmt, [{"tag": name} for name in new])
+            found.update(session.query(Tag.tag, Tag.id).filter(Tag.tag.in_(new)))
+            inserted.extend(new)
+        ids.update(found)
+    return ids, inserted
+
+
+def _emit_tags_added(ids: dict[str, int], inserted: list[str]) -> None:
+    if inserted:
+        events.tags_added.emit(load_tags(ids[name] for name in inserted))
+
+
+def add_image_tags(pairs: Iterable[tuple[int, int]]) -> int:
+    """(画像id, タグid) の組を登録（登録済みの組は無視）"""
+    stmt = sqlite_insert(ImageTag).on_conflict_do_nothing()
+    total = 0
+    for batch in chunked(pairs, INGEST_BATCH_SIZE):
+        with get_session() as session:
+            session.execute(stmt, [{"image_id": i, "tag_id": t} for i, t in batch])
+            session.commit()
+        image_ids, tag_ids = zip(*batch)
+        events.image_tags_added.emit(list(image_ids), list(tag_ids))
+        total += len(batch)
+    return total
+
+
+@timed()
 def get_tags_for_image(image_id: int) -> list[str]:
+    """画像に付いた有効なタグの名前"""
     with get_session() as session:
-        image = session.query(ImageEntry).filter_by(id=image_id).first()
-        if not image:
-            return []
-        return ["test"]  # [t.tag.tag for t in image.image_tags]
+        rows = (
+            session.query(Tag.tag)
+            .join(ImageTag, ImageTag.tag_id == Tag.id)
+            .filter(ImageTag.image_id == image_id, Tag.disable.is_not(True))
+            .order_by(Tag.tag)
+            .all()
+        )
+    return [r.tag for r in rows]
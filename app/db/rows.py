@@ -0,0 +1,17 @@
+from dataclasses import dataclass
+
+
+@dataclass(slots=True)
+class GalleryRow:
+    """ギャラリーの1マスを描くのに必要な列だけを持つ行
+
+    表示中のページの状態を保持するスナップショットを兼ねており、
+    お気に入りの切り替えはDBへの書き込み後にこのオブジェクトへ直接反映する。
+    SQLAlchemyに依存しないので、画面の部品はDBを読み込まずにこの型を使える。
+    """
+
+    id: int
+    image_path: str
+    thumbnail_path: str
+    is_favorite: bool
+    is_r18: bool
@@ -0,0 +1,237 @@
+import csv
+import json
+import time
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from sqlalchemy import Connection, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from config import TAG_IMPORT_CHUNK_SIZE
+from db import events, query
+from db.models import Genre, Tag
+from db.query import IN_CLAUSE_CHUNK_SIZE, chunked, load_tags
+
+# CSV の wide 形式で1セルに並べたタグの区切り
+TAG_SEPARATORS = (",", " ")
+
+
+@dataclass(slots=True)
+class TagSpec:
+    tag: str
+    tag_ja: str | None = None
+    genre: str | None = None
+
+
+@dataclass(slots=True)
+class TagRecord:
+    """1枚の画像に付けるタグ"""
+
+    image_path: str
+    tags: list[TagSpec]
+
+
+@dataclass
+class ImportStats:
+    images: int = 0
+    unresolved: int = 0
+    tags: int = 0
+    image_tags: int = 0
+    seconds: float = 0.0
+    unresolved_samples: list[str] = field(default_factory=list)
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.image_tags / self.seconds if self.seconds else 0.0
+
+
+# ---------------------------- Reading ----------------------------
+
+
+def _split_tags(cell: str) -> list[str]:
+    for sep in TAG_SEPARATORS:
+        if sep in cell:
+            return [t.strip() for t in cell.split(sep) if t.strip()]
+    return [cell.strip()] if cell.strip() else []
+
+
+def _to_spec(item: str | dict) -> TagSpec:
+    if isinstance(item, str):
+        return TagSpec(item)
+    return TagSpec(item["tag"], item.get("tag_ja") or None, item.get("genre") or None)
+
+
+def iter_jsonl(path: Path) -> Iterator[TagRecord]:
+    """1行1画像の JSONL を読む。タグは名前か {"tag", "tag_ja", "genre"} の辞書
+
+    {"image_path": "...", "tags": ["cat", {"tag": "dog", "tag_ja": "犬"}]}
+    """
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                yield TagRecord(row["image_path"], [_to_spec(t) for t in row["tags"]])
+
+
+def iter_csv(path: Path) -> Iterator[TagRecord]:
+    """CSV を読む。列名で2つの形式を見分ける
+
+    wide: image_path,tags（1セルにカンマか空白区切りで複数のタグ）
+    long: image_path,tag[,tag_ja][,genre]（1行1タグ。同じ画像の行は続けて並べる）
+    """
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        reader = csv.DictReader(f)
+        if "tags" in reader.fieldnames:
+            for row in reader:
+                tags = [TagSpec(t) for t in _split_tags(row["tags"])]
+                yield TagRecord(row["image_path"], tags)
+            return
+        current: TagRecord | None = None
+        for row in reader:
+            spec = TagSpec(
+                row["tag"].strip(),
+                (row.get("tag_ja") or "").strip() or None,
+                (row.get("genre") or "").strip() or None,
+            )
+            if current is None or current.image_path != row["image_path"]:
+                if current is not None:
+                    yield current
+                current = TagRecord(row["image_path"], [])
+            current.tags.append(spec)
+        if current is not None:
+            yield current
+
+
+def iter_tag_records(path: Path) -> Iterator[TagRecord]:
+    if path.suffix.lower() in (".jsonl", ".ndjson"):
+        return iter_jsonl(path)
+    if path.suffix.lower() == ".csv":
+        return iter_csv(path)
+    raise ValueError(f"対応していない形式です: {path.suffix}（.csv / .jsonl）")
+
+
+# ---------------------------- Writing ----------------------------
+
+
+def _resolve_image_ids(conn: Connection, paths: list[str]) -> dict[str, int]:
+    """一時テーブルとの結合1回で、画像パス → id を引く"""
+    conn.exec_driver_sql(
+        "CREATE TEMP TABLE IF NOT EXISTS import_paths (path TEXT PRIMARY KEY)"
+    )
+    conn.exec_driver_sql("DELETE FROM import_paths")
+    conn.exec_driver_sql(
+        "INSERT OR IGNORE INTO import_paths (path) VALUES (?)", [(p,) for p in paths]
+    )
+    rows = conn.exec_driver_sql(
+        "SELECT images.image_path, images.id FROM images "
+        "JOIN import_paths ON images.image_path = import_paths.path"
+    )
+    return dict(rows.all())
+
+
+def _upsert_tags(
+    conn: Connection, specs: dict[str, TagSpec], tag_ids: dict[str, int]
+) -> list[int]:
+    """タグとジャンルを登録・更新し、tag_ids に id を足す。新しく登録したタグの id を返す"""
+    genres = {s.genre for s in specs.values() if s.genre}
+    if genres:
+        # registered_at はモデルの既定値で埋める
+        conn.execute(
+            sqlite_insert(Genre).on_conflict_do_nothing(),
+            [{"name_en": g} for g in genres],
+        )
+    stmt = sqlite_insert(Tag)
+    # 既存のタグは空でない値だけで上書きする（tag_ja を消さない）
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["tag"],
+        set_={
+            "tag_ja": func.coalesce(stmt.excluded.tag_ja, Tag.tag_ja),
+            "genre": func.coalesce(stmt.excluded.genre, Tag.genre),
+        },
+        where=(stmt.excluded.tag_ja.is_not(None) | stmt.excluded.genre.is_not(None)),
+    )
+    # 登録済みのタグを先に引いておき、新しく登録したものだけを返す
+    _select_tag_ids(conn, [name for name in specs if name not in tag_ids], tag_ids)
+    new = [s for name, s in specs.items() if name not in tag_ids or s.tag_ja or s.genre]
+    if new:
+        conn.execute(
+            stmt,
+            [{"tag": s.tag, "tag_ja": s.tag_ja, "genre": s.genre} for s in new],
+        )
+    created = [name for name in specs if name not in tag_ids]
+    return _select_tag_ids(conn, created, tag_ids)
+
+
+def _select_tag_ids(
+    conn: Connection, names: list[str], tag_ids: dict[str, int]
+) -> list[int]:
+    """names のうち登録済みのタグの id を引き、tag_ids に足して返す"""
+    found: list[int] = []
+    for chunk in chunked(names, IN_CLAUSE_CHUNK_SIZE):
+        rows = conn.execute(select(Tag.tag, Tag.id).where(Tag.tag.in_(chunk))).all()
+        tag_ids.update(rows)
+        found.extend(tag_id for _, tag_id in rows)
+    return found
+
+
+def import_records(
+    records: Iterable[TagRecord],
+    chunk_size: int = TAG_IMPORT_CHUNK_SIZE,
+    replace: bool = False,
+    on_chunk: Callable[[ImportStats], None] | None = None,
+) -> ImportStats:
+    """タグを chunk_size 枚ずつ1トランザクションで取り込む
+
+    replace=True なら、取り込む画像に付いていたタグを入れ替える
+    （外したタグは通知しないため、起動中の検索索引には次回の起動で反映される）。
+    """
+    stats = ImportStats()
+    tag_ids: dict[str, int] = {}
+    start = time.perf_counter()
+    for chunk in chunked(records, chunk_size):
+        specs = {s.tag: s for r in chunk for s in r.tags if s.tag}
+        with query.engine.begin() as conn:
+            image_ids = _resolve_image_ids(conn, [r.image_path for r in chunk])
+            new_tags = _upsert_tags(conn, specs, tag_ids)
+            pairs = list(
+                dict.fromkeys(
+                    (image_ids[r.image_path], tag_ids[s.tag])
+                    for r in chunk
+                    if r.image_path in image_ids
+                    for s in r.tags
+                    if s.tag
+                )
+            )
+            # 行数が多いのでSQLAlchemyの引数処理を通さず、ドライバの executemany に渡す
+            if replace and image_ids:
+                conn.exec_driver_sql(
+                    "DELETE FROM image_tags WHERE image_id = ?",
+                    [(i,) for i in set(image_ids.values())],
+                )
+            if pairs:
+                conn.exec_driver_sql(
+                    "INSERT INTO image_tags (image_id, tag_id) VALUES (?, ?) "
+                    "ON CONFLICT DO NOTHING",
+                    sorted(pairs),
+                )
+
+        missing = [r.image_path for r in chunk if r.image_path not in image_ids]
+        stats.images += len(chunk) - len(missing)
+        stats.unresolved += len(missing)
+        stats.unresolved_samples.extend(missing[: 5 - len(stats.unresolved_samples)])
+        stats.tags += len(new_tags)
+        stats.image_tags += len(pairs)
+        stats.seconds = time.perf_counter() - start
+        if new_tags:
+            events.tags_added.emit(load_tags(new_tags))
+        if pairs:
+            image_col, tag_col = zip(*pairs)
+            events.image_tags_added.emit(list(image_col), list(tag_col))
+        if on_chunk:
+            on_chunk(stats)
+    return stats
+
+
+def import_file(path: Path, **kwargs) -> ImportStats:
+    return import_records(iter_tag_records(Path(path)), **kwargs)
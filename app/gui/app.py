@@ -1,48 +1,166 @@
-from math import ceil
+import threading
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 import customtkinter as ctk
-from config import THUMBNAIL_SIZE
-from db.models import ImageEntry
+
+from config import (
+    ASYNC_THUMBNAIL_LOADING,
+    GALLERY_MODE,
+    GALLERY_PAGE_SIZE,
+    LIBRARY_WATCH,
+    PAGE_INPUT_PREFETCH_DELAY_MS,
+    PREFETCH_ADJACENT_PAGES,
+    TAG_COMPLETER_POLL_MS,
+    TAG_SUGGESTION_COUNT,
+    THUMBNAIL_SIZE,
+)
+from db.rows import GalleryRow
 from gui.base import BaseWindow
 from gui.components.button import (
     create_next_button,
     create_prev_button,
     create_toggle_favorites_button,
 )
+from gui.loader import ThumbnailLoader
 from gui.original import Original
-from gui.thumbnail import ImageThumbnail
-from gui.viewmodel import GalleryViewModel
+from gui.pool import CellPool
+from gui.prefetch import PagePrefetcher
+from gui.thumbnail import ThumbnailCell
+from gui.virtual_grid import VirtualGallery
+from utils import startup_profile
+from utils.profiling import histogram
+
+# DB（SQLAlchemy）や numpy を使うモジュールは、最初の描画の後で読み込む
+if TYPE_CHECKING:
+    from db.ingest import LibraryUpdate
+    from gui.library_sync import LibrarySync
+    from gui.startup_ingest import BackgroundIngest
+    from gui.viewmodel import GalleryViewModel
+    from utils.tag_complete import TagSuggestion
+
+_page_draw_seconds = histogram("page_draw_seconds", "ギャラリー1ページの描画時間")
 
 
 class App(BaseWindow):
-    def __init__(self):
+    def __init__(self, background_ingest: bool = False):
+        """ウィンドウの骨組みだけを作り、ギャラリーは最初の描画の後に表示する
+
+        background_ingest なら、DBの準備とライブラリの取り込みも画面を開いてから行う。
+        """
         super().__init__()
         self.title("Tag Palette")
         self.thumbnail_size = THUMBNAIL_SIZE
         self.current_columns: int = 5
         self.current_page = 0
-        self.page_size = 36
+        self.page_size = GALLERY_PAGE_SIZE
         self.total_pages = 0
-        self.image_frames: list[ctk.CTkFrame] = []
-        self.entries: list[ImageEntry] = []
-
-        self.viewmodel = GalleryViewModel()
+        self.virtual_mode = GALLERY_MODE == "virtual"
+        self.background_ingest = background_ingest
+
+        self.viewmodel: GalleryViewModel | None = None
+        self.library_sync: LibrarySync | None = None
+        self.ingest: BackgroundIngest | None = None
+        self._completer_thread: threading.Thread | None = None
+        self._completer_poll_id: str | None = None
+        self._page_typed_id: str | None = None
+        self.thumbnail_loader = (
+            ThumbnailLoader(self) if ASYNC_THUMBNAIL_LOADING else None
+        )
+        self.prefetcher = (
+            PagePrefetcher(
+                self,
+                self.thumbnail_size,
+                self._page_thumbnails,
+                is_busy=self._is_loading,
+            )
+            if PREFETCH_ADJACENT_PAGES and not self.virtual_mode
+            else None
+        )
 
         self._setup_toggle_button()
+        self._setup_status_bar()
         self._setup_pagination_controls()
         self._setup_scrollable_canvas()
+        if self.virtual_mode:
+            self.pagination_frame.pack_forget()
+            self.virtual_gallery = VirtualGallery(
+                self.canvas, self._create_thumbnail_cell, self.thumbnail_size
+            )
+        else:
+            self._setup_gallery_frame()
+            self.cell_pool = CellPool(self._create_thumbnail_cell)
+        self.after_idle(self._finish_startup)
+
+    def _finish_startup(self):
+        """最初の描画の後に、DBを開いて登録済みの画像を表示し、取り込みを始める"""
+        self.update_idletasks()
+        startup_profile.mark("first_paint")
+        from db.init import prepare_database
+        from gui.viewmodel import GalleryViewModel
+
+        if self.background_ingest:
+            prepare_database(self)
+        self.viewmodel = GalleryViewModel(self.page_size)
         self.bind("<Configure>", self._on_resize)
-
         self._load_images()
+        self.update_idletasks()
+        startup_profile.mark("gallery_ready")
+        if startup_profile.is_enabled():
+            self.after_idle(self.destroy)  # 計測だけして終了する
+            return
+
+        if self.background_ingest:
+            from gui.startup_ingest import BackgroundIngest
+
+            self.ingest = BackgroundIngest(
+                self,
+                self._set_status,
+                self._on_library_updated,
+                self._on_ingest_finished,
+            )
+            self.ingest.start()
+        else:
+            self.library_sync = self._start_library_sync()
 
     # ---------------- UI SETUP ----------------
 
     def _setup_toggle_button(self):
+        self.toolbar = ctk.CTkFrame(self, fg_color="transparent")
+        self.toolbar.pack(pady=(10, 0), padx=10, fill="x")
         self.toggle_button = create_toggle_favorites_button(
-            self, self.viewmodel.show_favorites_only, self._on_toggle_favorites
+            self.toolbar, False, self._on_toggle_favorites
+        )
+        self.toggle_button.pack(side="left")
+        self._setup_search_entry()
+
+    def _setup_search_entry(self):
+        self.search_entry = ctk.CTkEntry(
+            self.toolbar,
+            width=360,
+            placeholder_text="タグで絞り込み（例: cat dog / cat OR dog / -sketch）",
         )
-        self.toggle_button.pack(pady=(10, 0), padx=10, anchor="nw")
+        self.search_entry.pack(side="left", padx=(10, 0))
+        self.search_entry.bind("<Return>", self._on_tag_search)
+        self.search_entry.bind("<KeyRelease>", self._on_search_typed)
+        # 最初の入力を待たせないよう、欄を選んだ時点で補完の索引を作り始める
+        self.search_entry.bind("<FocusIn>", lambda _: self._prepare_completer())
+        self.search_label = ctk.CTkLabel(self.toolbar, text="")
+        self.search_label.pack(side="left", padx=10)
+
+        # 補完候補のボタンは最初に作り、入力のたびに文字だけ差し替える
+        self.suggestion_bar = ctk.CTkScrollableFrame(
+            self, orientation="horizontal", height=28, fg_color="transparent"
+        )
+        self.suggestion_bar.pack(padx=10, fill="x")
+        self.suggestion_buttons = [
+            ctk.CTkButton(self.suggestion_bar, text="", width=0, height=24)
+            for _ in range(TAG_SUGGESTION_COUNT)
+        ]
+
+    def _setup_status_bar(self):
+        self.status_label = ctk.CTkLabel(self, text="", anchor="w", height=20)
+        self.status_label.pack(side="bottom", padx=10, fill="x")
 
     def _setup_pagination_controls(self):
         self.pagination_frame = ctk.CTkFrame(self)
@@ -53,6 +171,7 @@ class App(BaseWindow):
         )
         self.page_entry = ctk.CTkEntry(self.pagination_frame, width=40)
         self.page_entry.bind("<Return>", self._go_to_page)
+        self.page_entry.bind("<KeyRelease>", self._on_page_typed)
 
         self.total_label = ctk.CTkLabel(self.pagination_frame, text="/ ?")
         self.next_button = create_next_button(
@@ -69,11 +188,13 @@ class App(BaseWindow):
         self.scrollbar = ctk.CTkScrollbar(
             self, orientation="vertical", command=self.canvas.yview
         )
-        self.canvas.configure(yscrollcommand=self.scrollbar.set)
+        self.canvas.configure(yscrollcommand=self._on_yview)
 
         self.canvas.pack(side="left", fill="both", expand=True)
         self.scrollbar.pack(side="right", fill="y")
+        self.enable_mousewheel_scroll(self.canvas)
 
+    def _setup_gallery_frame(self):
         self.gallery_frame = ctk.CTkFrame(self.canvas, fg_color="#222222")
         self.canvas.create_window((0, 0), window=self.gallery_frame, anchor="nw")
 
@@ -81,32 +202,44 @@ class App(BaseWindow):
             "<Configure>",
             lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all")),
         )
-        self.enable_mousewheel_scroll(self.canvas)
 
     # ---------------- IMAGE LOADING ----------------
 
     def _load_images(self):
-        self.entries = self.viewmodel.get_entries()
-        self.total_pages = ceil(len(self.entries) / self.page_size)
+        # 表示中のページより前は削除の影響を受けないので起点を残す
+        self.viewmodel.reset_pages(keep_until=self.current_page)
+        self.total_pages = self.viewmodel.count_pages()
+        self.current_page = max(0, min(self.current_page, self.total_pages - 1))
         self.current_columns = self._calculate_columns()
+        if self.virtual_mode:
+            self._show_virtual_gallery()
+            return
         self._draw_page()
 
-    def _draw_page(self):
-        self._clear_gallery()
+    def _show_virtual_gallery(self, keep_position: bool = False):
+        self.virtual_gallery.set_columns(self.current_columns)
+        self.virtual_gallery.set_source(
+            self.viewmodel.count_entries(),
+            self.viewmodel.get_range,
+            keep_position=keep_position,
+        )
 
-        start = self.current_page * self.page_size
-        end = start + self.page_size
-        page_entries = self.entries[start:end]
+    def _page_entries(self, page: int) -> list[GalleryRow]:
+        if not 0 <= page < self.total_pages:
+            return []
+        return self.viewmodel.get_page(page)
 
-        row = col = 0
-        for entry in page_entries:
-            frame = self._create_thumbnail_frame(entry)
-            frame.grid(row=row, column=col, padx=8, pady=4)
-            self.image_frames.append(frame)
-            col = (col + 1) % self.current_columns
-            if col == 0:
-                row += 1
+    def _draw_page(self):
+        if self.prefetcher is not None:
+            self.prefetcher.cancel()
+        with _page_draw_seconds.time():
+            self.cell_pool.layout(
+                self._page_entries(self.current_page), self.current_columns
+            )
+        self._update_page_controls()
+        self._prefetch_pages(self.current_page + 1, self.current_page - 1)
 
+    def _update_page_controls(self):
         self.page_entry.delete(0, "end")
         self.page_entry.insert(0, str(self.current_page + 1))
         self.prev_button.configure(
@@ -117,26 +250,44 @@ class App(BaseWindow):
         )
         self.total_label.configure(text=f"/ {self.total_pages}")
 
-    def _clear_gallery(self):
-        for frame in self.image_frames:
-            frame.destroy()
-        self.image_frames.clear()
-
-    def _create_thumbnail_frame(self, entry: ImageEntry):
-        frame = ctk.CTkFrame(self.gallery_frame)
-        thumb = ImageThumbnail(
-            frame,
-            entry.id,
-            Path(entry.thumbnail_path),
+    def _prefetch_pages(self, *pages: int):
+        """指定したページのサムネイルを先読み（先に指定したページを優先）
+
+        ページの行は先読みする側がアイドル時に引くので、ここではDBに問い合わせない。
+        """
+        if self.prefetcher is None:
+            return
+        self.prefetcher.schedule(p for p in pages if 0 <= p < self.total_pages)
+
+    def _page_thumbnails(self, page: int) -> list[Path]:
+        return [Path(entry.thumbnail_path) for entry in self._page_entries(page)]
+
+    def _is_loading(self) -> bool:
+        """表示中のページのサムネイルを読み込み中か"""
+        loader = self.thumbnail_loader
+        return loader is not None and loader.pending > 0
+
+    def _create_thumbnail_cell(self, parent=None) -> ThumbnailCell:
+        return ThumbnailCell(
+            parent or self.gallery_frame,
             self.thumbnail_size,
+            self.fonts,
             self._show_full_image,
+            loader=self.thumbnail_loader,
+            favorite_callback=self.viewmodel.toggle_favorite,
+            delete_callback=self._on_thumbnail_deleted,
         )
-        thumb.pack()
 
-        caption = ctk.CTkLabel(frame, text=Path(entry.image_path).name, font=self.fonts)
-        caption.pack()
+    def _start_library_sync(self) -> "LibrarySync | None":
+        if not LIBRARY_WATCH:
+            return None
+        from gui.library_sync import LibrarySync
+        from utils import library_watcher
 
-        return frame
+        if not library_watcher.is_available():
+            print("⚠ watchdog がないため、ライブラリの変更は次回の起動時に取り込みます")
+            return None
+        return LibrarySync(self, self._on_library_updated)
 
     def _calculate_columns(self):
         width = self.winfo_width()
@@ -145,7 +296,7 @@ class App(BaseWindow):
     # ---------------- FULL VIEW ----------------
 
     def _show_full_image(self, image_id: int):
-        entry = self.viewmodel.get_image_by_id(image_id)
+        entry = self.viewmodel.get_row(image_id)
         if not entry:
             return
 
@@ -159,11 +310,15 @@ class App(BaseWindow):
             is_fav=is_fav,
             toggle_fav_cb=self._toggle_favorite,
             delete_cb=self._on_delete,
+            similar=self.viewmodel.get_similar_images(image_id),
+            open_cb=self._show_full_image,
+            loader=self.thumbnail_loader,
         )
 
     def _toggle_favorite(self, image_id: int, button: ctk.CTkButton):
         new_state = self.viewmodel.toggle_favorite(image_id)
         if new_state is not None:
+            self._refresh_cell_states()
             button.configure(
                 text="♥" if new_state else "♡",
                 fg_color="#ff9eb5" if new_state else "#1f6aa5",
@@ -177,6 +332,65 @@ class App(BaseWindow):
 
     # ---------------- EVENTS ----------------
 
+    def destroy(self):
+        if self._completer_poll_id is not None:
+            self.after_cancel(self._completer_poll_id)
+        if self._page_typed_id is not None:
+            self.after_cancel(self._page_typed_id)
+        if self.ingest is not None:
+            self.ingest.shutdown()
+        if self.library_sync is not None:
+            self.library_sync.shutdown()
+        if self.viewmodel is not None:
+            self.viewmodel.close()
+        if self.thumbnail_loader is not None:
+            self.thumbnail_loader.shutdown()
+        if self.prefetcher is not None:
+            self.prefetcher.shutdown()
+        super().destroy()
+
+    def _refresh_cell_states(self):
+        """表示中のセルにスナップショットの状態を反映"""
+        cells = (
+            self.virtual_gallery.bound_cells
+            if self.virtual_mode
+            else self.cell_pool.bound_cells
+        )
+        for cell in cells:
+            cell.thumbnail.refresh_state()
+
+    def _on_thumbnail_deleted(self, image_id: int):
+        """画像を削除し、空いたマスを後続の画像で詰める"""
+        if not self.viewmodel.delete_image(image_id):
+            return
+        if self.virtual_mode:
+            self.viewmodel.reset_pages()
+            self._show_virtual_gallery(keep_position=True)
+            return
+        self._load_images()
+
+    def _set_status(self, text: str):
+        self.status_label.configure(text=text)
+
+    def _on_ingest_finished(self):
+        """起動時の取り込みが済んだら、以降の変更は監視で取り込む"""
+        self.ingest = None
+        self.library_sync = self._start_library_sync()
+
+    def _on_library_updated(self, update: "LibraryUpdate"):
+        """監視で取り込んだ変更を、影響するページだけ描き直して反映"""
+        first_page = self.viewmodel.invalidate_from(update.first_changed_id)
+        self.total_pages = self.viewmodel.count_pages()
+        if self.virtual_mode:
+            self._show_virtual_gallery(keep_position=True)
+            return
+        last_page = max(0, self.total_pages - 1)
+        self.current_page = min(self.current_page, last_page)
+        if self.current_page >= first_page:
+            self._draw_page()
+        else:
+            self._update_page_controls()
+
     def _on_toggle_favorites(self):
         self.viewmodel.toggle_favorites()
         self.toggle_button.configure(
@@ -187,6 +401,76 @@ class App(BaseWindow):
         self.current_page = 0
         self._load_images()
 
+    def _on_search_typed(self, event):
+        if event.keysym == "Return":
+            return
+        if not self.viewmodel.tag_completer_ready:
+            # 索引を作っている間は画面を止めず、できあがってから候補を出す
+            self._prepare_completer()
+            if self._completer_poll_id is None:
+                self._completer_poll_id = self.after(
+                    TAG_COMPLETER_POLL_MS, self._wait_for_completer
+                )
+            return
+        self._show_suggestions(self.viewmodel.suggest_tags(self.search_entry.get()))
+
+    def _prepare_completer(self):
+        """補完の索引を別スレッドで作り始める（作成中・作成済みなら何もしない）"""
+        if self.viewmodel.tag_completer_ready:
+            return
+        if self._completer_thread is None or not self._completer_thread.is_alive():
+            self._completer_thread = threading.Thread(
+                target=self.viewmodel.prepare_tag_completer, daemon=True
+            )
+            self._completer_thread.start()
+
+    def _wait_for_completer(self):
+        self._completer_poll_id = None
+        if self.viewmodel.tag_completer_ready:
+            self._show_suggestions(self.viewmodel.suggest_tags(self.search_entry.get()))
+        elif self._completer_thread is not None and self._completer_thread.is_alive():
+            self._completer_poll_id = self.after(
+                TAG_COMPLETER_POLL_MS, self._wait_for_completer
+            )
+
+    def _show_suggestions(self, suggestions: "list[TagSuggestion]"):
+        for i, button in enumerate(self.suggestion_buttons):
+            if i >= len(suggestions):
+                button.pack_forget()
+                continue
+            s = suggestions[i]
+            label = f"{s.tag}（{s.tag_ja}）" if s.tag_ja else s.tag
+            button.configure(
+                text=f"{label} {s.count}",
+                command=lambda tag=s.tag: self._apply_suggestion(tag),
+            )
+            button.pack(side="left", padx=(0, 4))
+
+    def _apply_suggestion(self, tag: str):
+        """入力中の語を選んだタグに置き換える"""
+        from utils.tag_complete import split_last_term
+
+        head, _ = split_last_term(self.search_entry.get())
+        self.search_entry.delete(0, "end")
+        self.search_entry.insert(0, f"{head}{tag} ")
+        self.search_entry.focus_set()
+        self._show_suggestions([])
+
+    def _on_tag_search(self, _):
+        from utils.tag_index import TagQueryError
+
+        try:
+            count = self.viewmodel.set_tag_query(self.search_entry.get())
+        except TagQueryError as e:
+            print(f"⚠ 検索式を読めません: {e}")
+            self.search_label.configure(text=f"⚠ {e}")
+            return
+        self.search_label.configure(
+            text=f"{count} 件" if self.viewmodel.tag_query else ""
+        )
+        self.current_page = 0
+        self._load_images()
+
     def _prev_page(self):
         if self.current_page > 0:
             self.current_page -= 1
@@ -208,10 +492,37 @@ class App(BaseWindow):
         except ValueError:
             print("⚠ 数字を入力してください")
 
+    def _on_page_typed(self, _):
+        # キーを押すたびにページを引かないよう、入力が止まるまで待つ
+        if self._page_typed_id is not None:
+            self.after_cancel(self._page_typed_id)
+        self._page_typed_id = self.after(
+            PAGE_INPUT_PREFETCH_DELAY_MS, self._prefetch_typed_page
+        )
+
+    def _prefetch_typed_page(self):
+        self._page_typed_id = None
+        try:
+            page = int(self.page_entry.get()) - 1
+        except ValueError:
+            return
+        if page != self.current_page:
+            self._prefetch_pages(page, self.current_page + 1, self.current_page - 1)
+
     def _on_resize(self, _):
         new_columns = self._calculate_columns()
-        if new_columns != self.current_columns:
-            self._load_images()
+        if self.virtual_mode:
+            self.current_columns = new_columns
+            self.virtual_gallery.set_columns(new_columns)
+            self.virtual_gallery.schedule_refresh()
+        elif new_columns != self.current_columns:
+            self.current_columns = new_columns
+            self._draw_page()
+
+    def _on_yview(self, first, last):
+        self.scrollbar.set(first, last)
+        if self.virtual_mode:
+            self.virtual_gallery.schedule_refresh()
 
     def _on_mousewheel(self, event):
         self.canvas.yview_scroll(-1 * int(event.delta / 120), "units")
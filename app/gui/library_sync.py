@@ -0,0 +1,58 @@
+import queue
+from collections.abc import Callable
+
+import customtkinter as ctk
+
+from config import LIBRARY_WATCH_POLL_MS
+from db.ingest import LibraryUpdate, apply_library_changes
+from utils.library_watcher import LibraryChanges, LibraryWatcher
+
+
+class LibrarySync:
+    """ライブラリの変更を監視スレッドで取り込み、結果をTkのメインループへ渡す
+
+    監視スレッドはDBへの反映まで行い、結果をキューに積むだけでウィジェットには
+    触れない。メインスレッドが after() でキューをポーリングし、溜まった結果を
+    まとめて on_update に渡す。
+    """
+
+    def __init__(
+        self,
+        root: ctk.CTk,
+        on_update: Callable[[LibraryUpdate], None],
+        poll_ms: int = LIBRARY_WATCH_POLL_MS,
+    ):
+        self._root = root
+        self._on_update = on_update
+        self._poll_ms = poll_ms
+        self._updates: queue.SimpleQueue[LibraryUpdate] = queue.SimpleQueue()
+        self._watcher = LibraryWatcher(self._ingest)
+        self._watcher.start()
+        self._poll_id: str | None = root.after(poll_ms, self._poll)
+
+    def _ingest(self, changes: LibraryChanges) -> None:
+        update = apply_library_changes(changes)
+        if update.first_changed_id is not None:
+            print(
+                f"📥 ライブラリの変更を反映: 追加 {update.added} 件 / "
+                f"削除 {update.removed} 件"
+            )
+            self._updates.put(update)
+
+    def _poll(self) -> None:
+        merged: LibraryUpdate | None = None
+        while True:
+            try:
+                update = self._updates.get_nowait()
+            except queue.Empty:
+                break
+            merged = update if merged is None else merged.merge(update)
+        if merged is not None:
+            self._on_update(merged)
+        self._poll_id = self._root.after(self._poll_ms, self._poll)
+
+    def shutdown(self) -> None:
+        if self._poll_id is not None:
+            self._root.after_cancel(self._poll_id)
+            self._poll_id = None
+        self._watcher.stop()
@@ -0,0 +1,116 @@
+import queue
+import time
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+import customtkinter as ctk
+from PIL import Image
+
+from config import THUMBNAIL_LOADER_POLL_MS, THUMBNAIL_LOADER_WORKERS
+from utils.image import get_image_manager
+
+LoadCallback = Callable[
+    [tuple[Image.Image, Image.Image] | None, Exception | None], None
+]
+
+# 1回のポーリングでコールバックに使う時間の上限（秒）
+POLL_BUDGET_SEC = 0.008
+
+
+class LoadRequest:
+    """読み込み要求。ウィジェットが破棄されたら cancel される"""
+
+    def __init__(self, callback: LoadCallback):
+        self.callback = callback
+        self.cancelled = False
+        self.future: Future | None = None
+
+
+class ThumbnailLoader:
+    """サムネイルのPIL処理をワーカースレッドで行い、結果をTkのメインループへ渡す
+
+    ワーカーは結果をキューに積むだけでウィジェットには触れない。
+    メインスレッドが after() でキューをポーリングし、コールバックを呼ぶ。
+    """
+
+    def __init__(
+        self,
+        root: ctk.CTk,
+        max_workers: int = THUMBNAIL_LOADER_WORKERS,
+        poll_ms: int = THUMBNAIL_LOADER_POLL_MS,
+    ):
+        self._root = root
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="thumbnail")
+        self._results: queue.SimpleQueue = queue.SimpleQueue()
+        self._poll_ms = poll_ms
+        self._poll_id: str | None = None
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        """結果をまだ受け取っていない要求の数"""
+        return self._pending
+
+    def submit(
+        self,
+        thumb_path: Path,
+        size: tuple[int, int],
+        shadow_offset: int,
+        callback: LoadCallback,
+    ) -> LoadRequest:
+        """読み込みを予約し、完了後にメインスレッドで callback を呼ぶ"""
+        request = LoadRequest(callback)
+        request.future = self._pool.submit(
+            self._work, request, thumb_path, size, shadow_offset
+        )
+        self._pending += 1
+        self._schedule_poll()
+        return request
+
+    def cancel(self, request: LoadRequest) -> None:
+        """未着手なら実行を取り消し、実行中なら結果を捨てる"""
+        request.cancelled = True
+        if request.future is not None and request.future.cancel():
+            self._pending -= 1
+
+    def shutdown(self) -> None:
+        if self._poll_id is not None:
+            self._root.after_cancel(self._poll_id)
+            self._poll_id = None
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _work(
+        self,
+        request: LoadRequest,
+        thumb_path: Path,
+        size: tuple[int, int],
+        shadow_offset: int,
+    ) -> None:
+        result = error = None
+        if not request.cancelled:
+            try:
+                result = get_image_manager().load_thumbnail_images(
+                    thumb_path, size, shadow_offset
+                )
+            except Exception as e:  # noqa: BLE001 例外は表示側に渡して報告する
+                error = e
+        self._results.put((request, result, error))
+
+    def _schedule_poll(self) -> None:
+        if self._poll_id is None:
+            self._poll_id = self._root.after(self._poll_ms, self._poll)
+
+    def _poll(self) -> None:
+        self._poll_id = None
+        deadline = time.perf_counter() + POLL_BUDGET_SEC
+        while time.perf_counter() < deadline:
+            try:
+                request, result, error = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._pending -= 1
+            if not request.cancelled:
+                request.callback(result, error)
+        if self._pending > 0:
+            self._schedule_poll()
@@ -1,17 +1,37 @@
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 import customtkinter as ctk
-from db.models import ImageEntry
+
+from config import SHADOW_OFFSET, THUMBNAIL_SIZE
+from db.rows import GalleryRow
 from gui.base import BaseToplevel
 from gui.components.button import create_delete_button, create_favorite_button
-from utils.image import image_manager
+from gui.loader import LoadRequest, ThumbnailLoader
+from utils.image import IMAGE_LOAD_ERRORS, get_image_manager
+
+if TYPE_CHECKING:
+    from db.models import ImageEntry
+
+SIMILAR_COLUMNS = 3
 
 
 class Original(BaseToplevel):
     def __init__(
-        self, parent, entry: ImageEntry, tags, is_fav, toggle_fav_cb, delete_cb
+        self,
+        parent,
+        entry: "GalleryRow | ImageEntry",
+        tags,
+        is_fav,
+        toggle_fav_cb,
+        delete_cb,
+        similar: list[GalleryRow] = (),
+        open_cb=None,
+        loader: ThumbnailLoader | None = None,
     ):
         super().__init__(parent)
+        self.loader = loader
+        self._requests: list[LoadRequest] = []
         self.title(Path(entry.image_path).name)
 
         # メイン横並び
@@ -25,7 +45,7 @@ class Original(BaseToplevel):
         image_frame = ctk.CTkFrame(left_frame, fg_color="transparent")
         image_frame.pack()
 
-        label = image_manager.load_full_image(image_frame, entry.image_path)
+        label = get_image_manager().load_full_image(image_frame, entry.image_path)
         label.pack(anchor="w")
 
         fav_button = create_favorite_button(
@@ -77,7 +97,47 @@ class Original(BaseToplevel):
         # --- マウスホイールのバインド
         self.enable_mousewheel_scroll(canvas)
 
-        # ダミーのサムネイルを追加
-        for i in range(30):
-            thumb = ctk.CTkLabel(scrollable_frame, text=f"Thumb {i + 1}", anchor="w")
-            thumb.pack(padx=10, pady=5, anchor="w")
+        self._add_similar_images(scrollable_frame, similar, open_cb)
+
+    def _add_similar_images(self, frame, similar: list[GalleryRow], open_cb):
+        """類似画像のサムネイルを並べる"""
+        if not similar:
+            ctk.CTkLabel(frame, text="類似画像はありません").pack(padx=10, pady=5)
+            return
+        for i, row in enumerate(similar):
+            label = ctk.CTkLabel(
+                frame, text="", width=THUMBNAIL_SIZE[0], height=THUMBNAIL_SIZE[1]
+            )
+            label.grid(
+                row=i // SIMILAR_COLUMNS, column=i % SIMILAR_COLUMNS, padx=5, pady=5
+            )
+            if open_cb:
+                label.bind("<Button-1>", lambda e, image_id=row.id: open_cb(image_id))
+            self._load_thumbnail(label, Path(row.thumbnail_path))
+
+    def _load_thumbnail(self, label: ctk.CTkLabel, thumb_path: Path):
+        def show(images, error):
+            if error is not None:
+                print(f"[Error] loading {thumb_path}: {error}")
+                return
+            photo = ctk.CTkImage(light_image=images[0], size=THUMBNAIL_SIZE)
+            label.configure(image=photo)
+
+        if self.loader is not None:
+            self._requests.append(
+                self.loader.submit(thumb_path, THUMBNAIL_SIZE, SHADOW_OFFSET, show)
+            )
+            return
+        try:
+            photo, _ = get_image_manager().load_thumbnail_image(
+                thumb_path, THUMBNAIL_SIZE, SHADOW_OFFSET
+            )
+            label.configure(image=photo)
+        except IMAGE_LOAD_ERRORS as e:
+            print(f"[Error] loading {thumb_path}: {e}")
+
+    def destroy(self):
+        if self.loader is not None:
+            for request in self._requests:
+                self.loader.cancel(request)
+        super().destroy()
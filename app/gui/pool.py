@@ -0,0 +1,59 @@
+from collections.abc import Callable, Sequence
+
+from db.rows import GalleryRow
+from gui.thumbnail import ThumbnailCell
+
+
+class CellPool:
+    """ギャラリーのセルを使い回すプール
+
+    ページ送りや列数の変更ではウィジェットを作り直さず、既存のセルに
+    新しいエントリを割り当てて配置し直す。セルを新しく作るのは、
+    表示する件数がこれまでの最大を超えたときだけ。
+    """
+
+    def __init__(self, factory: Callable[[], ThumbnailCell], padx=8, pady=4):
+        self._factory = factory
+        self._padx = padx
+        self._pady = pady
+        self._cells: list[ThumbnailCell] = []
+        self._positions: dict[int, tuple[int, int]] = {}  # セル番号 → (行, 列)
+
+    @property
+    def created(self) -> int:
+        """これまでに作ったセルの数"""
+        return len(self._cells)
+
+    @property
+    def bound_cells(self) -> list[ThumbnailCell]:
+        """エントリを割り当て中のセル"""
+        return [self._cells[index] for index in self._positions]
+
+    def layout(
+        self, entries: Sequence[GalleryRow], columns: int
+    ) -> list[ThumbnailCell]:
+        """entries を columns 列で並べ、余ったセルは非表示にする"""
+        while len(self._cells) < len(entries):
+            self._cells.append(self._factory())
+
+        for index, entry in enumerate(entries):
+            cell = self._cells[index]
+            cell.bind_entry(entry)
+            position = divmod(index, columns)
+            if self._positions.get(index) != position:
+                row, column = position
+                cell.grid(row=row, column=column, padx=self._padx, pady=self._pady)
+                self._positions[index] = position
+
+        for index in range(len(entries), len(self._cells)):
+            if self._positions.pop(index, None) is not None:
+                self._cells[index].release()
+                self._cells[index].grid_remove()
+        return self._cells[: len(entries)]
+
+    def clear(self) -> None:
+        """すべてのセルを破棄"""
+        for cell in self._cells:
+            cell.destroy()
+        self._cells.clear()
+        self._positions.clear()
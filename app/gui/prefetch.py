@@ -0,0 +1,94 @@
+import threading
+from collections.abc import Callable, Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+import customtkinter as ctk
+
+from config import PREFETCH_WORKERS, SHADOW_OFFSET
+from utils.image import IMAGE_LOAD_ERRORS, get_image_manager
+
+# 表示中のページの読み込みが残っている間、先読みを待たせる間隔（秒）
+BUSY_WAIT_SEC = 0.02
+
+
+class PagePrefetcher:
+    """描画後のアイドル時間に前後のページのサムネイルをキャッシュへ読み込む
+
+    ページの行はアイドル時に1ページずつ page_paths() で引き、
+    表示中のページの読み込みを邪魔しないよう少数のスレッドで1枚ずつ処理する。
+    is_busy() が真の間は待機する。別のページへ移動したら未着手の分は破棄する。
+    """
+
+    def __init__(
+        self,
+        root: ctk.CTk,
+        size: tuple[int, int],
+        page_paths: Callable[[int], Iterable[Path]],
+        shadow_offset: int = SHADOW_OFFSET,
+        max_workers: int = PREFETCH_WORKERS,
+        is_busy: Callable[[], bool] | None = None,
+    ):
+        self._root = root
+        self._size = size
+        self._page_paths = page_paths
+        self._shadow_offset = shadow_offset
+        self._is_busy = is_busy or (lambda: False)
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="prefetch")
+        self._generation = 0
+        self._futures: list[Future] = []
+        self._idle_id: str | None = None
+        self._stopped = threading.Event()
+
+    def schedule(self, pages: Iterable[int]) -> None:
+        """これまでの先読みを取り消し、アイドル時に pages の先読みを始める"""
+        self.cancel()
+        generation = self._generation
+        pages = list(pages)
+        self._idle_id = self._root.after_idle(lambda: self._start(generation, pages))
+
+    def cancel(self) -> None:
+        """未着手の先読みをすべて取り消す"""
+        self._generation += 1
+        if self._idle_id is not None:
+            self._root.after_cancel(self._idle_id)
+            self._idle_id = None
+        for future in self._futures:
+            future.cancel()
+        self._futures.clear()
+
+    def shutdown(self) -> None:
+        self.cancel()
+        self._stopped.set()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _start(self, generation: int, pages: list[int]) -> None:
+        """先頭のページの行を引いてワーカーに渡し、残りは次のアイドル時に回す"""
+        self._idle_id = None
+        if not pages:
+            return
+        if self._is_busy():
+            self._idle_id = self._root.after(
+                round(BUSY_WAIT_SEC * 1000), lambda: self._start(generation, pages)
+            )
+            return
+        self._futures.extend(
+            self._pool.submit(self._warm, generation, Path(path))
+            for path in self._page_paths(pages[0])
+        )
+        self._idle_id = self._root.after_idle(
+            lambda: self._start(generation, pages[1:])
+        )
+
+    def _warm(self, generation: int, path: Path) -> None:
+        while self._is_busy() and not self._stopped.wait(BUSY_WAIT_SEC):
+            if generation != self._generation:
+                return
+        if generation != self._generation or self._stopped.is_set():
+            return
+        try:
+            get_image_manager().load_thumbnail_images(
+                path, self._size, self._shadow_offset
+            )
+        except IMAGE_LOAD_ERRORS:
+            pass  # 表示時に改めて読み込み、そこでエラーを報告する
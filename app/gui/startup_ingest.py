@@ -0,0 +1,142 @@
+import queue
+import threading
+from collections.abc import Callable
+
+import customtkinter as ctk
+
+from config import AUTO_TAGGER, BACKGROUND_INGEST_POLL_MS
+from db.ingest import LibraryUpdate, sync_library, tag_untagged_images
+from db.query import count_untagged_images, get_max_image_id
+
+# ワーカーが処理を終えたことを知らせる印
+_FINISHED = object()
+
+
+class IngestCancelled(Exception):
+    """画面を閉じたので取り込みを打ち切る"""
+
+
+class BackgroundIngest:
+    """起動時の取り込みをワーカースレッドで行い、進捗と追加分をTkのメインループへ渡す
+
+    ワーカーはバッチをコミットするたびに、状態の文言と追加分をキューに積む。
+    メインスレッドが after() でポーリングし、溜まった追加分をまとめて on_update に
+    渡すので、登録済みの画像を表示したまま新しいページが末尾に増えていく。
+    中断してもコミット済みのバッチは残り、次回の起動で続きから取り込む。
+    """
+
+    def __init__(
+        self,
+        root: ctk.CTk,
+        on_status: Callable[[str], None],
+        on_update: Callable[[LibraryUpdate], None],
+        on_finished: Callable[[], None],
+        full_scan: bool = False,
+        poll_ms: int = BACKGROUND_INGEST_POLL_MS,
+    ):
+        self._root = root
+        self._on_status = on_status
+        self._on_update = on_update
+        self._on_finished = on_finished
+        self._full_scan = full_scan
+        self._poll_ms = poll_ms
+        self._poll_id: str | None = None
+        self._messages: queue.SimpleQueue = queue.SimpleQueue()
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="ingest", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+        self._poll_id = self._root.after(self._poll_ms, self._poll)
+
+    def shutdown(self, timeout: float = 10.0) -> None:
+        """取り込みを打ち切り、処理中のバッチのコミットを待つ"""
+        self._cancelled.set()
+        if self._poll_id is not None:
+            self._root.after_cancel(self._poll_id)
+            self._poll_id = None
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+    # ---------------- WORKER ----------------
+
+    def _check_cancelled(self) -> None:
+        if self._cancelled.is_set():
+            raise IngestCancelled
+
+    def _run(self) -> None:
+        try:
+            self._sync()
+            if AUTO_TAGGER:
+                self._tag()
+        except IngestCancelled:
+            return
+        except Exception as e:  # noqa: BLE001 どんな失敗も画面に出して終える
+            self._messages.put(f"❌ 取り込みに失敗しました: {e}")
+        self._messages.put(_FINISHED)
+
+    def _sync(self) -> None:
+        last_id = get_max_image_id()
+        inserted = 0
+
+        def on_batch(count: int) -> None:
+            nonlocal last_id, inserted
+            # 新しい画像は id の末尾に並ぶので、増えたのは前回の最大より後ろだけ
+            max_id = get_max_image_id()
+            inserted += count
+            self._messages.put(LibraryUpdate(count, 0, last_id + 1))
+            self._messages.put(f"🔍 ライブラリを取り込み中… {inserted:,} 件登録")
+            last_id = max_id
+            self._check_cancelled()
+
+        self._messages.put("🔍 ライブラリの変更を確認中…")
+        result, inserted = sync_library(self._full_scan, on_batch=on_batch)
+        if result.removed:
+            # 削除した画像の位置は分からないので、先頭から作り直す
+            self._messages.put(LibraryUpdate(0, len(result.removed), 1))
+        self._messages.put(
+            f"✅ 新規・変更 {inserted:,} 件を登録 / 削除 {len(result.removed):,} 件"
+        )
+
+    def _tag(self) -> None:
+        total = count_untagged_images()
+        if not total:
+            return
+        tagged = 0
+
+        def on_batch(count: int) -> None:
+            nonlocal tagged
+            tagged += count
+            self._messages.put(f"🏷 自動タグ付け中… {tagged:,} / {total:,} 件")
+            self._check_cancelled()
+
+        self._messages.put(f"🏷 自動タグ付け中（{AUTO_TAGGER}）…")
+        tagged = tag_untagged_images(AUTO_TAGGER, on_batch=on_batch)
+        self._messages.put(f"✅ {tagged:,} 件にタグを付与")
+
+    # ---------------- MAIN THREAD ----------------
+
+    def _poll(self) -> None:
+        update: LibraryUpdate | None = None
+        status: str | None = None
+        finished = False
+        while True:
+            try:
+                message = self._messages.get_nowait()
+            except queue.Empty:
+                break
+            if message is _FINISHED:
+                finished = True
+            elif isinstance(message, LibraryUpdate):
+                update = message if update is None else update.merge(message)
+            else:
+                status = message
+        if update is not None:
+            self._on_update(update)
+        if status is not None:
+            self._on_status(status)
+        if finished:
+            self._poll_id = None
+            self._on_finished()
+            return
+        self._poll_id = self._root.after(self._poll_ms, self._poll)
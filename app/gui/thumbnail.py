@@ -1,35 +1,59 @@
+from collections.abc import Callable
+from pathlib import Path
+
 import customtkinter as ctk
+
 from config import SHADOW_OFFSET
+from db.rows import GalleryRow
 from gui.components.button import create_delete_button, create_favorite_button
-from gui.viewmodel import ImageThumbnailViewModel
-from utils.image import image_manager
+from gui.loader import LoadRequest, ThumbnailLoader
+from utils.image import IMAGE_LOAD_ERRORS, get_image_manager
 
 
 class ImageThumbnail(ctk.CTkFrame):
-    def __init__(self, parent, image_id, image_path, size, click_callback=None):
+    """サムネイル1枚。状態はページのスナップショット（GalleryRow）から読む"""
+
+    def __init__(
+        self,
+        parent,
+        size,
+        click_callback=None,
+        loader: ThumbnailLoader | None = None,
+        favorite_callback: Callable[[int], bool | None] | None = None,
+        delete_callback: Callable[[int], None] | None = None,
+    ):
         super().__init__(parent, fg_color="#333333", corner_radius=10)
-        self.image_id = image_id
-        self.image_path = image_path
+        self.row: GalleryRow | None = None
         self.size = size
         self.click_callback = click_callback
+        self.favorite_callback = favorite_callback
+        self.delete_callback = delete_callback
+        self.loader = loader
+        self._request: LoadRequest | None = None
         self._photo = None
         self._hover_photo = None
 
-        self.viewmodel = ImageThumbnailViewModel(self.image_id, self.image_path)
-
         self._setup_widgets()
         self._setup_buttons()
         self._bind_events()
 
+    @property
+    def image_id(self) -> int | None:
+        return self.row.id if self.row else None
+
+    @property
+    def image_path(self) -> Path | None:
+        return Path(self.row.thumbnail_path) if self.row else None
+
     def _setup_widgets(self):
-        self.label = ctk.CTkLabel(self, text="")
+        # 読み込み完了まで同じ大きさの空ラベルを置き、レイアウトを崩さない
+        width, height = self.size
+        self.label = ctk.CTkLabel(self, text="", width=width, height=height)
         self.label.pack()
-        self._load_image()
 
     def _setup_buttons(self):
-        is_fav = self.viewmodel.get_favorite_state()
         self.favorite_button = create_favorite_button(
-            self, is_fav, self._toggle_favorite
+            self, False, self._toggle_favorite
         )
         self.favorite_button.place(relx=1.0, rely=1.0, anchor="se", x=-4, y=-4)
 
@@ -42,16 +66,68 @@ class ImageThumbnail(ctk.CTkFrame):
         self.label.bind("<Enter>", self._on_enter)
         self.label.bind("<Leave>", self._on_leave)
 
+    def bind_image(self, row: GalleryRow):
+        """別の画像を表示するようにウィジェットを使い回す"""
+        same_image = self.row is not None and (
+            row.id == self.row.id and row.thumbnail_path == self.row.thumbnail_path
+        )
+        self.row = row
+        self.refresh_state()
+        if same_image and (self._photo is not None or self._request is not None):
+            return
+
+        self._release_image()
+        if self.loader is not None:
+            self._request = self.loader.submit(
+                self.image_path, self.size, SHADOW_OFFSET, self._on_loaded
+            )
+        else:
+            self._load_image()
+
+    def refresh_state(self):
+        """スナップショットのお気に入り状態をボタンに反映"""
+        if self.row is not None:
+            self._set_favorite_state(self.row.is_favorite)
+
+    def release(self):
+        """表示中の画像とスナップショットを手放す"""
+        self._release_image()
+        self.row = None
+
+    def _release_image(self):
+        if self._request is not None and self.loader is not None:
+            self.loader.cancel(self._request)
+        self._request = None
+        self._photo = self._hover_photo = None
+        self.label.configure(image="")
+
     def _load_image(self):
         try:
-            self._photo, self._hover_photo = image_manager.load_thumbnail_image(
+            self._photo, self._hover_photo = get_image_manager().load_thumbnail_image(
                 str(self.image_path), self.size, SHADOW_OFFSET
             )
             if self._photo:
                 self.label.configure(image=self._photo)
-        except Exception as e:
+        except IMAGE_LOAD_ERRORS as e:
             print(f"[Error] loading {self.image_path}: {e}")
 
+    def _on_loaded(self, images, error):
+        """バックグラウンドでの読み込み完了時にメインスレッドで呼ばれる"""
+        self._request = None
+        if error is not None:
+            print(f"[Error] loading {self.image_path}: {error}")
+            return
+        final_img, hover_img = images
+        self._photo = ctk.CTkImage(light_image=final_img, size=self.size)
+        self._hover_photo = ctk.CTkImage(light_image=hover_img, size=self.size)
+        self.label.configure(image=self._photo)
+
+    def destroy(self):
+        if self._request is not None and self.loader is not None:
+            self.loader.cancel(self._request)
+            self._request = None
+        super().destroy()
+
     def _on_enter(self, _):
         if self._hover_photo:
             self.label.configure(image=self._hover_photo)
@@ -61,15 +137,54 @@ class ImageThumbnail(ctk.CTkFrame):
             self.label.configure(image=self._photo)
 
     def _on_delete(self):
-        success = self.viewmodel.delete_image()
-        if success:
-            self.destroy()
+        if self.delete_callback and self.row is not None:
+            self.delete_callback(self.image_id)
 
     def _toggle_favorite(self):
-        new_state = self.viewmodel.toggle_favorite()
-        if new_state is not None:
-            self.favorite_button.configure(
-                text="♥" if new_state else "♡",
-                fg_color="#ff9eb5" if new_state else "#1f6aa5",
-                hover_color="#c268a7" if new_state else "#124c86",
-            )
+        if (
+            self.favorite_callback
+            and self.row is not None
+            and self.favorite_callback(self.image_id) is not None
+        ):
+            self.refresh_state()
+
+    def _set_favorite_state(self, is_favorite: bool):
+        self.favorite_button.configure(
+            text="♥" if is_favorite else "♡",
+            fg_color="#ff9eb5" if is_favorite else "#1f6aa5",
+            hover_color="#c268a7" if is_favorite else "#124c86",
+        )
+
+
+class ThumbnailCell(ctk.CTkFrame):
+    """サムネイルとファイル名を並べたギャラリーの1マス。ページをまたいで使い回す"""
+
+    def __init__(
+        self,
+        parent,
+        size: tuple[int, int],
+        font,
+        click_callback=None,
+        loader: ThumbnailLoader | None = None,
+        favorite_callback: Callable[[int], bool | None] | None = None,
+        delete_callback: Callable[[int], None] | None = None,
+    ):
+        super().__init__(parent)
+        self.thumbnail = ImageThumbnail(
+            self,
+            size,
+            click_callback,
+            loader=loader,
+            favorite_callback=favorite_callback,
+            delete_callback=delete_callback,
+        )
+        self.thumbnail.pack()
+        self.caption = ctk.CTkLabel(self, text="", font=font)
+        self.caption.pack()
+
+    def bind_entry(self, entry: GalleryRow):
+        self.thumbnail.bind_image(entry)
+        self.caption.configure(text=Path(entry.image_path).name)
+
+    def release(self):
+        self.thumbnail.release()
@@ -1,19 +1,61 @@
-from db.models import ImageEntry
-from db.query import (
-    delete_image_entry,
-    get_all_image_entries,
-    get_favorite_flag,
-    get_favorite_image_entries,
-    get_image_entry_by_id,
-    get_tags_for_image,
-    toggle_favorite_flag,
+import threading
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+from config import (
+    ANN_INDEX_DIR,
+    GALLERY_PAGE_SIZE,
+    SIMILAR_IMAGE_COUNT,
+    TAG_SEARCH_INCLUDE_R18,
+    TAG_SUGGESTION_COUNT,
 )
+from db import events, query
+from db.rows import GalleryRow
+from utils.ann import IVFPQIndex
+from utils.embedding import EmbeddingIndex
+from utils.tag_complete import TagCompleter, TagSuggestion, split_last_term
+from utils.tag_index import TagIndex
+
+# 仮想スクロールで保持しておくページ数
+PAGE_CACHE_SIZE = 8
 
 
 class GalleryViewModel:
-    def __init__(self):
+    def __init__(self, page_size: int = GALLERY_PAGE_SIZE):
         self._show_favorites_only = False
-        self._entries: list[ImageEntry] = []
+        self.page_size = page_size
+        # ページ番号 → そのページの直前のエントリのid（キーセットの起点）
+        self._anchors: dict[int, int] = {0: 0}
+        self._pages: OrderedDict[int, list[GalleryRow]] = OrderedDict()
+        # 取得済みページの行を id で引くためのスナップショット
+        self._rows: dict[int, GalleryRow] = {}
+        self._embedding_index: EmbeddingIndex | IVFPQIndex | None = None
+        # タグの検索式と、それに一致する画像 id（ページを作り直すたびに求め直す）
+        self._tag_query: str | None = None
+        self._tag_index: TagIndex | None = None
+        self._filtered_ids: np.ndarray | None = None
+        self._tag_completer: TagCompleter | None = None
+        self._completer_lock = threading.Lock()
+        # DBの通知は書き込んだスレッドで届くので、埋め込みとタグの索引の
+        # 作成・差し替えと通知による更新はこのロックの中で行う
+        self._index_lock = threading.RLock()
+        events.images_added.connect(self._on_images_added)
+        events.images_deleted.connect(self._on_images_deleted)
+        events.tags_added.connect(self._on_tags_added)
+        events.image_tags_added.connect(self._on_image_tags_added)
+        events.embeddings_updated.connect(self._on_embeddings_updated)
+
+    def close(self):
+        """DBの通知を解除し、近似索引の差分を保存"""
+        events.images_added.disconnect(self._on_images_added)
+        events.images_deleted.disconnect(self._on_images_deleted)
+        events.tags_added.disconnect(self._on_tags_added)
+        events.image_tags_added.disconnect(self._on_image_tags_added)
+        events.embeddings_updated.disconnect(self._on_embeddings_updated)
+        with self._index_lock:
+            if isinstance(self._embedding_index, IVFPQIndex):
+                self._embedding_index.flush()
 
     @property
     def show_favorites_only(self):
@@ -21,42 +63,265 @@ class GalleryViewModel:
 
     def toggle_favorites(self):
         self._show_favorites_only = not self._show_favorites_only
+        self.reset_pages()
+
+    @property
+    def tag_query(self) -> str | None:
+        return self._tag_query
+
+    def set_tag_query(self, text: str) -> int:
+        """タグの検索式で絞り込み、一致した件数を返す（空文字で解除）
+
+        式が読めなければ TagQueryError を送出し、絞り込みは変えない。
+        """
+        text = text.strip() or None
+        if text is not None:
+            self._get_tag_index().search(text, TAG_SEARCH_INCLUDE_R18)
+        self._tag_query = text
+        self.reset_pages()
+        return self.count_entries()
+
+    def _get_tag_index(self) -> TagIndex:
+        """image_tags から転置索引を一括で作る（初回のみ）"""
+        with self._index_lock:
+            if self._tag_index is None:
+                index = TagIndex()
+                index.set_tags(query.load_tags())
+                index.add_images(*query.load_image_ids())
+                index.add_pairs(*query.load_image_tags())
+                self._tag_index = index
+            return self._tag_index
+
+    def suggest_tags(
+        self, text: str, limit: int = TAG_SUGGESTION_COUNT
+    ) -> list[TagSuggestion]:
+        """検索欄で入力中の語に続くタグを、よく使われている順に返す
+
+        索引を作っている間は待たずに空を返す（作り終えたら呼び直すこと）。
+        """
+        completer = self._tag_completer
+        if completer is None:
+            return []
+        _, prefix = split_last_term(text)
+        return completer.suggest(prefix, limit)
+
+    @property
+    def tag_completer_ready(self) -> bool:
+        return self._tag_completer is not None
+
+    def prepare_tag_completer(self) -> TagCompleter:
+        """補完用の索引を作る（初回のみ。別スレッドから先に呼んでおける）"""
+        with self._completer_lock:
+            if self._tag_completer is None:
+                completer = TagCompleter()
+                completer.build(query.load_tags(), query.count_tag_usage())
+                self._tag_completer = completer
+            return self._tag_completer
+
+    def _get_filtered_ids(self) -> np.ndarray:
+        if self._filtered_ids is None:
+            ids = self._get_tag_index().search(self._tag_query, TAG_SEARCH_INCLUDE_R18)
+            if self._show_favorites_only:
+                ids = np.intersect1d(ids, query.get_favorite_ids(), assume_unique=True)
+            self._filtered_ids = ids
+        return self._filtered_ids
+
+    def count_entries(self) -> int:
+        if self._tag_query is not None:
+            return len(self._get_filtered_ids())
+        return query.count_image_entries(self._show_favorites_only)
 
-    def get_entries(self):
-        self._entries = (
-            get_favorite_image_entries()
-            if self._show_favorites_only
-            else get_all_image_entries()
-        )
-        return self._entries
+    def count_pages(self) -> int:
+        return -(-self.count_entries() // self.page_size)
 
-    def get_image_by_id(self, image_id):
-        return get_image_entry_by_id(image_id)
+    def get_page(self, page: int) -> list[GalleryRow]:
+        """1ページ分だけをDBから取得"""
+        if page < 0:
+            return []
+        rows = self._pages.get(page)
+        if rows is not None:
+            self._pages.move_to_end(page)
+            return rows
+
+        if self._tag_query is not None:
+            start = page * self.page_size
+            ids = self._get_filtered_ids()[start : start + self.page_size]
+            rows = query.get_gallery_rows_by_ids(ids.tolist())
+        else:
+            rows = self._fetch_keyset_page(page)
+            if rows is None:
+                return []
+        self._pages[page] = rows
+        self._rows.update((row.id, row) for row in rows)
+        while len(self._pages) > PAGE_CACHE_SIZE:
+            _, evicted = self._pages.popitem(last=False)
+            for row in evicted:
+                self._rows.pop(row.id, None)
+        return rows
+
+    def _fetch_keyset_page(self, page: int) -> list[GalleryRow] | None:
+        anchor = self._anchors.get(page)
+        if anchor is None:
+            anchor = query.get_page_anchor(
+                page * self.page_size, self._show_favorites_only
+            )
+            if anchor is None:
+                return None
+        rows = query.get_gallery_page(anchor, self.page_size, self._show_favorites_only)
+        if rows:
+            self._anchors[page] = anchor
+        if len(rows) == self.page_size:  # 最後のページには後続の起点を作らない
+            self._anchors[page + 1] = rows[-1].id
+        return rows
+
+    def find_row(self, image_id: int) -> GalleryRow | None:
+        """取得済みのページから行を探す（DBには問い合わせない）"""
+        return self._rows.get(image_id)
+
+    def get_range(self, offset: int, limit: int) -> list[GalleryRow]:
+        """offset 件目から limit 件を、ページ単位の取得を組み合わせて返す"""
+        rows: list[GalleryRow] = []
+        while len(rows) < limit:
+            page, index = divmod(offset + len(rows), self.page_size)
+            chunk = self.get_page(page)[index : index + limit - len(rows)]
+            if not chunk:
+                break
+            rows.extend(chunk)
+        return rows
+
+    def reset_pages(self, keep_until: int = -1):
+        """取得済みのページを破棄。keep_until 以前のページの起点は残す"""
+        self._anchors = {p: a for p, a in self._anchors.items() if p <= keep_until}
+        self._anchors[0] = 0
+        self._pages.clear()
+        self._rows.clear()
+        self._filtered_ids = None
+
+    def invalidate_from(self, image_id: int) -> int:
+        """image_id 以降の追加・削除で中身が変わるページを破棄し、その最初のページを返す
+
+        一覧は id 順なので、それより前のページは取得済みのまま使い続ける。
+        """
+        filtered = self._filtered_ids
+        if self._tag_query is not None and filtered is not None:
+            first = int(np.searchsorted(filtered, image_id)) // self.page_size
+        else:
+            first = max(p for p, anchor in self._anchors.items() if anchor < image_id)
+        self._anchors = {p: a for p, a in self._anchors.items() if p <= first}
+        for page in [p for p in self._pages if p >= first]:
+            for row in self._pages.pop(page):
+                self._rows.pop(row.id, None)
+        self._filtered_ids = None
+        return first
+
+    def get_row(self, image_id: int) -> GalleryRow | None:
+        """取得済みのページになければ、一覧と同じ列だけをDBから引く"""
+        row = self.find_row(image_id)
+        if row is not None:
+            return row
+        rows = query.get_gallery_rows_by_ids([image_id])
+        return rows[0] if rows else None
 
     def get_favorite_state(self, image_id) -> bool:
-        return get_favorite_flag(image_id)
+        row = self.find_row(image_id)
+        if row is not None:
+            return row.is_favorite
+        return query.get_favorite_flag(image_id)
 
-    def toggle_favorite(self, image_id) -> bool:
-        return toggle_favorite_flag(image_id)
+    def toggle_favorite(self, image_id) -> bool | None:
+        """お気に入りを切り替え、スナップショットにも反映"""
+        row = self.find_row(image_id)
+        if row is None:
+            return query.toggle_favorite_flag(image_id)
+        if not query.set_favorite_flag(image_id, not row.is_favorite):
+            return None
+        row.is_favorite = not row.is_favorite
+        return row.is_favorite
 
     def delete_image(self, image_id) -> bool:
-        return delete_image_entry(image_id)
+        return query.delete_image_entry(image_id)
 
-    def get_tags_for_image(self, image_id):
-        """Fetch tags associated with a specific image."""
-        return get_tags_for_image(image_id)
+    def get_similar_images(
+        self, image_id: int, k: int = SIMILAR_IMAGE_COUNT
+    ) -> list[GalleryRow]:
+        """タグ埋め込みのコサイン類似度が高い画像を返す"""
+        with self._index_lock:
+            if self._embedding_index is None:
+                self._embedding_index = self._load_embedding_index()
+            index = self._embedding_index
+        hits = index.similar_to(image_id, k)
+        return query.get_gallery_rows_by_ids(i for i, _ in hits)
+
+    def _load_embedding_index(self) -> EmbeddingIndex | IVFPQIndex:
+        """近似索引があれば開いて未登録の行を追加し、なければ総当たりにする"""
+        if not (ANN_INDEX_DIR / "meta.json").exists():
+            return EmbeddingIndex(*query.load_embeddings())
+        index = IVFPQIndex.open(ANN_INDEX_DIR)
+        index.add(*query.load_embeddings(after_id=index.max_id))
+        return index
+
+    def reload_embeddings(self):
+        """埋め込みが更新されたときに次回の検索で読み込み直す"""
+        with self._index_lock:
+            self._embedding_index = None
 
+    def _on_images_added(self):
+        with self._index_lock:
+            index = self._embedding_index
+            if isinstance(index, IVFPQIndex):
+                index.add(*query.load_embeddings(after_id=index.max_id))
+            else:
+                self._embedding_index = None
+            tag_index = self._tag_index
+            if tag_index is not None:
+                tag_index.add_images(*query.load_image_ids(tag_index.max_image_id))
 
-class ImageThumbnailViewModel:
-    def __init__(self, image_id: int, image_path: str):
-        self.image_id = image_id
-        self.image_path = image_path
+    def _on_images_deleted(self, image_ids: list[int]):
+        with self._index_lock:
+            index = self._embedding_index
+            if isinstance(index, IVFPQIndex):
+                index.remove(image_ids)
+            else:
+                self._embedding_index = None
+            if self._tag_index is not None:
+                self._tag_index.remove_images(image_ids)
 
-    def get_favorite_state(self) -> bool:
-        return get_favorite_flag(self.image_id)
+    def _on_tags_added(self, tags):
+        with self._index_lock:
+            if self._tag_index is not None:
+                self._tag_index.set_tags(tags)
+        with self._completer_lock:
+            if self._tag_completer is not None:
+                self._tag_completer.add_tags(tags)
 
-    def toggle_favorite(self) -> bool:
-        return toggle_favorite_flag(self.image_id)
+    def _on_image_tags_added(self, image_ids: list[int], tag_ids: list[int]):
+        # 作成中の索引があれば、作り終えるまで待ってから反映する
+        with self._index_lock:
+            tag_index = self._tag_index
+        with self._completer_lock:
+            completer = self._tag_completer
+        if tag_index is None and completer is None:
+            return
+        # 通知を経ずに登録されたタグは名前をDBから読む
+        known = tag_index or completer
+        unknown = known.unknown_tags(tag_ids)
+        if unknown:
+            self._on_tags_added(query.load_tags(unknown))
+        if tag_index is not None:
+            tag_index.add_pairs(image_ids, tag_ids)
+        if completer is not None:
+            completer.add_usage(Counter(tag_ids))
 
-    def delete_image(self) -> bool:
-        return delete_image_entry(self.image_id)
+    def _on_embeddings_updated(self, column: str, image_ids: list[int], vectors):
+        if column != "tag_embedding":
+            return
+        with self._index_lock:
+            index = self._embedding_index
+            if isinstance(index, IVFPQIndex):
+                index.add(image_ids, vectors)
+            else:
+                self._embedding_index = None
+
+    def get_tags_for_image(self, image_id):
+        """Fetch tags associated with a specific image."""
+        return query.get_tags_for_image(image_id)
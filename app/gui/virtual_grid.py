@@ -0,0 +1,163 @@
+from collections.abc import Callable, Sequence
+
+import customtkinter as ctk
+
+from config import VIRTUAL_OVERSCAN_ROWS
+from db.rows import GalleryRow
+from gui.thumbnail import ThumbnailCell
+from utils.profiling import histogram
+
+FetchEntries = Callable[[int, int], Sequence[GalleryRow]]  # (offset, limit)
+
+_refresh_seconds = histogram(
+    "virtual_refresh_seconds", "無限スクロールの表示更新の時間"
+)
+
+
+def visible_row_range(
+    top: float, height: float, row_height: float, total_rows: int, overscan: int
+) -> range:
+    """スクロール位置から、ウィジェットを用意すべき行の範囲を求める"""
+    if total_rows <= 0 or row_height <= 0:
+        return range(0)
+    first = max(0, int(top // row_height) - overscan)
+    last_visible = int(-(-(top + height) // row_height)) - 1
+    last = min(total_rows - 1, last_visible + overscan)
+    return range(first, last + 1)
+
+
+class VirtualGallery:
+    """見えている行（と前後の overscan 行）だけをウィジェットとして持つギャラリー
+
+    セルは canvas のウィンドウアイテムとして置き、表示範囲から外れた行のセルは
+    次に表示される行へ付け替える。ライブラリ全体を1本のスクロールで表示しても、
+    ウィジェット数はウィンドウの大きさだけで決まる。
+    """
+
+    def __init__(
+        self,
+        canvas: ctk.CTkCanvas,
+        factory: Callable[[ctk.CTkCanvas], ThumbnailCell],
+        cell_size: tuple[int, int],
+        overscan: int = VIRTUAL_OVERSCAN_ROWS,
+        padx: int = 8,
+        pady: int = 4,
+    ):
+        self.canvas = canvas
+        self._factory = factory
+        self._overscan = overscan
+        self._padx = padx
+        self._pady = pady
+        self._col_width = cell_size[0] + 2 * padx
+        self._row_height = cell_size[1] + 2 * pady
+        self._measured = False
+        self._columns = 1
+        self._count = 0
+        self._fetch: FetchEntries = lambda offset, limit: []
+        self._rows: dict[int, list[tuple[ThumbnailCell, int]]] = {}
+        self._free: list[tuple[ThumbnailCell, int]] = []
+        self._refresh_id: str | None = None
+
+    @property
+    def created(self) -> int:
+        """これまでに作ったセルの数"""
+        return len(self._free) + sum(len(cells) for cells in self._rows.values())
+
+    @property
+    def bound_cells(self) -> list[ThumbnailCell]:
+        """エントリを割り当て中のセル"""
+        return [cell for cells in self._rows.values() for cell, _ in cells]
+
+    @property
+    def total_rows(self) -> int:
+        return -(-self._count // self._columns)
+
+    def set_source(
+        self, count: int, fetch: FetchEntries, keep_position: bool = False
+    ) -> None:
+        """表示するエントリの件数と取得関数を差し替える"""
+        self._count = count
+        self._fetch = fetch
+        self._recycle_all()
+        self._update_scrollregion()
+        if not keep_position:
+            self.canvas.yview_moveto(0)
+        self.refresh()
+
+    def set_columns(self, columns: int) -> None:
+        columns = max(1, columns)
+        if columns == self._columns:
+            return
+        self._columns = columns
+        self._recycle_all()
+        self._update_scrollregion()
+        self.refresh()
+
+    def schedule_refresh(self) -> None:
+        """スクロール中の連続したイベントを1回の更新にまとめる"""
+        if self._refresh_id is None:
+            self._refresh_id = self.canvas.after_idle(self.refresh)
+
+    def refresh(self) -> None:
+        """表示範囲に入った行にセルを割り当て、外れた行のセルを回収"""
+        self._refresh_id = None
+        with _refresh_seconds.time():
+            self._refresh_rows()
+
+    def _refresh_rows(self) -> None:
+        rows = visible_row_range(
+            self.canvas.canvasy(0),
+            self.canvas.winfo_height(),
+            self._row_height,
+            self.total_rows,
+            self._overscan,
+        )
+        for row in [r for r in self._rows if r not in rows]:
+            self._recycle_row(row)
+        for row in rows:
+            if row not in self._rows:
+                self._bind_row(row)
+
+    def _bind_row(self, row: int) -> None:
+        entries = self._fetch(row * self._columns, self._columns)
+        cells = []
+        for column, entry in enumerate(entries):
+            cell, item = self._take()
+            cell.bind_entry(entry)
+            self.canvas.coords(
+                item,
+                column * self._col_width + self._padx,
+                row * self._row_height + self._pady,
+            )
+            self.canvas.itemconfigure(item, state="normal")
+            cells.append((cell, item))
+        self._rows[row] = cells
+
+    def _take(self) -> tuple[ThumbnailCell, int]:
+        if self._free:
+            return self._free.pop()
+        cell = self._factory(self.canvas)
+        item = self.canvas.create_window(0, 0, window=cell, anchor="nw")
+        if not self._measured:
+            # キャプションを含めた実際の高さで行の高さを決め直す
+            self._measured = True
+            cell.update_idletasks()
+            self._row_height = cell.winfo_reqheight() + 2 * self._pady
+            self._col_width = cell.winfo_reqwidth() + 2 * self._padx
+            self._update_scrollregion()
+        return cell, item
+
+    def _recycle_row(self, row: int) -> None:
+        for cell, item in self._rows.pop(row):
+            cell.release()
+            self.canvas.itemconfigure(item, state="hidden")
+            self._free.append((cell, item))
+
+    def _recycle_all(self) -> None:
+        for row in list(self._rows):
+            self._recycle_row(row)
+
+    def _update_scrollregion(self) -> None:
+        width = self._columns * self._col_width
+        height = self.total_rows * self._row_height
+        self.canvas.configure(scrollregion=(0, 0, width, height))
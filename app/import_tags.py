@@ -0,0 +1,47 @@
+import argparse
+from pathlib import Path
+
+from tqdm import tqdm
+
+from config import TAG_IMPORT_CHUNK_SIZE
+from db.engine import engine
+from db.migrate import migrate
+from db.models import Base
+from db.tag_import import import_file
+
+
+# タガーの出力（CSV / JSONL）をまとめて tags / image_tags に取り込む
+def import_tags(path: Path, chunk_size: int, replace: bool):
+    Base.metadata.create_all(engine)
+    migrate(engine)
+
+    with tqdm(unit="枚") as progress:
+
+        def on_chunk(stats):
+            progress.update(stats.images + stats.unresolved - progress.n)
+            progress.set_postfix(rows_per_sec=f"{stats.rows_per_sec:,.0f}")
+
+        stats = import_file(
+            path, chunk_size=chunk_size, replace=replace, on_chunk=on_chunk
+        )
+
+    print(
+        f"✅ 画像 {stats.images} 件に {stats.image_tags} 行のタグを登録"
+        f"（タグ {stats.tags} 種 / {stats.seconds:.1f} 秒 / "
+        f"{stats.rows_per_sec:,.0f} rows/sec）"
+    )
+    if stats.unresolved:
+        print(f"⚠ 未登録の画像 {stats.unresolved} 件をスキップ:")
+        for image_path in stats.unresolved_samples:
+            print(f"   {image_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="タグを一括で取り込む")
+    parser.add_argument("path", type=Path, help="CSV または JSONL")
+    parser.add_argument("--chunk-size", type=int, default=TAG_IMPORT_CHUNK_SIZE)
+    parser.add_argument(
+        "--replace", action="store_true", help="取り込む画像の既存のタグを入れ替える"
+    )
+    args = parser.parse_args()
+    import_tags(args.path, args.chunk_size, args.replace)
@@ -1,10 +1,35 @@
-from db.init import dispose_engine, initialize_database
-from gui.app import App
+import sys
 
-if __name__ == "__main__":
-    initialize_database()
-    app = App()
+from config import BACKGROUND_INGEST
+from utils import startup_profile
+from utils.profiling import start_dumper
+
+# 起動を計測するオプション（最初の描画とギャラリー表示までの時間、インポートの内訳）
+PROFILE_FLAG = "--profile-startup"
+
+
+def main():
+    # ウィンドウを早く出すため、DB（SQLAlchemy）は画面を描いてから読み込む
+    from gui.app import App
+
+    if not BACKGROUND_INGEST:
+        from db.init import initialize_database
+
+        initialize_database()
+    app = App(background_ingest=BACKGROUND_INGEST)
+    dumper = start_dumper()
     try:
         app.mainloop()
     finally:
+        if dumper is not None:
+            dumper.stop()
+        from db.init import dispose_engine
+
         dispose_engine()
+
+
+if __name__ == "__main__":
+    if PROFILE_FLAG in sys.argv[1:]:
+        print(startup_profile.run(__file__).report())
+    else:
+        main()
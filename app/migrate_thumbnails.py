@@ -0,0 +1,46 @@
+import argparse
+
+from tqdm import tqdm
+
+from config import INGEST_BATCH_SIZE, THUMBNAIL_FORMAT, THUMBNAIL_QUALITY
+from db.engine import engine
+from db.migrate import migrate
+from db.models import Base
+from db.query import chunked, iter_thumbnails_to_reencode, update_thumbnail_paths
+from utils.image import THUMBNAIL_CODECS, image_manager
+
+
+# 既存のサムネイルを指定形式で並列に再エンコード
+def migrate_thumbnails(fmt: str, quality: int, processes: int | None = None):
+    Base.metadata.create_all(engine)
+    migrate(engine)
+
+    file_manager = image_manager.file_manager
+    file_manager.thumbnail_format = fmt
+    file_manager.thumbnail_quality = quality
+
+    rows = (row for batch in iter_thumbnails_to_reencode(fmt) for row in batch)
+    results = file_manager.iter_reencoded_thumbnails(rows, processes)
+    converted = failed = 0
+    with tqdm(unit="枚") as progress:
+        for batch in chunked(results, INGEST_BATCH_SIZE):
+            updates = [(image_id, new) for image_id, _, new in batch if new]
+            # DBを更新してから古いファイルを消す（影付き画像は名前が変わらないので残す）
+            update_thumbnail_paths(updates)
+            for _, old, new in batch:
+                if new and new != old:
+                    file_manager.delete_thumbnail_file(old, with_renders=False)
+            converted += len(updates)
+            failed += len(batch) - len(updates)
+            progress.update(len(batch))
+
+    print(f"✅ {converted} 件を {fmt} に変換しました（失敗 {failed} 件）")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="サムネイルの保存形式を変換")
+    parser.add_argument("--format", choices=THUMBNAIL_CODECS, default=THUMBNAIL_FORMAT)
+    parser.add_argument("--quality", type=int, default=THUMBNAIL_QUALITY)
+    parser.add_argument("--processes", type=int, help="並列数（既定はCPU数）")
+    args = parser.parse_args()
+    migrate_thumbnails(args.format, args.quality, args.processes)
@@ -0,0 +1,32 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+from db import events
+from db.models import Base
+
+
+@pytest.fixture
+def db_engine(monkeypatch):
+    """テスト用のインメモリDBに差し替える"""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr("db.query.engine", engine)
+    monkeypatch.setattr("db.query._entry_counts", {})
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def restore_event_receivers():
+    """テスト中に登録された通知先を外し、次のテストへ持ち越さない"""
+    signals = [s for s in vars(events).values() if isinstance(s, events.Signal)]
+    saved = {s: list(s._receivers) for s in signals}
+    yield
+    for signal, receivers in saved.items():
+        with signal._lock:
+            signal._receivers[:] = receivers
@@ -0,0 +1,103 @@
+import numpy as np
+
+from benchmarks.synthetic import create_embeddings
+from db import query
+from gui.viewmodel import GalleryViewModel
+from utils import ann
+from utils.ann import IVFPQIndex
+from utils.embedding import EmbeddingIndex
+
+
+def test_recall_against_exact_search():
+    ids, vectors = create_embeddings(2000, 64, n_clusters=32)
+    index = IVFPQIndex.build(ids, vectors, m=8)
+    exact = EmbeddingIndex(ids, vectors)
+
+    queries = vectors[:20] + 0.1
+    truth = exact.search(queries, 10)
+    found = index.search(queries, 10, nprobe=8, rerank=100)
+    recall = np.mean(
+        [len({i for i, _ in t} & {i for i, _ in f}) / 10 for t, f in zip(truth, found)]
+    )
+    assert recall >= 0.9
+
+
+def test_saved_index_is_memory_mapped_and_keeps_deltas(tmp_path):
+    ids, vectors = create_embeddings(500, 32, n_clusters=8)
+    IVFPQIndex.build(ids, vectors, m=4).save(tmp_path)
+
+    index = IVFPQIndex.open(tmp_path)
+    assert isinstance(index.codes, np.memmap) and index.max_id == 500
+    index.add([501], vectors[:1])
+    index.remove([1])
+    index.flush()
+
+    reopened = IVFPQIndex.open(tmp_path)
+    hits = [i for i, _ in reopened.search(vectors[0], 2, nprobe=8)[0]]
+    assert hits[0] == 501 and 1 not in hits
+    assert len(reopened) == 500 and reopened.max_id == 501
+
+    reopened.compact()
+    assert reopened.delta_size == 0
+    assert IVFPQIndex.open(tmp_path).similar_to(501, 1) != [(1, 1.0)]
+
+
+def test_viewmodel_follows_inserted_rows(db_engine, tmp_path, monkeypatch):
+    paths = [(tmp_path / f"{i}.jpg", tmp_path / f"{i}_t.webp") for i in range(3)]
+    for path, _ in paths:
+        path.write_bytes(b"x")
+    query.add_image_entries(paths[:2])
+    _, vectors = create_embeddings(3, 256)
+    query.set_embeddings([(1, vectors[0]), (2, vectors[1])])
+    IVFPQIndex.build(*query.load_embeddings(), m=8).save(tmp_path / "ann")
+    monkeypatch.setattr("gui.viewmodel.ANN_INDEX_DIR", tmp_path / "ann")
+
+    viewmodel = GalleryViewModel()
+    try:
+        viewmodel.get_similar_images(1)
+        query.add_image_entries(paths[2:])
+        query.set_embeddings([(3, vectors[0])])
+        assert [row.id for row in viewmodel.get_similar_images(1, k=1)] == [3]
+
+        query.delete_image_entry(3)
+        assert [row.id for row in viewmodel.get_similar_images(1, k=1)] == [2]
+    finally:
+        viewmodel.close()
+
+
+def test_rebuild_does_not_overwrite_an_open_index(tmp_path):
+    ids, vectors = create_embeddings(500, 32, n_clusters=8)
+    IVFPQIndex.build(ids, vectors, m=4).save(tmp_path)
+    index = IVFPQIndex.open(tmp_path)
+    index.remove([1])
+    index.flush()
+    before = np.asarray(index.vectors, dtype=np.float32).sum()
+
+    # 開いたまま同じディレクトリに作り直す（起動中のアプリと build_ann_index.py）
+    IVFPQIndex.build(ids[:100], vectors[:100], m=4).save(tmp_path)
+
+    assert np.asarray(index.vectors, dtype=np.float32).sum() == before
+    rebuilt = IVFPQIndex.open(tmp_path)
+    assert rebuilt.segment != index.segment
+    assert len(rebuilt) == 100 and len(rebuilt._removed) == 0
+
+
+def test_search_reads_one_generation_while_compacting(monkeypatch):
+    ids, vectors = create_embeddings(500, 32, n_clusters=8)
+    index = IVFPQIndex.build(ids[:400], vectors[:400], m=4)
+    index.add(ids[400:], vectors[400:])
+    index.remove(ids[:50])
+    expected = index.search(vectors[100], 10, nprobe=4)
+
+    original_top_k = ann.top_k
+    calls = []
+
+    def compact_midway(scores, k):
+        calls.append(k)
+        if len(calls) == 1:  # 概算を終えた直後に別スレッドが本体を差し替えた場合
+            index.compact()
+        return original_top_k(scores, k)
+
+    monkeypatch.setattr(ann, "top_k", compact_midway)
+    assert index.search(vectors[100], 10, nprobe=4) == expected
+    assert index.delta_size == 0
@@ -0,0 +1,40 @@
+from collections import Counter
+
+from benchmarks.bench_suite import compare
+from benchmarks.synthetic import create_image_library, populate_database
+from db import query
+
+
+def _results(**medians):
+    return {"cases": {name: {"median_sec": sec} for name, sec in medians.items()}}
+
+
+def test_compare_flags_only_cases_slower_than_tolerance():
+    baseline = _results(scan=1.0, pages=0.5, removed=1.0)
+    current = _results(scan=1.1, pages=0.8, added=2.0)
+
+    comparisons = {c.name: c for c in compare(current, baseline, tolerance=0.2)}
+
+    assert set(comparisons) == {"scan", "pages"}
+    assert not comparisons["scan"].regressed
+    assert comparisons["pages"].regressed
+    assert comparisons["pages"].ratio == 1.6
+
+
+def test_create_image_library_follows_format_mix(tmp_path):
+    image_dir = create_image_library(
+        tmp_path, 10, (32, 24), {"JPEG": 0.6, "PNG": 0.4}, n_roots=2
+    )
+
+    paths = [p for p in (tmp_path / "sources").rglob("*") if p.is_file()]
+    assert Counter(p.suffix for p in paths) == {".jpg": 6, ".png": 4}
+    assert all(link.is_symlink() for link in image_dir.iterdir())
+
+
+def test_populate_database_pages_like_a_real_library(db_engine):
+    populate_database(db_engine, 100, favorite_ratio=0.5)
+
+    page = query.get_gallery_page(90, 36)
+    assert [row.id for row in page] == list(range(91, 101))
+    favorites = query.count_image_entries(favorites_only=True)
+    assert 0 < favorites < 100
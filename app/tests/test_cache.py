@@ -0,0 +1,57 @@
+from PIL import Image
+
+from utils.cache import ByteLRUCache
+from utils.image import ImageCache, ImageProcessor
+
+
+def test_evicts_least_recently_used_by_bytes():
+    cache = ByteLRUCache(max_bytes=10, sizeof=len)
+    cache.put("a", "aaaa")
+    cache.put("b", "bbbb")
+    assert cache.get("a") == "aaaa"  # a を最近使ったことにする
+    cache.put("c", "cccc")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "aaaa"
+    assert cache.bytes == 8
+    assert cache.evictions == 1
+
+
+def test_oversized_value_is_not_kept():
+    cache = ByteLRUCache(max_bytes=3, sizeof=len)
+    cache.put("a", "aaaa")
+    assert len(cache) == 0
+
+
+def test_invalidate_group_removes_every_size():
+    cache = ByteLRUCache(max_bytes=100, sizeof=len)
+    cache.put(("x.png", 1), "a", group="x.png")
+    cache.put(("x.png", 2), "b", group="x.png")
+    cache.put(("y.png", 1), "c", group="y.png")
+
+    assert cache.invalidate_group("x.png") == 2
+    assert len(cache) == 1
+    assert cache.invalidate_group("x.png") == 0
+
+
+def test_image_cache_tiers(tmp_path):
+    thumb_path = tmp_path / "a_thumbnail.webp"
+    Image.new("RGB", (20, 20), "blue").save(thumb_path)
+    processor = ImageProcessor((20, 20))
+    cache = ImageCache(max_bytes=1024 * 1024)
+
+    cache.get_images(thumb_path, (20, 20), 4, processor)  # 焼き込み
+    cache.get_images(thumb_path, (20, 20), 4, processor)  # メモリ
+    cache.invalidate(thumb_path)
+    final_img, hover_img = cache.get_images(
+        thumb_path, (20, 20), 4, processor
+    )  # ディスク
+
+    stats = cache.stats()
+    assert (stats.misses, stats.hits, stats.disk_hits) == (1, 1, 1)
+    assert stats.invalidations == 1
+    assert stats.entries == 1
+    assert final_img.size == (24, 24)
+    assert stats.bytes == sum(
+        img.width * img.height * len(img.getbands()) for img in (final_img, hover_img)
+    )
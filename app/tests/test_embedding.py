@@ -0,0 +1,33 @@
+import numpy as np
+
+from db import query
+from utils.embedding import EmbeddingIndex
+
+
+def test_search_returns_cosine_top_k():
+    ids = np.array([10, 20, 30, 40])
+    vectors = np.array([[1, 0], [0, 1], [1, 1], [-1, 0]], dtype=np.float32)
+    index = EmbeddingIndex(ids, vectors)
+
+    [hits] = index.search(np.array([2, 0.1]), k=2)
+    assert [i for i, _ in hits] == [10, 30]
+    assert hits[0][1] > 0.99
+
+    batched = index.search(np.array([[0, 1], [-1, 0]]), k=1)
+    assert [h[0][0] for h in batched] == [20, 40]
+    assert [i for i, _ in index.similar_to(10, k=2)] == [30, 20]
+
+
+def test_embeddings_round_trip_as_float32_blobs(db_engine, tmp_path):
+    paths = [(tmp_path / f"{i}.jpg", tmp_path / f"{i}_t.webp") for i in range(3)]
+    for path, _ in paths:
+        path.write_bytes(b"x")
+    query.add_image_entries(paths)
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((2, 256)).astype(np.float32)
+    query.set_embeddings([(1, vectors[0]), (3, vectors[1])])
+
+    ids, matrix = query.load_embeddings()
+    assert ids.tolist() == [1, 3]
+    assert matrix.dtype == np.float32 and np.array_equal(matrix, vectors)
+    assert query.get_image_entry_by_id(3).tag_embedding.shape == (256,)
@@ -0,0 +1,83 @@
+import pytest
+from sqlalchemy import event
+
+from db import query
+from gui.viewmodel import GalleryViewModel
+
+
+@pytest.fixture
+def library(db_engine, tmp_path):
+    entries = [
+        (tmp_path / f"{i:02}.jpg", tmp_path / f"{i:02}_t.webp") for i in range(10)
+    ]
+    for path, _ in entries:
+        path.write_bytes(b"x")
+    query.add_image_entries(entries)
+    for image_id in (2, 5, 6, 9):
+        query.toggle_favorite_flag(image_id)
+    return entries
+
+
+def test_keyset_pages_follow_ids(library):
+    first = query.get_gallery_page(0, 4)
+    second = query.get_gallery_page(first[-1].id, 4)
+    assert [r.id for r in first] == [1, 2, 3, 4]
+    assert [r.id for r in second] == [5, 6, 7, 8]
+    assert [r.id for r in query.get_gallery_page(0, 10, favorites_only=True)] == [
+        2,
+        5,
+        6,
+        9,
+    ]
+
+
+def test_page_anchor_allows_jumping(library):
+    assert query.get_page_anchor(0) == 0
+    assert query.get_page_anchor(8) == 8
+    assert query.get_page_anchor(2, favorites_only=True) == 5
+    assert query.get_page_anchor(20) is None
+
+
+def test_count_is_cached_until_write(library, monkeypatch):
+    assert query.count_image_entries() == 10
+    assert query.count_image_entries(favorites_only=True) == 4
+
+    calls = []
+    with monkeypatch.context() as m:
+        m.setattr(query, "get_session", lambda: calls.append(1))
+        assert query.count_image_entries() == 10  # キャッシュから返す
+    assert calls == []
+
+    query.toggle_favorite_flag(1)
+    assert query.count_image_entries(favorites_only=True) == 5
+
+
+def test_viewmodel_fetches_one_page_at_a_time(library):
+    vm = GalleryViewModel(page_size=4)
+    assert vm.count_pages() == 3
+    assert [r.id for r in vm.get_page(2)] == [9, 10]  # 起点を問い合わせて直接移動
+    assert [r.id for r in vm.get_page(0)] == [1, 2, 3, 4]
+    assert [r.id for r in vm.get_range(3, 3)] == [4, 5, 6]
+
+    query.delete_image_entry(3)
+    vm.reset_pages(keep_until=0)
+    assert [r.id for r in vm.get_page(1)] == [6, 7, 8, 9]
+
+
+def test_toggle_updates_snapshot_without_reading(library, db_engine):
+    vm = GalleryViewModel(page_size=4)
+    rows = vm.get_page(0)
+    assert [r.is_favorite for r in rows] == [False, True, False, False]
+
+    statements = []
+    event.listen(
+        db_engine,
+        "before_cursor_execute",
+        lambda conn, cursor, sql, *args: statements.append(sql.split()[0]),
+    )
+    assert vm.get_favorite_state(3) is False
+    assert vm.toggle_favorite(3) is True
+
+    assert statements == ["UPDATE"]
+    assert rows[2].is_favorite is True
+    assert query.get_favorite_flag(3) is True
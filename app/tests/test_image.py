@@ -0,0 +1,68 @@
+import os
+
+from PIL import Image
+
+from utils.image import ImageFileManager, ImageProcessor, rendered_paths
+
+
+def _make_thumbnail(thumb_dir):
+    thumb_dir.mkdir(exist_ok=True)
+    thumb_path = thumb_dir / "abc_thumbnail.webp"
+    Image.new("RGB", (40, 30), "red").save(thumb_path)
+    return thumb_path
+
+
+def test_rendered_pair_is_created_once_and_reused(tmp_path):
+    thumb_path = _make_thumbnail(tmp_path)
+    processor = ImageProcessor((40, 40))
+
+    final_img, hover_img = processor.load_rendered_pair(thumb_path, (40, 40), 4)
+    assert final_img.size == (44, 44)
+    assert hover_img.size == (40, 40)
+
+    shadow_path, hover_path = rendered_paths(thumb_path, (40, 40), 4)
+    assert shadow_path.exists() and hover_path.exists()
+    mtime = shadow_path.stat().st_mtime_ns
+    processor.load_rendered_pair(thumb_path, (40, 40), 4)
+    assert shadow_path.stat().st_mtime_ns == mtime
+
+
+def test_invalidate_stale_renders_on_setting_change(tmp_path):
+    thumb_dir = tmp_path / "thumbnails"
+    thumb_path = _make_thumbnail(thumb_dir)
+    ImageProcessor((40, 40)).load_rendered_pair(thumb_path, (40, 40), 4)
+
+    old = ImageFileManager(tmp_path, thumb_dir, render_size=(40, 40), shadow_offset=4)
+    assert old.invalidate_stale_renders() == 0
+
+    new = ImageFileManager(tmp_path, thumb_dir, render_size=(40, 40), shadow_offset=6)
+    assert new.invalidate_stale_renders() == 2
+    assert sorted(p.name for p in thumb_dir.iterdir()) == [
+        ".render_key",
+        "abc_thumbnail.webp",
+    ]
+
+
+def test_stale_render_sweep_skips_files_it_cannot_delete(tmp_path, monkeypatch):
+    thumb_dir = tmp_path / "thumbnails"
+    thumb_path = _make_thumbnail(thumb_dir)
+    ImageProcessor((40, 40)).load_rendered_pair(thumb_path, (40, 40), 4)
+    shadow_path, hover_path = rendered_paths(thumb_path, (40, 40), 4)
+    unlink = os.unlink
+
+    def deny_shadow(path):
+        if path == str(shadow_path):
+            raise PermissionError("使用中")
+        unlink(path)
+
+    monkeypatch.setattr(os, "unlink", deny_shadow)
+    manager = ImageFileManager(
+        tmp_path, thumb_dir, render_size=(40, 40), shadow_offset=6
+    )
+    assert manager.invalidate_stale_renders() == 1
+    assert shadow_path.exists() and not hover_path.exists()
+
+    # 消し残しがあるので、次回もう一度掃除する
+    monkeypatch.setattr(os, "unlink", unlink)
+    assert manager.invalidate_stale_renders() == 1
+    assert not shadow_path.exists()
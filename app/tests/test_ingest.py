@@ -0,0 +1,86 @@
+import pytest
+
+from db.ingest import _skip_failed
+from db.query import add_image_entries, get_registered_image_paths
+from utils.scanner import RETRY_MTIME_NS, DirState, FileState
+
+
+@pytest.fixture
+def images(tmp_path):
+    paths = []
+    for i in range(7):
+        path = tmp_path / f"{i}.jpg"
+        path.write_bytes(b"x")
+        paths.append(path)
+    return paths
+
+
+def _entries(paths, fail_after=None):
+    for i, path in enumerate(paths):
+        if fail_after is not None and i == fail_after:
+            raise RuntimeError("crash")
+        yield path, _thumb(path)
+
+
+def _thumb(path):
+    return path.with_name(f"{path.stem}_thumbnail.png")
+
+
+def test_add_image_entries_commits_per_batch(db_engine, images):
+    batches = []
+    total = add_image_entries(_entries(images), batch_size=3, on_batch=batches.append)
+    assert total == 7
+    assert batches == [3, 3, 1]
+    assert get_registered_image_paths() == {str(p) for p in images}
+
+
+def test_crash_keeps_completed_batches_and_resumes(db_engine, images):
+    with pytest.raises(RuntimeError):
+        add_image_entries(_entries(images, fail_after=5), batch_size=2)
+    assert get_registered_image_paths() == {str(p) for p in images[:4]}
+
+    # 同じ入力で再実行すると登録済みは無視して続きから登録される
+    add_image_entries(_entries(images), batch_size=2)
+    assert get_registered_image_paths() == {str(p) for p in images}
+
+
+def test_file_states_saved_with_batch(db_engine, images):
+    states = {str(p): FileState(str(p.parent), 1, 1, 1) for p in images}
+    add_image_entries(_entries(images[:2]), batch_size=2, file_states=states)
+    # 登録済みの分はマニフェストに書き込まれ、未登録の分だけ残る
+    assert set(states) == {str(p) for p in images[2:]}
+
+
+def test_failed_thumbnail_is_retried_on_next_scan(images):
+    directory = str(images[0].parent)
+    file_states = {str(p): FileState(directory, 1, 1, 1) for p in images[:2]}
+    dir_states = {directory: DirState(None, 123)}
+    results = [(images[0], images[0].with_suffix(".webp")), (images[1], None)]
+
+    kept = list(_skip_failed(results, file_states, dir_states))
+
+    assert kept == results[:1]
+    assert set(file_states) == {str(images[0])}
+    # ディレクトリの mtime を記録しないので、次回の差分スキャンでも列挙される
+    assert dir_states[directory].mtime_ns == RETRY_MTIME_NS
+
+
+def test_re_thumbnailed_image_updates_its_row(db_engine, images):
+    assert add_image_entries(_entries(images[:2])) == 2
+    old_thumb = images[0].with_name(f"{images[0].stem}_thumbnail.png")
+    old_thumb.write_bytes(b"old")
+    new_thumb = images[0].with_name(f"{images[0].stem}_thumbnail.webp")
+
+    # 変更がない行は数えず、形式が変わった行だけを更新する
+    written = add_image_entries(
+        [(images[0], new_thumb), (images[1], _thumb(images[1]))]
+    )
+
+    assert written == 1
+    with db_engine.connect() as conn:
+        row = conn.exec_driver_sql(
+            "SELECT thumbnail_path, thumbnail_format FROM images WHERE image_path = ?",
+            (str(images[0]),),
+        ).one()
+    assert tuple(row) == (str(new_thumb), "webp")
+    assert not old_thumb.exists()
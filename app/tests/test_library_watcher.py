@@ -0,0 +1,166 @@
+import os
+import threading
+
+import pytest
+
+from db import query
+from db.ingest import apply_library_changes
+from gui.viewmodel import GalleryViewModel
+from utils import library_watcher
+from utils.image import image_manager
+from utils.library_watcher import ChangeCoalescer, LibraryChanges, LibraryWatcher
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_coalescer_keeps_last_change_and_waits_for_quiet():
+    clock = FakeClock()
+    coalescer = ChangeCoalescer(debounce=1.0, max_delay=5.0, clock=clock)
+    coalescer.file_added("lib/a.jpg")
+    coalescer.file_added("lib/tmp.jpg")
+    coalescer.file_removed("lib/tmp.jpg")
+    coalescer.file_added("lib/sub/b.jpg")
+    coalescer.dir_removed("lib/sub")
+    clock.now = 0.5
+    coalescer.file_modified("lib/a.jpg")
+    clock.now = 1.2
+    assert coalescer.pop_ready() is None  # 書き込みが続いている間は待つ
+
+    clock.now = 1.6
+    changes = coalescer.pop_ready()
+    assert changes.added == {"lib/a.jpg"}
+    assert changes.removed == {"lib/tmp.jpg"}
+    assert changes.removed_dirs == {"lib/sub"}
+    assert coalescer.pop_ready() is None
+
+    # 通知が途切れなくても max_delay で取り込む
+    ready = None
+    for step in range(20):
+        clock.now = 2.0 + step * 0.5
+        ready = coalescer.pop_ready()
+        if ready:
+            break
+        coalescer.file_added(f"lib/{step}.jpg")
+    assert clock.now == 7.0 and len(ready.added) == 10
+
+
+def _fake_thumbnails(image_paths, processes=None):
+    for path in image_paths:
+        yield path, path.with_name(f"{path.stem}_t.webp")
+
+
+def test_apply_library_changes_reports_first_changed_id(
+    db_engine, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(image_manager, "iter_thumbnails", _fake_thumbnails)
+    library = tmp_path / "images"
+    (library / "sub").mkdir(parents=True)
+    paths = [library / f"{i}.jpg" for i in range(3)] + [library / "sub" / "x.jpg"]
+    for path in paths:
+        path.write_bytes(b"x")
+
+    update = apply_library_changes(
+        LibraryChanges(added={str(p) for p in paths[:3]}, rescan_dirs={str(library)})
+    )
+    assert (update.added, update.removed, update.first_changed_id) == (4, 0, 1)
+    assert query.get_image_paths_under(str(library / "sub")) == {str(paths[3])}
+
+    paths[1].unlink()
+    (library / "sub" / "x.jpg").unlink()
+    (library / "sub").rmdir()
+    new = library / "new.jpg"
+    new.write_bytes(b"x")
+    update = apply_library_changes(
+        LibraryChanges(
+            added={str(new), str(paths[0])},
+            removed={str(paths[1])},
+            removed_dirs={str(library / "sub")},
+        )
+    )
+    # 登録済みの画像は取り込み直さず、表示は削除した最初の画像から変わる
+    removed_id = query.get_image_ids_by_paths([str(new)])[str(new)]
+    assert (update.added, update.removed) == (1, 2)
+    assert update.first_changed_id < removed_id
+    assert query.count_image_entries() == 3
+
+
+def test_apply_library_changes_keeps_images_it_cannot_confirm_removed(
+    db_engine, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(image_manager, "iter_thumbnails", _fake_thumbnails)
+    library = tmp_path / "images"
+    (library / "sub").mkdir(parents=True)
+    paths = [library / "a.jpg", library / "sub" / "b.jpg"]
+    for path in paths:
+        path.write_bytes(b"x")
+    apply_library_changes(LibraryChanges(rescan_dirs={str(library)}))
+
+    # 戻ってきたディレクトリは削除せず、歩けないディレクトリは空とみなさない
+    update = apply_library_changes(LibraryChanges(removed_dirs={str(library / "sub")}))
+    assert update.removed == 0
+    hidden = tmp_path / "hidden"
+    library.rename(hidden)
+    update = apply_library_changes(LibraryChanges(rescan_dirs={str(library)}))
+    assert update.removed == 0
+    assert query.count_image_entries() == 2
+
+    hidden.rename(library)
+    paths[1].unlink()
+    update = apply_library_changes(LibraryChanges(rescan_dirs={str(library)}))
+    assert update.removed == 1
+    assert query.get_image_paths_under(str(library)) == {str(paths[0])}
+
+
+def test_viewmodel_keeps_pages_before_the_change(db_engine, tmp_path):
+    entries = [(tmp_path / f"{i}.jpg", tmp_path / f"{i}_t.webp") for i in range(5)]
+    for path, _ in entries:
+        path.write_bytes(b"x")
+    query.add_image_entries(entries)
+    viewmodel = GalleryViewModel(page_size=2)
+    try:
+        first, last = viewmodel.get_page(0), viewmodel.get_page(2)
+        assert [r.id for r in last] == [5]
+        extra = (tmp_path / "5.jpg", tmp_path / "5_t.webp")
+        extra[0].write_bytes(b"x")
+        query.add_image_entries([extra])
+
+        assert viewmodel.invalidate_from(6) == 2
+        assert viewmodel.get_page(0) is first
+        assert [r.id for r in viewmodel.get_page(2)] == [5, 6]
+    finally:
+        viewmodel.close()
+
+
+@pytest.mark.skipif(not library_watcher.is_available(), reason="watchdog がない")
+def test_watcher_reports_paths_through_links(tmp_path):
+    library, target = tmp_path / "images", tmp_path / "target"
+    library.mkdir()
+    target.mkdir()
+    os.symlink(target, library / "link", target_is_directory=True)
+
+    received: list[LibraryChanges] = []
+    done = threading.Event()
+
+    def on_changes(changes):
+        received.append(changes)
+        done.set()
+
+    watcher = LibraryWatcher(
+        on_changes, library, coalescer=ChangeCoalescer(debounce=0.2, max_delay=5)
+    )
+    watcher.start()
+    try:
+        (target / "a.jpg").write_bytes(b"x")
+        (library / "b.png").write_bytes(b"x")
+        (library / "notes.txt").write_text("x")
+        assert done.wait(5)
+    finally:
+        watcher.stop()
+    added = set().union(*(c.added for c in received))
+    assert added == {str(library / "link" / "a.jpg"), str(library / "b.png")}
@@ -0,0 +1,78 @@
+import threading
+import time
+
+from gui.loader import ThumbnailLoader
+
+
+class FakeRoot:
+    """after() を記録するだけのTkルートの代用"""
+
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, _ms, func):
+        self.scheduled.append(func)
+        return f"after#{len(self.scheduled)}"
+
+    def after_cancel(self, _id):
+        pass
+
+    def run_until_idle(self, loader, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while loader.pending and time.monotonic() < deadline:
+            if self.scheduled:
+                self.scheduled.pop(0)()
+            time.sleep(0.001)
+
+
+def test_results_are_delivered_on_polling_thread(monkeypatch):
+    monkeypatch.setattr(
+        "utils.image.image_manager.load_thumbnail_images",
+        lambda path, size, offset: (path, threading.current_thread().name),
+    )
+    root = FakeRoot()
+    loader = ThumbnailLoader(root, max_workers=2)
+    received = []
+
+    for name in ("a", "b", "c"):
+        loader.submit(
+            name,
+            (10, 10),
+            4,
+            lambda images, error: received.append(
+                (images, error, threading.current_thread())
+            ),
+        )
+    root.run_until_idle(loader)
+    loader.shutdown()
+
+    assert sorted(images[0] for images, _, _ in received) == ["a", "b", "c"]
+    assert all(images[1].startswith("thumbnail") for images, _, _ in received)
+    assert all(t is threading.main_thread() for _, _, t in received)
+
+
+def test_cancelled_request_never_calls_back(monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_load(path, size, offset):
+        started.set()
+        release.wait(5)
+        return path, path
+
+    monkeypatch.setattr("utils.image.image_manager.load_thumbnail_images", slow_load)
+    root = FakeRoot()
+    loader = ThumbnailLoader(root, max_workers=1)
+    received = []
+
+    running = loader.submit("running", (10, 10), 4, lambda *a: received.append(a))
+    queued = loader.submit("queued", (10, 10), 4, lambda *a: received.append(a))
+    started.wait(5)
+    loader.cancel(queued)  # 未着手なので実行されない
+    loader.cancel(running)  # 実行中なので結果が捨てられる
+    release.set()
+    root.run_until_idle(loader)
+    loader.shutdown()
+
+    assert received == []
+    assert loader.pending == 0
@@ -0,0 +1,56 @@
+import numpy as np
+from sqlalchemy import create_engine, inspect
+
+from db.engine import configure_sqlite
+from db.migrate import LATEST_VERSION, get_schema_version, migrate
+
+OLD_SCHEMA = [
+    (
+        "CREATE TABLE images (id INTEGER PRIMARY KEY, image_path VARCHAR UNIQUE, "
+        "thumbnail_path VARCHAR UNIQUE, tag_embedding TEXT, pose_embedding TEXT, "
+        "created_at DATETIME, is_favorite BOOLEAN, is_r18 BOOLEAN)"
+    ),
+    "CREATE TABLE tags (id INTEGER PRIMARY KEY, tag VARCHAR, embedding TEXT)",
+    (
+        "CREATE TABLE image_tags (id INTEGER PRIMARY KEY, image_id INTEGER, "
+        "tag_id INTEGER)"
+    ),
+    (
+        f"INSERT INTO images VALUES (1, 'a.jpg', 'a.png', '{list(range(256))}', "
+        "'1 2 3', NULL, 0, 0)"
+    ),
+    "INSERT INTO image_tags (image_id, tag_id) VALUES (1, 1), (1, 1), (1, 2)",
+]
+
+
+def test_upgrades_old_database_in_place(tmp_path):
+    engine = configure_sqlite(create_engine(f"sqlite:///{tmp_path / 'old.db'}"))
+    with engine.begin() as conn:
+        for sql in OLD_SCHEMA:
+            conn.exec_driver_sql(sql)
+
+    assert len(migrate(engine)) == LATEST_VERSION
+    assert migrate(engine) == []  # 2回目は何もしない
+
+    inspector = inspect(engine)
+    assert "thumbnail_format" in {c["name"] for c in inspector.get_columns("images")}
+    assert {"ix_images_favorite_id", "ix_images_r18_id"} <= {
+        i["name"] for i in inspector.get_indexes("images")
+    }
+    with engine.connect() as conn:
+        assert get_schema_version(conn) == LATEST_VERSION
+        assert conn.exec_driver_sql("SELECT COUNT(*) FROM image_tags").scalar() == 2
+        tag_blob, pose_blob = conn.exec_driver_sql(
+            "SELECT tag_embedding, pose_embedding FROM images"
+        ).one()
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+        plan = conn.exec_driver_sql(
+            "EXPLAIN QUERY PLAN SELECT id FROM images "
+            "WHERE is_favorite = 1 AND id > 0 ORDER BY id LIMIT 36"
+        ).fetchall()
+    assert "ix_images_favorite_id" in plan[0][-1]
+    assert np.array_equal(np.frombuffer(tag_blob, "<f4"), np.arange(256))
+    assert pose_blob is None  # 次元が合わない値は破棄
+
+    engine.dispose()
@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+
+from gui.pool import CellPool
+
+
+class FakeCell:
+    def __init__(self):
+        self.entry = None
+        self.grid_calls = 0
+        self.visible = False
+
+    def bind_entry(self, entry):
+        self.entry = entry
+
+    def grid(self, **kwargs):
+        self.grid_calls += 1
+        self.visible = True
+
+    def grid_remove(self):
+        self.visible = False
+
+    def release(self):
+        self.entry = None
+
+
+def _entries(n, start=0):
+    return [SimpleNamespace(id=i) for i in range(start, start + n)]
+
+
+def test_cells_are_reused_across_pages():
+    pool = CellPool(FakeCell)
+    first = pool.layout(_entries(6), columns=3)
+    second = pool.layout(_entries(6, start=6), columns=3)
+
+    assert pool.created == 6
+    assert [c.entry.id for c in second] == list(range(6, 12))
+    assert all(a is b for a, b in zip(first, second))
+    assert all(c.grid_calls == 1 for c in second)  # 位置が同じなら配置し直さない
+
+
+def test_short_page_hides_surplus_and_column_change_regrids():
+    pool = CellPool(FakeCell)
+    cells = pool.layout(_entries(6), columns=3)
+    pool.layout(_entries(4), columns=2)
+
+    assert pool.created == 6
+    assert [c.visible for c in cells] == [True] * 4 + [False] * 2
+    assert cells[4].entry is None
+    assert cells[2].grid_calls == 2
@@ -0,0 +1,91 @@
+import threading
+
+from gui.prefetch import PagePrefetcher
+
+PAGES = {0: ["old-1", "old-2"], 1: ["next-1"], 2: ["new-1", "new-2"]}
+
+
+class FakeRoot:
+    def __init__(self):
+        self.idle = {}
+        self.timers = {}
+        self.count = 0
+
+    def after_idle(self, func):
+        self.count += 1
+        key = f"idle#{self.count}"
+        self.idle[key] = func
+        return key
+
+    def after(self, ms, func):
+        self.count += 1
+        key = f"after#{self.count}"
+        self.timers[key] = func
+        return key
+
+    def after_cancel(self, key):
+        self.idle.pop(key, None)
+        self.timers.pop(key, None)
+
+    def run_idle(self):
+        while self.idle:
+            self.idle.pop(next(iter(self.idle)))()
+
+    def run_timers(self):
+        timers, self.timers = self.timers, {}
+        for func in timers.values():
+            func()
+
+
+def test_jumping_elsewhere_discards_previous_prefetch(monkeypatch):
+    loaded = []
+    fetched = []
+    done = threading.Event()
+
+    def load(path, size, offset):
+        loaded.append(str(path))
+        if str(path) == "next-1":
+            done.set()
+
+    def page_paths(page):
+        fetched.append(page)
+        return PAGES[page]
+
+    monkeypatch.setattr("utils.image.image_manager.load_thumbnail_images", load)
+    root = FakeRoot()
+    prefetcher = PagePrefetcher(root, (10, 10), page_paths)
+
+    prefetcher.schedule([0])
+    prefetcher.schedule([2, 1])  # アイドルになる前に移動
+    root.run_idle()
+    assert done.wait(5)
+    prefetcher.shutdown()
+
+    # 取り消したページの行は引かず、ページは指定した順に読み込む
+    assert fetched == [2, 1]
+    assert loaded == ["new-1", "new-2", "next-1"]
+
+
+def test_waits_while_foreground_is_busy(monkeypatch):
+    busy = threading.Event()
+    busy.set()
+    loaded = threading.Event()
+    fetched = []
+    monkeypatch.setattr(
+        "utils.image.image_manager.load_thumbnail_images",
+        lambda *args: loaded.set(),
+    )
+    root = FakeRoot()
+    prefetcher = PagePrefetcher(
+        root, (10, 10), lambda page: fetched.append(page) or ["a"], is_busy=busy.is_set
+    )
+
+    prefetcher.schedule([1])
+    root.run_idle()
+    # 表示中のページを読み込んでいる間は、先読みするページの行も引かない
+    assert fetched == [] and root.timers
+    busy.clear()
+    root.run_timers()
+    assert fetched == [1]
+    assert loaded.wait(5)
+    prefetcher.shutdown()
@@ -0,0 +1,60 @@
+import json
+
+from utils import profiling
+from utils.profiling import MetricsRegistry
+
+
+def test_disabled_registry_records_nothing():
+    registry = MetricsRegistry(enabled=False)
+    hits = registry.counter("hits_total")
+    latency = registry.histogram("load_seconds")
+
+    hits.inc()
+    latency.observe(0.01)
+    with latency.time():
+        pass
+
+    assert hits.value == 0
+    assert latency.count == 0
+    assert registry.snapshot()["histograms"] == {}
+
+
+def test_histogram_quantiles_follow_observed_latencies():
+    registry = MetricsRegistry(enabled=True)
+    latency = registry.histogram("load_seconds")
+    for ms in range(1, 101):
+        latency.observe(ms / 1000)
+
+    summary = registry.snapshot()["histograms"]["load_seconds"]
+
+    assert summary["count"] == 100
+    # 区切りは2倍ずつなので、分位点は区切りの幅の範囲でずれる
+    assert 25 <= summary["p50_ms"] <= 64
+    assert 64 <= summary["p95_ms"] <= 100
+    assert summary["p99_ms"] <= summary["max_ms"] == 100
+
+
+def test_timed_records_calls_and_dumps_prometheus(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling.registry, "enabled", True)
+
+    @profiling.timed("test_timed_seconds", "テスト用")
+    def work(x):
+        return x * 2
+
+    assert work(3) == 6
+    assert work(4) == 8
+    profiling.counter("test_items_total").inc(5)
+
+    prom = tmp_path / "metrics.prom"
+    profiling.registry.dump(prom)
+    text = prom.read_text(encoding="utf-8")
+    assert "# TYPE tag_palette_test_timed_seconds summary" in text
+    assert "tag_palette_test_timed_seconds_count 2" in text
+    assert 'tag_palette_test_timed_seconds{quantile="0.99"}' in text
+    assert "tag_palette_test_items_total 5" in text
+
+    path = tmp_path / "metrics.json"
+    profiling.registry.dump(path)
+    snapshot = json.loads(path.read_text(encoding="utf-8"))
+    assert snapshot["histograms"]["test_timed_seconds"]["count"] == 2
+    profiling.registry.reset()
@@ -0,0 +1,145 @@
+import os
+
+import pytest
+
+from utils import scanner
+from utils.scanner import LibraryScanner, ParallelWalker, ScanManifest
+
+
+@pytest.fixture
+def library(tmp_path):
+    root = tmp_path / "images"
+    (root / "a").mkdir(parents=True)
+    (root / "b").mkdir()
+    (root / "a" / "1.jpg").write_bytes(b"1")
+    (root / "a" / "2.png").write_bytes(b"2")
+    (root / "b" / "3.gif").write_bytes(b"3")
+    (root / "b" / "note.txt").write_text("x")
+    (root / "b" / "x_thumbnail.png").write_bytes(b"t")
+    return root
+
+
+def _scan(root, manifest, full=False):
+    result = LibraryScanner(root).scan(manifest, full=full)
+    manifest.apply(result)
+    return result
+
+
+def _bump_mtime(path):
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def test_initial_scan_adds_all_images(library):
+    result = _scan(library, ScanManifest())
+    assert {p.name for p in result.added} == {"1.jpg", "2.png", "3.gif"}
+    assert not result.modified and not result.removed
+
+
+def test_unchanged_library_skips_directories(library):
+    manifest = ScanManifest()
+    _scan(library, manifest)
+    result = _scan(library, manifest)
+    assert not result.has_changes
+    assert result.skipped_dirs == 3
+
+
+def test_added_and_removed_files(library):
+    manifest = ScanManifest()
+    _scan(library, manifest)
+
+    (library / "a" / "4.jpeg").write_bytes(b"4")
+    (library / "b" / "3.gif").unlink()
+    result = _scan(library, manifest)
+
+    assert {p.name for p in result.added} == {"4.jpeg"}
+    assert {p.name for p in result.removed} == {"3.gif"}
+    assert str(library / "b" / "3.gif") not in manifest.files
+
+
+def test_modified_file_detected_in_changed_directory(library):
+    manifest = ScanManifest()
+    _scan(library, manifest)
+
+    (library / "a" / "1.jpg").write_bytes(b"changed")
+    _bump_mtime(library / "a")
+    result = _scan(library, manifest)
+
+    assert {p.name for p in result.modified} == {"1.jpg"}
+    assert not result.added
+
+
+def test_full_scan_detects_in_place_modification(library):
+    manifest = ScanManifest()
+    _scan(library, manifest)
+
+    (library / "b" / "3.gif").write_bytes(b"changed")
+    assert not _scan(library, manifest).modified  # ディレクトリのmtimeは不変
+    result = _scan(library, manifest, full=True)
+    assert {p.name for p in result.modified} == {"3.gif"}
+
+
+def test_removed_directory_removes_subtree(library):
+    manifest = ScanManifest()
+    _scan(library, manifest)
+
+    for f in (library / "a").iterdir():
+        f.unlink()
+    (library / "a").rmdir()
+    result = _scan(library, manifest)
+
+    assert {p.name for p in result.removed} == {"1.jpg", "2.png"}
+    assert str(library / "a") in result.removed_dirs
+
+
+def test_offline_linked_root_keeps_its_files(tmp_path, library):
+    source = tmp_path / "nas"
+    (source / "sub").mkdir(parents=True)
+    (source / "sub" / "a.jpg").write_bytes(b"a")
+    (library / "nas").symlink_to(source, target_is_directory=True)
+    manifest = ScanManifest()
+    _scan(library, manifest)
+
+    # リンク先のマウントが外れた状態（リンク自体は残る）
+    source.rename(tmp_path / "unmounted")
+    result = _scan(library, manifest)
+
+    assert not result.removed and not result.removed_dirs
+    assert str(library / "nas" / "sub" / "a.jpg") in manifest.files
+
+
+def test_file_that_cannot_be_stat_is_skipped_and_retried(library, monkeypatch):
+    manifest = ScanManifest()
+    _scan(library, manifest)
+    (library / "a" / "4.jpeg").write_bytes(b"4")
+    stat_file_state = scanner.stat_file_state
+
+    def flaky(path, directory=None):
+        if path.endswith("1.jpg"):
+            raise FileNotFoundError(path)
+        return stat_file_state(path, directory)
+
+    monkeypatch.setattr(scanner, "stat_file_state", flaky)
+    result = _scan(library, manifest)
+    assert {p.name for p in result.added} == {"4.jpeg"}
+    assert not result.removed
+
+    monkeypatch.setattr(scanner, "stat_file_state", stat_file_state)
+    result = _scan(library, manifest)
+    # 前回は列挙が不完全だったので、mtime が同じでも a だけは列挙し直す
+    assert result.skipped_dirs == 2
+    assert not result.has_changes
+
+
+def test_parallel_walker_follows_top_level_symlinks(tmp_path, library):
+    source = tmp_path / "source"
+    (source / "deep").mkdir(parents=True)
+    (source / "deep" / "5.bmp").write_bytes(b"5")
+    (library / "linked").symlink_to(source, target_is_directory=True)
+    # リンク先からさらに張られたリンクは辿らない
+    (source / "loop").symlink_to(library, target_is_directory=True)
+
+    found = set(ParallelWalker(library, max_workers=2).iter_image_paths())
+
+    assert {os.path.basename(p) for p in found} == {"1.jpg", "2.png", "3.gif", "5.bmp"}
+    assert str(library / "linked" / "deep" / "5.bmp") in found
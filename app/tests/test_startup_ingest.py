@@ -0,0 +1,74 @@
+import threading
+
+from db import query
+from gui import startup_ingest
+from gui.startup_ingest import BackgroundIngest
+from utils.scanner import ScanResult
+
+
+class FakeRoot:
+    """after() の呼び出しを記録し、テストから順に実行する"""
+
+    def __init__(self):
+        self.callbacks = []
+
+    def after(self, _ms, callback):
+        self.callbacks.append(callback)
+        return str(len(self.callbacks))
+
+    def after_cancel(self, _id):
+        pass
+
+    def run_pending(self):
+        callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback()
+
+
+def _fake_sync(tmp_path, count, started=None, resume=None):
+    def sync_library(full_scan=False, on_batch=None):
+        entries = [
+            (tmp_path / f"{i}.jpg", tmp_path / f"{i}_t.webp") for i in range(count)
+        ]
+        for path, _ in entries:
+            path.write_bytes(b"x")
+        for i in range(0, count, 2):
+            query.add_image_entries(entries[i : i + 2], on_batch=on_batch)
+            if started is not None:
+                started.set()
+                resume.wait(5)
+        return ScanResult(), count
+
+    return sync_library
+
+
+def test_batches_are_appended_and_status_reported(db_engine, tmp_path, monkeypatch):
+    monkeypatch.setattr(startup_ingest, "sync_library", _fake_sync(tmp_path, 5))
+    root, updates, statuses, finished = FakeRoot(), [], [], threading.Event()
+    ingest = BackgroundIngest(root, statuses.append, updates.append, finished.set)
+    ingest.start()
+    ingest._thread.join(5)
+    root.run_pending()
+
+    assert finished.is_set()
+    assert (updates[0].added, updates[0].first_changed_id) == (5, 1)
+    assert statuses == ["✅ 新規・変更 5 件を登録 / 削除 0 件"]
+    assert root.callbacks == []  # 終わったらポーリングを止める
+
+
+def test_shutdown_stops_after_committed_batch(db_engine, tmp_path, monkeypatch):
+    started, resume = threading.Event(), threading.Event()
+    monkeypatch.setattr(
+        startup_ingest, "sync_library", _fake_sync(tmp_path, 6, started, resume)
+    )
+    root, finished = FakeRoot(), threading.Event()
+    ingest = BackgroundIngest(root, print, lambda _: None, finished.set)
+    ingest.start()
+    assert started.wait(5)
+    ingest._cancelled.set()
+    resume.set()
+    ingest.shutdown()
+
+    assert query.count_image_entries() == 4
+    root.run_pending()
+    assert not finished.is_set()
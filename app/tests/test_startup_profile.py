@@ -0,0 +1,43 @@
+import subprocess
+import sys
+from pathlib import Path
+
+from utils import startup_profile
+
+APP_DIR = Path(startup_profile.__file__).parents[1]
+
+
+def test_run_collects_marks_and_imports(tmp_path, monkeypatch):
+    monkeypatch.setenv("PYTHONPATH", str(APP_DIR))
+    script = tmp_path / "app.py"
+    script.write_text(
+        "import json\n"
+        "from utils import startup_profile\n"
+        "startup_profile.mark('first_paint')\n"
+        "import csv\n"
+        "startup_profile.mark('gallery_ready')\n"
+    )
+
+    profile = startup_profile.run(str(script))
+
+    assert list(profile.marks) == ["first_paint", "gallery_ready"]
+    assert profile.marks["first_paint"] <= profile.marks["gallery_ready"]
+    first = {t.module for t in profile.imports["first_paint"]}
+    assert "json" in first and "csv" not in first
+    assert "csv" in {t.module for t in profile.imports["gallery_ready"]}
+    assert "first_paint" in profile.report()
+
+
+def test_mark_is_silent_without_profile_env(monkeypatch):
+    monkeypatch.delenv(startup_profile.PROFILE_ENV, raising=False)
+    code = "from utils import startup_profile; startup_profile.mark('x')"
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=APP_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert not startup_profile.is_enabled()
+    assert result.stderr == ""
@@ -0,0 +1,90 @@
+import random
+
+from db import query
+from gui.viewmodel import GalleryViewModel
+from utils import tag_complete
+from utils.tag_complete import TagCompleter, split_last_term
+from utils.tag_index import TagInfo
+
+
+def test_suggestions_rank_by_usage_and_fold_kana(monkeypatch):
+    monkeypatch.setattr(tag_complete, "RANGE_CACHE_THRESHOLD", 1)
+    completer = TagCompleter()
+    completer.build(
+        [
+            TagInfo(1, "cat", "ネコ", False, False),
+            TagInfo(2, "cat_ears", "猫耳", False, False),
+            TagInfo(3, "catgirl", None, False, True),
+            TagInfo(4, "car", None, False, False),
+        ],
+        {1: 5, 2: 9, 3: 100, 4: 1},
+    )
+    assert [s.tag for s in completer.suggest("CA")] == ["cat_ears", "cat", "car"]
+    assert [s.tag for s in completer.suggest("ねこ")] == ["cat"]
+    assert completer.suggest("ca", limit=1)[0].count == 9
+
+    # キャッシュ済みの接頭辞も、タグや使用回数の追加で入れ替わる
+    completer.add_tags([TagInfo(5, "castle", "城", False, False)])
+    completer.add_usage({5: 20, 4: 1})
+    assert [s.tag for s in completer.suggest("ca")] == [
+        "castle",
+        "cat_ears",
+        "cat",
+        "car",
+    ]
+    assert split_last_term("cat -(do") == ("cat -(", "do")
+
+
+def test_viewmodel_suggests_tags_registered_later(db_engine, tmp_path):
+    path = tmp_path / "a.jpg"
+    path.write_bytes(b"x")
+    query.add_image_entries([(path, tmp_path / "a_t.webp")])
+    ids = query.add_tags(["blue_sky", "blonde"])
+    query.add_image_tags([(1, ids["blonde"])])
+
+    viewmodel = GalleryViewModel()
+    try:
+        # 索引ができるまでは待たずに空を返す
+        assert viewmodel.suggest_tags("red bl") == []
+        viewmodel.prepare_tag_completer()
+        assert viewmodel.tag_completer_ready
+        assert [s.tag for s in viewmodel.suggest_tags("red bl")] == [
+            "blonde",
+            "blue_sky",
+        ]
+        ids = query.add_tags(["blue_eyes"])
+        query.add_image_tags([(1, ids["blue_eyes"])])
+        assert [s.tag for s in viewmodel.suggest_tags("blu")] == [
+            "blue_eyes",
+            "blue_sky",
+        ]
+    finally:
+        viewmodel.close()
+
+
+def test_uncached_prefix_ranks_from_bucket_tops(monkeypatch):
+    monkeypatch.setattr(tag_complete, "RANK_BUCKET_SIZE", 8)
+    monkeypatch.setattr(tag_complete, "RANGE_CACHE_THRESHOLD", 16)
+    rng = random.Random(0)
+    names = [f"ab{i:03d}" for i in range(300)] + [f"ac{i:03d}" for i in range(50)]
+    tags = [TagInfo(i, name, None, False, False) for i, name in enumerate(names)]
+    counts = {i: rng.randrange(1000) for i in range(len(tags))}
+    completer = TagCompleter()
+    completer.build(tags, counts)
+
+    def expected(prefix):
+        return sorted(
+            (counts[t.id] for t in tags if t.tag.startswith(prefix)), reverse=True
+        )[:20]
+
+    # 範囲全体を数えずに、区画の上位から数えた場合と同じ上位を返す
+    for prefix in ["ab0", "ab2", "ac0"]:
+        assert [s.count for s in completer.suggest(prefix)] == expected(prefix)
+
+    # 区画の上位も使用回数の追加やタグの挿入に追従する
+    completer.add_tags([TagInfo(400, "ab150x", None, False, False)])
+    completer.add_usage({400: 5000, 120: 3000})
+    tags.append(TagInfo(400, "ab150x", None, False, False))
+    counts.update({400: 5000, 120: counts[120] + 3000})
+    for prefix in ["ab15", "ab1"]:
+        assert [s.count for s in completer.suggest(prefix)] == expected(prefix)
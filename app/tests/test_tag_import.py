@@ -0,0 +1,50 @@
+import json
+
+from db import events, query
+from db.models import Genre, Tag
+from db.tag_import import import_file
+
+
+def test_import_csv_and_jsonl_upserts_tags(db_engine, tmp_path):
+    paths = [(tmp_path / f"{i}.jpg", tmp_path / f"{i}_t.webp") for i in range(3)]
+    for path, _ in paths:
+        path.write_bytes(b"x")
+    query.add_image_entries(paths)
+    images = [str(path) for path, _ in paths]
+
+    wide = tmp_path / "wide.csv"
+    wide.write_text(
+        f'image_path,tags\n{images[0]},"cat, dog"\n{images[1]},cat\nmissing.jpg,cat\n',
+        encoding="utf-8",
+    )
+    stats = import_file(wide, chunk_size=2)
+    assert (stats.images, stats.unresolved, stats.image_tags) == (2, 1, 3)
+    assert stats.tags == 2
+    assert query.get_tags_for_image(1) == ["cat", "dog"]
+
+    tagged = tmp_path / "tagger.jsonl"
+    rows = [
+        {"image_path": images[2], "tags": [{"tag": "cat", "tag_ja": "猫"}, "sky"]},
+        {"image_path": images[0], "tags": [{"tag": "sky", "genre": "background"}]},
+    ]
+    tagged.write_text("\n".join(json.dumps(r) for r in rows), encoding="utf-8")
+    added = []
+    events.tags_added.connect(added.extend)
+    try:
+        stats = import_file(tagged, replace=True)
+    finally:
+        events.tags_added.disconnect(added.extend)
+    # 登録済みの cat は新しいタグとして数えない
+    assert stats.tags == 1
+    assert [t.tag for t in added] == ["sky"]
+
+    assert query.get_tags_for_image(1) == ["sky"]
+    assert query.get_tags_for_image(3) == ["cat", "sky"]
+    with query.get_session() as session:
+        tags = {t.tag: (t.tag_ja, t.genre) for t in session.query(Tag)}
+        assert session.query(Genre.name_en).scalar() == "background"
+    assert tags == {
+        "cat": ("猫", None),
+        "dog": (None, None),
+        "sky": (None, "background"),
+    }
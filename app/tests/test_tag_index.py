@@ -0,0 +1,76 @@
+import pytest
+
+from db import query
+from db.models import Tag
+from gui.viewmodel import GalleryViewModel
+from utils.tag_index import TagIndex, TagInfo, TagQueryError, parse_tag_query
+
+
+def test_parse_precedence_and_tag_names_with_parentheses():
+    assert parse_tag_query("a b OR -c") == (
+        "or",
+        [("and", [("tag", "a"), ("tag", "b")]), ("not", ("tag", "c"))],
+    )
+    assert parse_tag_query("NOT (saber_(fate) | x)") == (
+        "not",
+        ("or", [("tag", "saber_(fate)"), ("tag", "x")]),
+    )
+    for broken in ("", "(a", "a OR", "a )"):
+        with pytest.raises(TagQueryError):
+            parse_tag_query(broken)
+
+
+def test_boolean_queries_skip_disabled_tags_and_r18_images():
+    index = TagIndex()
+    index.set_tags(
+        [
+            TagInfo(1, "cat", "猫", False, False),
+            TagInfo(2, "dog", None, False, False),
+            TagInfo(3, "old", None, False, True),
+            TagInfo(4, "nsfw", None, True, False),
+        ]
+    )
+    index.add_images(range(1, 7), r18_ids=[6])
+    index.add_pairs([1, 2, 3, 2, 3, 4, 1, 5, 6], [1, 1, 1, 2, 2, 2, 3, 4, 1])
+
+    assert index.search("cat").tolist() == [1, 2, 3]
+    assert index.search("ＣＡＴ dog").tolist() == [2, 3]
+    assert index.search("猫 OR dog").tolist() == [1, 2, 3, 4]
+    assert index.search("-cat").tolist() == [4]
+    assert index.search("old").tolist() == []
+    assert index.search("cat", include_r18=True).tolist() == [1, 2, 3, 6]
+
+    index.remove_images([2])
+    assert index.search("cat dog").tolist() == [3]
+    index.add_images([2])
+    assert index.search("cat").tolist() == [1, 3]
+
+
+def test_tag_filter_pages_and_follows_writes(db_engine, tmp_path):
+    paths = [(tmp_path / f"{i}.jpg", tmp_path / f"{i}_t.webp") for i in range(6)]
+    for path, _ in paths:
+        path.write_bytes(b"x")
+    query.add_image_entries(paths[:5])
+    with query.get_session() as session:
+        session.add_all([Tag(id=1, tag="cat"), Tag(id=2, tag="dog", disable=True)])
+        session.commit()
+    query.add_image_tags([(1, 1), (2, 1), (4, 1), (5, 1), (1, 2)])
+    assert query.get_tags_for_image(1) == ["cat"]
+
+    viewmodel = GalleryViewModel(page_size=2)
+    try:
+        assert viewmodel.set_tag_query("cat") == 4
+        assert [r.id for r in viewmodel.get_page(1)] == [4, 5]
+
+        query.add_image_entries(paths[5:])
+        with query.get_session() as session:
+            session.add(Tag(id=3, tag="bird"))
+            session.commit()
+        query.add_image_tags([(6, 1), (6, 3)])
+        query.toggle_favorite_flag(6)
+        viewmodel.toggle_favorites()
+        assert [r.id for r in viewmodel.get_page(0)] == [6]
+        assert viewmodel.set_tag_query("bird OR dog") == 1
+        assert viewmodel.set_tag_query("") == 1
+    finally:
+        viewmodel.close()
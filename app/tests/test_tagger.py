@@ -0,0 +1,107 @@
+import os
+
+import numpy as np
+import pytest
+
+from db import query
+from db.ingest import tag_untagged_images
+from utils.tagger import HashTagger, Tagger, TaggerPool
+
+
+def test_hash_tagger_is_deterministic(tmp_path):
+    paths = [tmp_path / "a.jpg", tmp_path / "b.jpg", tmp_path / "missing.jpg"]
+    paths[0].write_bytes(b"a")
+    paths[1].write_bytes(b"b")
+    first, second, missing = HashTagger().tag_batch(paths)
+    again = HashTagger().tag_batch(paths[:1])[0]
+    assert missing is None
+    assert len(first.tags) == HashTagger.TAGS_PER_IMAGE
+    assert first.tags == again.tags and first.tags != second.tags
+    assert np.array_equal(first.embedding, again.embedding)
+
+
+def test_tag_untagged_images_saves_results_and_resumes(db_engine, tmp_path):
+    paths = [(tmp_path / f"{i}.jpg", tmp_path / f"{i}_t.webp") for i in range(5)]
+    for i, (path, _) in enumerate(paths):
+        path.write_bytes(bytes([i]))
+    query.add_image_entries(paths)
+
+    # 途中で止めても、次の実行は未処理の画像だけを処理する
+    assert tag_untagged_images("hash", processes=1, batch_size=2, limit=3) == 3
+    assert query.count_untagged_images() == 2
+    assert tag_untagged_images("hash", processes=1, batch_size=2) == 2
+    assert query.count_untagged_images() == 0
+
+    expected = HashTagger().tag_batch([paths[4][0]])[0]
+    assert query.get_tags_for_image(5) == expected.tags
+    ids, vectors = query.load_embeddings("tag_embedding")
+    assert list(ids) == [1, 2, 3, 4, 5]
+    assert np.allclose(vectors[4], expected.embedding)
+
+
+class BrokenTagger(HashTagger):
+    name = "broken"
+
+    def load(self) -> None:
+        raise OSError("model.onnx が見つかりません")
+
+
+class FlakyTagger(HashTagger):
+    name = "flaky"
+
+    def tag_batch(self, image_paths):
+        if any(p.name == "bad.jpg" for p in image_paths):
+            raise ValueError("壊れたバッチ")
+        return super().tag_batch(image_paths)
+
+
+def test_tagger_that_fails_to_load_raises_instead_of_hanging():
+    with pytest.raises(RuntimeError, match="model.onnx"):
+        TaggerPool(f"{__name__}:BrokenTagger", processes=2)
+
+
+def test_failed_batch_is_reported_and_left_untagged(tmp_path, capsys):
+    paths = [tmp_path / name for name in ("a.jpg", "bad.jpg", "c.jpg")]
+    for path in paths:
+        path.write_bytes(path.name.encode())
+    with TaggerPool(f"{__name__}:FlakyTagger", processes=1, batch_size=1) as pool:
+        batches = list(pool.iter_results(enumerate(paths, 1)))
+    assert [[r is None for _, r in batch] for batch in batches] == [
+        [False],
+        [True],
+        [False],
+    ]
+    assert "画像 id 2〜2" in capsys.readouterr().out
+
+
+class HalfBrokenTagger(HashTagger):
+    """最初に読み込んだワーカーだけが成功する"""
+
+    name = "half_broken"
+
+    def __init__(self, lock_path: str):
+        super().__init__()
+        self.lock_path = lock_path
+
+    def load(self) -> None:
+        try:
+            os.close(os.open(self.lock_path, os.O_CREAT | os.O_EXCL))
+        except FileExistsError:
+            raise OSError("GPU のメモリが足りません") from None
+
+
+def test_pool_checks_that_every_worker_loaded(tmp_path):
+    with pytest.raises(RuntimeError, match="GPU"):
+        TaggerPool(
+            f"{__name__}:HalfBrokenTagger",
+            processes=3,
+            lock_path=str(tmp_path / "loaded"),
+        )
+
+
+def test_tagger_without_tag_batch_cannot_be_created():
+    class Incomplete(Tagger):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,80 @@
+from types import SimpleNamespace
+
+from gui.virtual_grid import VirtualGallery, visible_row_range
+
+
+class FakeCell:
+    def bind_entry(self, entry):
+        self.entry = entry
+
+    def release(self):
+        self.entry = None
+
+    def update_idletasks(self):
+        pass
+
+    def winfo_reqwidth(self):
+        return 100
+
+    def winfo_reqheight(self):
+        return 100
+
+
+class FakeCanvas:
+    def __init__(self, height):
+        self.height = height
+        self.top = 0
+        self.items = {}
+
+    def create_window(self, x, y, window, anchor):
+        item = len(self.items) + 1
+        self.items[item] = {"window": window, "state": "normal"}
+        return item
+
+    def coords(self, item, x, y):
+        self.items[item]["xy"] = (x, y)
+
+    def itemconfigure(self, item, state):
+        self.items[item]["state"] = state
+
+    def canvasy(self, _):
+        return self.top
+
+    def winfo_height(self):
+        return self.height
+
+    def configure(self, scrollregion):
+        self.scrollregion = scrollregion
+
+    def yview_moveto(self, _):
+        self.top = 0
+
+
+def test_visible_row_range_clamps_overscan():
+    assert visible_row_range(0, 250, 100, 50, 1) == range(4)
+    assert visible_row_range(0, 300, 100, 50, 1) == range(4)
+    assert visible_row_range(4850, 250, 100, 50, 1) == range(47, 50)
+    assert visible_row_range(0, 250, 100, 0, 1) == range(0)
+
+
+def test_widget_count_stays_constant_while_scrolling():
+    entries = [SimpleNamespace(id=i) for i in range(10_000)]
+    canvas = FakeCanvas(height=300)
+    gallery = VirtualGallery(
+        canvas, lambda parent: FakeCell(), (100, 100), overscan=1, padx=0, pady=0
+    )
+    gallery.set_columns(5)
+    gallery.set_source(len(entries), lambda o, n: entries[o : o + n])
+
+    for top in range(0, 100 * 2000, 1500):
+        canvas.top = top
+        gallery.refresh()
+
+    assert gallery.created == 5 * 5  # 見えている3行 + 上下1行
+    bound = sorted(
+        item["window"].entry.id
+        for item in canvas.items.values()
+        if item["state"] == "normal"
+    )
+    first_row = top // 100 - 1
+    assert bound == list(range(first_row * 5, first_row * 5 + 25))
@@ -0,0 +1,410 @@
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+from config import ANN_NPROBE, ANN_PQ_M, ANN_RERANK, ANN_TRAIN_SAMPLE
+from utils.embedding import normalize_rows, top_k
+
+INDEX_FORMAT = 1
+# 1サブ空間あたりのコード数（uint8 に収まる上限）
+PQ_CODES = 256
+# 距離計算を分割する行数（n×k の一時行列を抑える）
+ASSIGN_CHUNK = 8192
+# 本体セグメントのファイル（ids / codes / vectors は mmap で開く）
+SEGMENT_ARRAYS = ("centroids", "codebooks", "offsets", "ids", "codes", "vectors")
+MMAP_ARRAYS = ("ids", "codes", "vectors", "id_order")
+SEGMENT_PREFIX = "segment-"
+
+
+def assign(data: np.ndarray, centroids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """各行に最も近い重心の番号と、その二乗距離を返す"""
+    c_norms = np.einsum("ij,ij->i", centroids, centroids)
+    labels = np.empty(len(data), dtype=np.int64)
+    dists = np.empty(len(data), dtype=np.float32)
+    for start in range(0, len(data), ASSIGN_CHUNK):
+        x = data[start : start + ASSIGN_CHUNK]
+        d = c_norms - 2 * (x @ centroids.T)
+        best = np.argmin(d, axis=1)
+        labels[start : start + len(x)] = best
+        dists[start : start + len(x)] = d[np.arange(len(x)), best] + np.einsum(
+            "ij,ij->i", x, x
+        )
+    return labels, dists
+
+
+def kmeans(data: np.ndarray, k: int, iters: int = 10, seed: int = 0) -> np.ndarray:
+    """k-means で k 個の重心を求める（空のクラスタは遠い点で埋め直す）"""
+    data = np.asarray(data, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+    for _ in range(iters):
+        labels, dists = assign(data, centroids)
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=k)
+        filled = counts > 0
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[filled]
+        sums = np.add.reduceat(data[order], starts, axis=0)
+        centroids[filled] = sums / counts[filled, None]
+        if not filled.all():
+            far = np.argsort(-dists)[: k - filled.sum()]
+            centroids[~filled] = data[far]
+    return centroids
+
+
+def _subspaces(dim: int, m: int) -> int:
+    """dim を割り切れる m 以下の最大のサブ空間数"""
+    m = max(1, min(m, dim))
+    while dim % m:
+        m -= 1
+    return m
+
+
+def _next_segment(path: Path) -> str:
+    """path にある最新の世代の次のセグメント名"""
+    generations = [
+        int(p.name[len(SEGMENT_PREFIX) :])
+        for p in path.glob(f"{SEGMENT_PREFIX}*")
+        if p.name[len(SEGMENT_PREFIX) :].isdigit()
+    ]
+    return f"{SEGMENT_PREFIX}{max(generations, default=-1) + 1:06d}"
+
+
+class _Snapshot(NamedTuple):
+    """検索が読む配列の組（ロックの中でまとめて取り出す）"""
+
+    offsets: np.ndarray
+    ids: np.ndarray
+    codes: np.ndarray
+    vectors: np.ndarray
+    removed: np.ndarray
+    delta_ids: np.ndarray
+    delta_vectors: np.ndarray
+
+
+class IVFPQIndex:
+    """転置ファイル + 直積量子化 (IVF-PQ) による近似最近傍の索引
+
+    ベクトルを粗い重心 (n_lists 個) に振り分け、重心との差を m 個のサブ空間ごとに
+    256 通りのコードへ量子化する。検索では近い nprobe 個のリストだけをコード表で
+    概算し、上位 rerank 件を float16 で保存した元ベクトルで再計算する。
+
+    本体はディレクトリ内の .npy を mmap で開くため、数百万件でも常駐メモリは小さい。
+    追加・更新された行は差分セグメントに溜めて総当たりで検索し、
+    compact() で本体へ取り込む。削除は墓標で除外する。
+    """
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        codebooks: np.ndarray,
+        offsets: np.ndarray,
+        ids: np.ndarray,
+        codes: np.ndarray,
+        vectors: np.ndarray,
+        id_order: np.ndarray | None = None,
+        max_id: int | None = None,
+        path: Path | None = None,
+        segment: str | None = None,
+    ):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.codebooks = np.asarray(codebooks, dtype=np.float32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.ids = ids
+        self.codes = codes
+        self.vectors = vectors
+        self.id_order = np.argsort(ids, kind="stable") if id_order is None else id_order
+        self.max_id = int(ids.max(initial=0)) if max_id is None else max_id
+        self.path = path
+        self.segment = segment
+        self.nprobe = ANN_NPROBE
+        self.rerank = ANN_RERANK
+        self._lock = threading.RLock()
+        self._removed = np.empty(0, dtype=np.int64)
+        self._delta_ids = np.empty(0, dtype=np.int64)
+        self._delta_vectors = np.empty((0, self.dim), dtype=np.float32)
+
+    # ---------------- 構築・保存 ----------------
+
+    @classmethod
+    def build(
+        cls,
+        ids: np.ndarray,
+        vectors: np.ndarray,
+        n_lists: int = 0,
+        m: int = ANN_PQ_M,
+        sample: int = ANN_TRAIN_SAMPLE,
+        seed: int = 0,
+    ) -> "IVFPQIndex":
+        """埋め込みから重心とコード表を学習して索引を作る
+
+        n_lists=0 ならリスト数を件数から決める。
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = normalize_rows(vectors)
+        if len(ids) == 0:
+            raise ValueError("埋め込みが1件もありません")
+        if not n_lists:
+            n_lists = int(np.clip(4 * np.sqrt(len(ids)), 1, 65536))
+        m = _subspaces(vectors.shape[1], m)
+
+        rng = np.random.default_rng(seed)
+        train = vectors
+        if len(vectors) > sample:
+            train = vectors[rng.choice(len(vectors), sample, replace=False)]
+        centroids = kmeans(train, n_lists, seed=seed)
+        labels, _ = assign(train, centroids)
+        residuals = (train - centroids[labels]).reshape(len(train), m, -1)
+        codebooks = np.stack(
+            [kmeans(residuals[:, j], PQ_CODES, iters=8, seed=seed) for j in range(m)]
+        )
+        if codebooks.shape[1] < PQ_CODES:
+            # 学習データが少ないときも uint8 の全コードを引けるようにしておく
+            pad = PQ_CODES - codebooks.shape[1]
+            codebooks = np.concatenate([codebooks, codebooks[:, :1].repeat(pad, 1)], 1)
+
+        index = cls(
+            centroids,
+            codebooks,
+            np.zeros(len(centroids) + 1, dtype=np.int64),
+            np.empty(0, dtype=np.int64),
+            np.empty((0, m), dtype=np.uint8),
+            np.empty((0, vectors.shape[1]), dtype=np.float16),
+        )
+        index._set_segment(*index._pack(ids, vectors))
+        return index
+
+    @classmethod
+    def open(cls, path: Path) -> "IVFPQIndex":
+        """保存済みの索引を開く。大きな配列は mmap で読む"""
+        path = Path(path)
+        meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+        if meta["format"] != INDEX_FORMAT:
+            raise ValueError(f"対応していない索引の形式です: {meta['format']}")
+        segment = path / meta["segment"]
+        arrays = {
+            name: np.load(
+                segment / f"{name}.npy", mmap_mode="r" if name in MMAP_ARRAYS else None
+            )
+            for name in SEGMENT_ARRAYS + ("id_order",)
+        }
+        index = cls(**arrays, max_id=meta["max_id"], path=path, segment=meta["segment"])
+        for name in ("removed", "delta_ids", "delta_vectors"):
+            file = path / f"{name}.npy"
+            if file.exists():
+                setattr(index, f"_{name}", np.load(file))
+        return index
+
+    def save(self, path: Path) -> None:
+        """本体を新しいセグメントに書き出し、meta.json を差し替える
+
+        開いている mmap を上書きしないよう、セグメントは毎回まだないディレクトリに書く。
+        作り直した索引を保存したときは、前の索引の差分・墓標も空で置き換わる。
+        """
+        path = Path(path)
+        with self._lock:
+            segment = _next_segment(path)
+            (path / segment).mkdir(parents=True)
+            for name in SEGMENT_ARRAYS + ("id_order",):
+                np.save(path / segment / f"{name}.npy", getattr(self, name))
+            self.path, self.segment = path, segment
+            self.flush()
+        reopened = IVFPQIndex.open(path)
+        with self._lock:
+            for name in MMAP_ARRAYS:
+                setattr(self, name, getattr(reopened, name))
+        for old in path.glob(f"{SEGMENT_PREFIX}*"):
+            if old.name != segment:
+                # 開いているプロセスは消した後も mmap を読める。Windows では消せないので
+                # 失敗しても次回の保存に任せる
+                shutil.rmtree(old, ignore_errors=True)
+
+    def flush(self) -> None:
+        """差分セグメント・墓標・透かしを書き出す（本体は書き直さない）"""
+        if self.path is None:
+            return
+        with self._lock:
+            np.save(self.path / "removed.npy", self._removed)
+            np.save(self.path / "delta_ids.npy", self._delta_ids)
+            np.save(self.path / "delta_vectors.npy", self._delta_vectors)
+            meta = {
+                "format": INDEX_FORMAT,
+                "segment": self.segment,
+                "dim": self.dim,
+                "m": self.m,
+                "n_lists": self.n_lists,
+                "max_id": self.max_id,
+            }
+            tmp = self.path / "meta.json.tmp"
+            tmp.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+            os.replace(tmp, self.path / "meta.json")
+
+    # ---------------- 情報 ----------------
+
+    def __len__(self) -> int:
+        with self._lock:
+            main = len(self.ids) - len(self._removed)
+            return main + len(self._delta_ids)
+
+    @property
+    def dim(self) -> int:
+        return self.centroids.shape[1]
+
+    @property
+    def m(self) -> int:
+        return self.codebooks.shape[0]
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def delta_size(self) -> int:
+        return len(self._delta_ids)
+
+    # ---------------- 差分更新 ----------------
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray) -> None:
+        """行を差分セグメントに追加する。既存の id は新しいベクトルで置き換える"""
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) == 0:
+            return
+        vectors = normalize_rows(vectors)
+        with self._lock:
+            keep = ~np.isin(self._delta_ids, ids)
+            self._delta_ids = np.concatenate([self._delta_ids[keep], ids])
+            self._delta_vectors = np.concatenate([self._delta_vectors[keep], vectors])
+            self._tombstone(ids[self._in_main(ids)])
+            self.max_id = max(self.max_id, int(ids.max()))
+
+    def remove(self, ids) -> None:
+        """行を検索結果から除外する"""
+        ids = np.fromiter(ids, dtype=np.int64)
+        with self._lock:
+            keep = ~np.isin(self._delta_ids, ids)
+            self._delta_ids = self._delta_ids[keep]
+            self._delta_vectors = self._delta_vectors[keep]
+            self._tombstone(ids[self._in_main(ids)])
+
+    def compact(self) -> None:
+        """差分と墓標を本体に取り込み、学習済みの重心とコード表で符号化し直す"""
+        with self._lock:
+            live = ~np.isin(self.ids, self._removed)
+            ids = np.concatenate([self.ids[live], self._delta_ids])
+            vectors = np.concatenate(
+                [np.asarray(self.vectors[live], dtype=np.float32), self._delta_vectors]
+            )
+            self._set_segment(*self._pack(ids, vectors))
+            self._removed = np.empty(0, dtype=np.int64)
+            self._delta_ids = np.empty(0, dtype=np.int64)
+            self._delta_vectors = np.empty((0, self.dim), dtype=np.float32)
+            if self.path is not None:
+                self.save(self.path)
+
+    def _in_main(self, ids: np.ndarray) -> np.ndarray:
+        if len(self.ids) == 0:
+            return np.zeros(len(ids), dtype=bool)
+        sorted_ids = self.ids[self.id_order]
+        pos = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+        return sorted_ids[pos] == ids
+
+    def _tombstone(self, ids: np.ndarray) -> None:
+        self._removed = np.union1d(self._removed, ids)
+
+    def _pack(self, ids: np.ndarray, vectors: np.ndarray):
+        """ベクトルを符号化し、リスト順に並べた本体の配列を返す"""
+        labels, _ = assign(vectors, self.centroids)
+        residuals = (vectors - self.centroids[labels]).reshape(len(vectors), self.m, -1)
+        codes = np.empty((len(vectors), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            codes[:, j], _ = assign(residuals[:, j], self.codebooks[j])
+        order = np.argsort(labels, kind="stable")
+        offsets = np.zeros(self.n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=self.n_lists), out=offsets[1:])
+        return offsets, ids[order], codes[order], vectors[order].astype(np.float16)
+
+    def _set_segment(self, offsets, ids, codes, vectors) -> None:
+        self.offsets, self.ids, self.codes, self.vectors = offsets, ids, codes, vectors
+        self.id_order = np.argsort(ids, kind="stable")
+        self.max_id = max(self.max_id, int(ids.max(initial=0)))
+
+    # ---------------- 検索 ----------------
+
+    def vector_of(self, image_id: int) -> np.ndarray | None:
+        with self._lock:
+            hit = np.flatnonzero(self._delta_ids == image_id)
+            if len(hit):
+                return self._delta_vectors[hit[-1]]
+            if image_id in self._removed or not self._in_main(np.array([image_id]))[0]:
+                return None
+            pos = np.searchsorted(self.ids[self.id_order], image_id)
+            return np.asarray(self.vectors[self.id_order[pos]], dtype=np.float32)
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int = 10,
+        nprobe: int | None = None,
+        rerank: int | None = None,
+    ) -> list[list[tuple[int, float]]]:
+        """クエリごとにコサイン類似度の高い k 件の (id, スコア) を返す
+
+        nprobe を増やすと再現率が上がり、rerank を増やすと順位が正確になる
+        （どちらも検索は遅くなる）。rerank=0 なら量子化した値のまま並べる。
+        """
+        nprobe = min(nprobe or self.nprobe, self.n_lists)
+        rerank = self.rerank if rerank is None else rerank
+        queries = normalize_rows(np.atleast_2d(queries))
+        with self._lock:
+            # compact() や save() が配列を差し替えても、同じ世代の組だけを読む
+            snapshot = _Snapshot(
+                self.offsets,
+                self.ids,
+                self.codes,
+                self.vectors,
+                self._removed,
+                self._delta_ids,
+                self._delta_vectors,
+            )
+        return [self._search_one(q, k, nprobe, rerank, snapshot) for q in queries]
+
+    def _search_one(self, q, k, nprobe, rerank, snap: _Snapshot):
+        # 内積最大の近似: q·x ≈ q·c + Σ_j q_j·codebook[j, code_j]
+        coarse = self.centroids @ q
+        l2_rank = coarse - 0.5 * np.einsum("ij,ij->i", self.centroids, self.centroids)
+        lists = np.argpartition(-l2_rank, nprobe - 1)[:nprobe]
+        starts, ends = snap.offsets[lists], snap.offsets[lists + 1]
+        positions = np.concatenate(
+            [np.arange(s, e) for s, e in zip(starts, ends)] or [np.empty(0, np.int64)]
+        )
+        table = np.einsum("jd,jcd->jc", q.reshape(self.m, -1), self.codebooks)
+        approx = np.repeat(coarse[lists], ends - starts)
+        if len(positions):
+            codes = np.asarray(snap.codes[positions])
+            approx += table[np.arange(self.m), codes].sum(axis=1)
+            if len(snap.removed):
+                approx[np.isin(np.asarray(snap.ids[positions]), snap.removed)] = -np.inf
+
+        cols, scores = top_k(approx[None], max(rerank, k))
+        keep = np.isfinite(scores[0])
+        positions, scores = positions[cols[0][keep]], scores[0][keep]
+        if rerank:
+            scores = np.asarray(snap.vectors[positions], dtype=np.float32) @ q
+        ids = np.concatenate([np.asarray(snap.ids[positions]), snap.delta_ids])
+        scores = np.concatenate([scores, snap.delta_vectors @ q])
+
+        cols, best = top_k(scores[None], k)
+        return [(int(ids[c]), float(s)) for c, s in zip(cols[0], best[0])]
+
+    def similar_to(self, image_id: int, k: int = 10) -> list[tuple[int, float]]:
+        """指定した画像に似た画像を、その画像自身を除いて返す"""
+        vector = self.vector_of(image_id)
+        if vector is None:
+            return []
+        hits = self.search(vector, k + 1)[0]
+        return [(i, s) for i, s in hits if i != image_id][:k]
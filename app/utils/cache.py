@@ -0,0 +1,104 @@
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from dataclasses import dataclass
+from typing import Generic, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    """キャッシュの統計情報"""
+
+    hits: int
+    disk_hits: int
+    misses: int
+    evictions: int
+    invalidations: int
+    entries: int
+    bytes: int
+    max_bytes: int
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.disk_hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class ByteLRUCache(Generic[K, V]):
+    """合計バイト数で上限を決めるスレッドセーフなLRUキャッシュ
+
+    エントリ数ではなく sizeof で測ったバイト数が max_bytes を超えた時点で
+    古いものから追い出す。グループ単位（同じ画像の別サイズなど）でまとめて無効化できる。
+    """
+
+    def __init__(self, max_bytes: int, sizeof: Callable[[V], int]):
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._entries: OrderedDict[K, tuple[V, int]] = OrderedDict()
+        self._groups: dict[Hashable, set[K]] = {}
+        self._group_of: dict[K, Hashable] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: K) -> V | None:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            self._entries.move_to_end(key)
+            return item[0]
+
+    def put(self, key: K, value: V, group: Hashable | None = None) -> None:
+        size = self._sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                return  # 上限より大きいものは保持しない
+            self._entries[key] = (value, size)
+            self._bytes += size
+            if group is not None:
+                self._groups.setdefault(group, set()).add(key)
+                self._group_of[key] = group
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate_group(self, group: Hashable) -> int:
+        """グループに属するエントリをすべて削除し、削除件数を返す"""
+        with self._lock:
+            keys = list(self._groups.get(group, ()))
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._groups.clear()
+            self._group_of.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    def _remove(self, key: K) -> None:
+        _, size = self._entries.pop(key)
+        self._bytes -= size
+        group = self._group_of.pop(key, None)
+        if group is not None:
+            keys = self._groups[group]
+            keys.discard(key)
+            if not keys:
+                del self._groups[group]
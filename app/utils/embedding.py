@@ -0,0 +1,69 @@
+import numpy as np
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """各行をL2ノルム1に正規化（ゼロベクトルはそのまま）"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def top_k(scores: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """行ごとにスコアの大きい順で k 件の (列番号, スコア) を返す"""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1)
+    return (
+        np.take_along_axis(part, order, axis=1),
+        np.take_along_axis(part_scores, order, axis=1),
+    )
+
+
+class EmbeddingIndex:
+    """正規化済みの埋め込み行列をメモリに持ち、コサイン類似度で検索する
+
+    全件との内積を行列積1回で計算するため、数十万件までは総当たりで十分速い。
+    """
+
+    def __init__(self, ids: np.ndarray, vectors: np.ndarray):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.matrix = normalize_rows(vectors)
+        order = np.argsort(self.ids)
+        self._sorted_ids = self.ids[order]
+        self._sorted_rows = order
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dim(self) -> int:
+        return self.matrix.shape[1]
+
+    def vector_of(self, image_id: int) -> np.ndarray | None:
+        pos = np.searchsorted(self._sorted_ids, image_id)
+        if pos >= len(self._sorted_ids) or self._sorted_ids[pos] != image_id:
+            return None
+        return self.matrix[self._sorted_rows[pos]]
+
+    def search(self, queries: np.ndarray, k: int = 10) -> list[list[tuple[int, float]]]:
+        """クエリ（1件または複数件）ごとに類似度の高い k 件の (id, スコア) を返す"""
+        queries = normalize_rows(np.atleast_2d(queries))
+        if len(self) == 0:
+            return [[] for _ in queries]
+        cols, scores = top_k(queries @ self.matrix.T, k)
+        return [
+            [(int(self.ids[c]), float(s)) for c, s in zip(row_cols, row_scores)]
+            for row_cols, row_scores in zip(cols, scores)
+        ]
+
+    def similar_to(self, image_id: int, k: int = 10) -> list[tuple[int, float]]:
+        """指定した画像に似た画像を、その画像自身を除いて返す"""
+        vector = self.vector_of(image_id)
+        if vector is None:
+            return []
+        hits = self.search(vector, k + 1)[0]
+        return [(i, s) for i, s in hits if i != image_id][:k]
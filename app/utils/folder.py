@@ -1,6 +1,6 @@
+import functools
 import os
 from pathlib import Path
-from tkinter import Tk, filedialog
 
 from config import IMAGE_DIR
 
@@ -11,11 +11,18 @@ class ImageLinkManager:
         self.image_dir.mkdir(exist_ok=True)
         self._clean_broken_symlinks()
 
-    def select_image_folder(self) -> Path | None:
-        root = Tk()
-        root.withdraw()
-        folder_path = filedialog.askdirectory(title="画像フォルダを選択してください")
-        root.destroy()
+    def select_image_folder(self, parent=None) -> Path | None:
+        """フォルダ選択のダイアログを開く。parent がなければ一時的なウィンドウを作る"""
+        from tkinter import Tk, filedialog
+
+        root = parent or Tk()
+        if parent is None:
+            root.withdraw()
+        folder_path = filedialog.askdirectory(
+            parent=root, title="画像フォルダを選択してください"
+        )
+        if parent is None:
+            root.destroy()
         return Path(folder_path) if folder_path else None
 
     def create_symlink(self, target: Path):
@@ -37,4 +44,14 @@ class ImageLinkManager:
                 path.unlink()
 
 
-image_link_manager = ImageLinkManager()
+@functools.cache
+def get_image_link_manager() -> ImageLinkManager:
+    """共有の ImageLinkManager（最初に使うときに作り、リンク切れを掃除する）"""
+    return ImageLinkManager()
+
+
+def __getattr__(name: str):
+    # モジュールを読み込んだだけではディレクトリを走査しない
+    if name == "image_link_manager":
+        return get_image_link_manager()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
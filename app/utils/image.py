@@ -1,32 +1,165 @@
+import functools
 import hashlib
+import os
+import threading
+from collections.abc import Iterable, Iterator
 from datetime import datetime
-from functools import lru_cache
-from multiprocessing import Pool, cpu_count
 from pathlib import Path
 
 import customtkinter as ctk
+from PIL import Image, ImageEnhance, ImageFilter
+
 from config import (
     ENABLE_IMAGE_CACHE,
+    IMAGE_CACHE_MAX_BYTES,
     IMAGE_DIR,
+    SHADOW_OFFSET,
     SUPPORTED_FORMATS,
     THUMB_DIR,
+    THUMBNAIL_DECODE_MODE,
+    THUMBNAIL_FORMAT,
+    THUMBNAIL_QUALITY,
     THUMBNAIL_SIZE,
 )
-from PIL import Image, ImageEnhance, ImageFilter
+from utils.cache import ByteLRUCache, CacheStats
+from utils.parallel import bounded_imap
+from utils.profiling import counter, histogram
+from utils.scanner import LibraryScanner, ParallelWalker, ScanManifest, ScanResult
+
+# 壊れた画像や読めないファイルを開いたときに読み込みが送出する例外
+IMAGE_LOAD_ERRORS = (OSError, ValueError, Image.DecompressionBombError)
+
+# デコード方式ごとの (reducing_gap, 最終段のリサンプリング)
+# reducing_gap が None の場合は元の解像度でデコードしてから縮小する
+DECODE_MODES: dict[str, tuple[float | None, Image.Resampling]] = {
+    "quality": (None, Image.Resampling.LANCZOS),
+    "balanced": (3.0, Image.Resampling.LANCZOS),
+    "fast": (1.0, Image.Resampling.BILINEAR),
+}
+
+
+def decode_thumbnail(
+    img: Image.Image, size: tuple[int, int], channel: str, mode: str
+) -> Image.Image:
+    """デコード方式に応じて縮小しつつ読み込み、指定チャンネルの画像を返す"""
+    reducing_gap, resample = DECODE_MODES[mode]
+    if reducing_gap is not None:
+        # JPEGはconvertで全画素をデコードする前に、DCT領域で1/2〜1/8に縮小させる
+        img.draft(None, (int(size[0] * reducing_gap), int(size[1] * reducing_gap)))
+    img = img.convert(channel)
+    # JPEG以外は reduce() による整数倍の縮小を挟んでから resample する
+    img.thumbnail(size, resample, reducing_gap=reducing_gap)
+    return img
+
+
+# サムネイルの保存形式ごとの (拡張子, PILのフォーマット名)
+THUMBNAIL_CODECS: dict[str, tuple[str, str]] = {
+    "webp": (".webp", "WEBP"),
+    "jpeg": (".jpg", "JPEG"),
+    "png": (".png", "PNG"),
+}
+
+
+def thumbnail_format_of(thumb_path: Path) -> str:
+    """サムネイルの拡張子から保存形式を判定"""
+    suffix = thumb_path.suffix.lower()
+    for fmt, (ext, _) in THUMBNAIL_CODECS.items():
+        if ext == suffix:
+            return fmt
+    raise ValueError(f"未対応のサムネイル形式: {thumb_path}")
+
+
+def thumbnail_path_for(thumb_dir: Path, img_path: Path, fmt: str) -> Path:
+    """元画像のパスと保存形式からサムネイルのパスを決める"""
+    thumb_hash = hashlib.md5(img_path.as_posix().encode("utf-8")).hexdigest()
+    return thumb_dir / f"{thumb_hash}_thumbnail{THUMBNAIL_CODECS[fmt][0]}"
+
+
+def save_thumbnail(img: Image.Image, thumb_path: Path, fmt: str, quality: int):
+    """保存形式と品質を指定してサムネイルを書き出す"""
+    options: dict = {}
+    if fmt == "webp":
+        options = {"quality": quality, "method": 4}
+    elif fmt == "jpeg":
+        options = {"quality": quality, "optimize": True}
+    img.save(thumb_path, format=THUMBNAIL_CODECS[fmt][1], **options)
+
+
+# 影付き・ホバー画像はアルファ付きで小さく保存できるWebPで固定
+RENDER_EXT = ".webp"
+RENDER_KEY_FILE = ".render_key"
+
+
+def render_key(size: tuple[int, int], shadow_offset: int) -> str:
+    """影付き・ホバー画像の生成条件を表すキー"""
+    return f"{size[0]}x{size[1]}_o{shadow_offset}"
+
+
+def rendered_paths(
+    thumb_path: Path, size: tuple[int, int], shadow_offset: int
+) -> tuple[Path, Path]:
+    """サムネイルの隣に置く影付き画像とホバー画像のパス"""
+    prefix = f"{thumb_path.stem}_{render_key(size, shadow_offset)}"
+    return (
+        thumb_path.with_name(f"{prefix}_shadow{RENDER_EXT}"),
+        thumb_path.with_name(f"{prefix}_hover{RENDER_EXT}"),
+    )
+
+
+def render_shadow_pair(
+    img: Image.Image, size: tuple[int, int], shadow_offset: int
+) -> tuple[Image.Image, Image.Image]:
+    """縮小済みのRGBA画像から影付き画像とホバー用画像を生成"""
+    canvas = Image.new("RGBA", size, (0, 0, 0, 0))
+    x = (size[0] - img.width) // 2
+    y = (size[1] - img.height) // 2
+    canvas.paste(img, (x, y), img)
+
+    shadow = canvas.copy().filter(ImageFilter.GaussianBlur(2))
+    final_img = Image.new(
+        "RGBA",
+        (size[0] + shadow_offset, size[1] + shadow_offset),
+        (0, 0, 0, 0),
+    )
+    final_img.paste(shadow, (2, 2), shadow)
+    final_img.paste(canvas, (0, 0), canvas)
+
+    hover_img = ImageEnhance.Brightness(canvas).enhance(0.6)
+    return final_img, hover_img
+
+
+def save_rendered_pair(
+    final_img: Image.Image,
+    hover_img: Image.Image,
+    thumb_path: Path,
+    size: tuple[int, int],
+    shadow_offset: int,
+    quality: int = THUMBNAIL_QUALITY,
+) -> None:
+    """影付き画像とホバー画像をサムネイルの隣に保存"""
+    shadow_path, hover_path = rendered_paths(thumb_path, size, shadow_offset)
+    final_img.save(shadow_path, format="WEBP", quality=quality, method=4)
+    hover_img.save(hover_path, format="WEBP", quality=quality, method=4)
 
 
 def _process_and_save(args) -> tuple[Path, Path]:
     """画像をリサイズしてサムネイルを保存するマルチプロセス対象の関数"""
-    img_path, thumbnail_size, thumb_dir = args
+    img_path, thumbnail_size, thumb_dir, decode_mode, fmt, quality, shadow_offset = args
     try:
         with Image.open(img_path) as img:
-            img = img.convert("RGB")
-            img.thumbnail(thumbnail_size, Image.Resampling.LANCZOS)
+            img = decode_thumbnail(img, thumbnail_size, "RGB", decode_mode)
 
-            thumb_hash = hashlib.md5(img_path.as_posix().encode("utf-8")).hexdigest()
-            thumb_path = thumb_dir / f"{thumb_hash}_thumbnail.png"
+            thumb_path = thumbnail_path_for(thumb_dir, img_path, fmt)
             thumb_dir.mkdir(exist_ok=True)
-            img.save(thumb_path)
+            save_thumbnail(img, thumb_path, fmt, quality)
+
+            # ギャラリー表示用の影付き・ホバー画像もここで焼き込んでおく
+            final_img, hover_img = render_shadow_pair(
+                img.convert("RGBA"), thumbnail_size, shadow_offset
+            )
+            save_rendered_pair(
+                final_img, hover_img, thumb_path, thumbnail_size, shadow_offset, quality
+            )
 
             return (img_path, thumb_path)
     except Exception as e:
@@ -34,47 +167,88 @@ def _process_and_save(args) -> tuple[Path, Path]:
         raise
 
 
+def _reencode_thumbnail(args) -> tuple[int, Path, Path]:
+    """既存のサムネイルを別形式で書き出すマルチプロセス対象の関数"""
+    image_id, image_path, thumb_path, thumb_dir, fmt, quality = args
+    try:
+        new_path = thumbnail_path_for(thumb_dir, image_path, fmt)
+        with Image.open(thumb_path) as img:
+            save_thumbnail(img.convert("RGB"), new_path, fmt, quality)
+        return image_id, thumb_path, new_path
+    except Exception as e:
+        print(f"⚠ 再エンコード失敗: {thumb_path} → {e}")
+        raise
+
+
 class ImageProcessor:
     """画像処理の基本機能を提供するクラス"""
 
-    def __init__(self, thumbnail_size: tuple[int, int] = THUMBNAIL_SIZE):
+    def __init__(
+        self,
+        thumbnail_size: tuple[int, int] = THUMBNAIL_SIZE,
+        decode_mode: str = THUMBNAIL_DECODE_MODE,
+    ):
+        if decode_mode not in DECODE_MODES:
+            raise ValueError(f"未対応のデコード方式: {decode_mode}")
         self.thumbnail_size = thumbnail_size
+        self.decode_mode = decode_mode
 
     def resize_image(
         self, img_path: Path, size: tuple[int, int], channel: str = "RGBA"
     ) -> Image.Image:
         """画像を指定サイズにリサイズしたPIL Imageを返す"""
         with Image.open(img_path) as img:
-            img = img.convert(channel)
-            img.thumbnail(size, Image.Resampling.LANCZOS)
-            return img
+            return decode_thumbnail(img, size, channel, self.decode_mode)
 
     def create_thumbnail_with_shadow(
-        self, image_path: Path, size: tuple[int, int], shadow_offset: int = 4
+        self,
+        image_path: Path,
+        size: tuple[int, int],
+        shadow_offset: int = SHADOW_OFFSET,
     ) -> tuple[ctk.CTkImage, ctk.CTkImage]:
         """サムネイル画像とホバー用画像を生成"""
-        img = self.resize_image(image_path, size)
-        canvas = Image.new("RGBA", size, (0, 0, 0, 0))
-        x = (size[0] - img.width) // 2
-        y = (size[1] - img.height) // 2
-        canvas.paste(img, (x, y), img)
-
-        shadow = canvas.copy().filter(ImageFilter.GaussianBlur(2))
-        final_img = Image.new(
-            "RGBA",
-            (size[0] + shadow_offset, size[1] + shadow_offset),
-            (0, 0, 0, 0),
-        )
-        final_img.paste(shadow, (2, 2), shadow)
-        final_img.paste(canvas, (0, 0), canvas)
-
-        hover_img = ImageEnhance.Brightness(canvas).enhance(0.6)
-
+        final_img, hover_img = self.load_rendered_pair(image_path, size, shadow_offset)
         return (
             ctk.CTkImage(light_image=final_img, size=size),
             ctk.CTkImage(light_image=hover_img, size=size),
         )
 
+    def load_rendered_pair(
+        self, thumb_path: Path, size: tuple[int, int], shadow_offset: int
+    ) -> tuple[Image.Image, Image.Image]:
+        """焼き込み済みの影付き・ホバー画像を読み込む（未作成ならここで作成）"""
+        pair = self.read_rendered_pair(thumb_path, size, shadow_offset)
+        if pair is not None:
+            return pair
+        return self.render_pair(thumb_path, size, shadow_offset)
+
+    def read_rendered_pair(
+        self, thumb_path: Path, size: tuple[int, int], shadow_offset: int
+    ) -> tuple[Image.Image, Image.Image] | None:
+        """焼き込み済みの影付き・ホバー画像を読み込む（未作成ならNone）"""
+        shadow_path, hover_path = rendered_paths(Path(thumb_path), size, shadow_offset)
+        try:
+            with Image.open(shadow_path) as final_img, Image.open(hover_path) as hover:
+                final_img.load()
+                hover.load()
+                return final_img, hover
+        except FileNotFoundError:
+            return None
+
+    def render_pair(
+        self, thumb_path: Path, size: tuple[int, int], shadow_offset: int
+    ) -> tuple[Image.Image, Image.Image]:
+        """サムネイルから影付き・ホバー画像を作成して保存"""
+        # 旧バージョンで登録した画像やサイズ変更後は初回表示時に焼き込む
+        thumb_path = Path(thumb_path)
+        img = self.resize_image(thumb_path, size)
+        final_img, hover_img = render_shadow_pair(img, size, shadow_offset)
+        try:
+            save_rendered_pair(final_img, hover_img, thumb_path, size, shadow_offset)
+        except OSError as e:
+            print(f"⚠ 影付き画像の保存失敗: {thumb_path} → {e}")
+        return final_img, hover_img
+
     def load_full_image(
         self, parent: ctk.CTkBaseClass, image_path: Path
     ) -> ctk.CTkLabel:
@@ -89,26 +263,84 @@ class ImageProcessor:
 
     def extract_captured_at(self, img_path: Path) -> datetime:
         """ファイルの作成日時を抽出してISO形式で返す"""
-        ts = img_path.stat().st_birthtime
+        st = img_path.stat()
+        # Linux には st_birthtime がないため更新日時で代用
+        ts = getattr(st, "st_birthtime", st.st_mtime)
         return datetime.fromtimestamp(ts)
 
 
+_memory_hits = counter(
+    "thumbnail_cache_memory_hits_total", "メモリ上のキャッシュに当たった件数"
+)
+_disk_hits = counter(
+    "thumbnail_cache_disk_hits_total", "焼き込み済みの画像を読んだ件数"
+)
+_renders = counter("thumbnail_cache_renders_total", "影付き画像をその場で作った件数")
+_load_seconds = histogram(
+    "thumbnail_load_seconds", "メモリ上のキャッシュにない影付き画像の読み込み時間"
+)
+
+
+def _pair_nbytes(pair: tuple[Image.Image, Image.Image]) -> int:
+    """デコード済み画像ペアのメモリ上のサイズ"""
+    return sum(img.width * img.height * len(img.getbands()) for img in pair)
+
+
 class ImageCache:
-    """画像キャッシュを管理するクラス"""
+    """影付き・ホバー画像の2段キャッシュ
 
-    def __init__(self, enable_cache: bool = ENABLE_IMAGE_CACHE):
+    1段目: デコード済みのPIL Imageをバイト数の上限まで保持するメモリ上のLRU
+    2段目: ディスクに焼き込み済みの画像（なければその場で作成して保存）
+    """
+
+    def __init__(
+        self,
+        enable_cache: bool = ENABLE_IMAGE_CACHE,
+        max_bytes: int = IMAGE_CACHE_MAX_BYTES,
+    ):
         self.enable_cache = enable_cache
+        self._memory: ByteLRUCache[tuple, tuple[Image.Image, Image.Image]] = (
+            ByteLRUCache(max_bytes, _pair_nbytes)
+        )
+        # 段ごとの件数（stats() はここだけを読む）
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._disk_hits = 0
+        self._renders = 0
 
-    @lru_cache(maxsize=512)
-    def _cached_loader(
+    def get_images(
         self,
         image_path: Path,
         size: tuple[int, int],
         shadow_offset: int,
         processor: ImageProcessor,
-    ) -> tuple[ctk.CTkImage, ctk.CTkImage]:
-        """キャッシュされたローダー"""
-        return processor.create_thumbnail_with_shadow(image_path, size, shadow_offset)
+    ) -> tuple[Image.Image, Image.Image]:
+        """影付き・ホバー画像をPIL Imageで取得（ワーカースレッドからも呼べる）"""
+        key = (str(image_path), tuple(size), shadow_offset)
+        if self.enable_cache:
+            pair = self._memory.get(key)
+            if pair is not None:
+                with self._lock:
+                    self._hits += 1
+                _memory_hits.inc()
+                return pair
+
+        with _load_seconds.time():
+            pair = processor.read_rendered_pair(image_path, size, shadow_offset)
+            with self._lock:
+                if pair is not None:
+                    self._disk_hits += 1
+                else:
+                    self._renders += 1
+            if pair is None:
+                _renders.inc()
+                pair = processor.render_pair(image_path, size, shadow_offset)
+            else:
+                _disk_hits.inc()
+
+        if self.enable_cache:
+            self._memory.put(key, pair, group=str(image_path))
+        return pair
 
     def get_thumbnail(
         self,
@@ -118,78 +350,225 @@ class ImageCache:
         processor: ImageProcessor,
     ) -> tuple[ctk.CTkImage, ctk.CTkImage]:
         """サムネイル画像を取得（キャッシュ有効時はキャッシュから）"""
-        if self.enable_cache:
-            return self._cached_loader(image_path, size, shadow_offset, processor)
-        else:
-            self._cached_loader.cache_clear()
-            return processor.create_thumbnail_with_shadow(
-                image_path, size, shadow_offset
-            )
+        final_img, hover_img = self.get_images(
+            image_path, size, shadow_offset, processor
+        )
+        return (
+            ctk.CTkImage(light_image=final_img, size=size),
+            ctk.CTkImage(light_image=hover_img, size=size),
+        )
+
+    def invalidate(self, image_path: Path) -> int:
+        """指定したサムネイルのエントリをすべてのサイズについて破棄"""
+        return self._memory.invalidate_group(str(image_path))
 
     def clear_cache(self):
         """キャッシュをクリア"""
-        self._cached_loader.cache_clear()
+        self._memory.clear()
+
+    def stats(self) -> CacheStats:
+        """ヒット・ミス・追い出しの件数と使用量"""
+        memory = self._memory
+        with self._lock:
+            hits, disk_hits, renders = self._hits, self._disk_hits, self._renders
+        return CacheStats(
+            hits=hits,
+            disk_hits=disk_hits,
+            misses=renders,
+            evictions=memory.evictions,
+            invalidations=memory.invalidations,
+            entries=len(memory),
+            bytes=memory.bytes,
+            max_bytes=memory.max_bytes,
+        )
 
 
 class ImageFileManager:
     """画像ファイルの管理を行うクラス"""
 
-    def __init__(self, image_dir: Path = IMAGE_DIR, thumb_dir: Path = THUMB_DIR):
+    def __init__(
+        self,
+        image_dir: Path = IMAGE_DIR,
+        thumb_dir: Path = THUMB_DIR,
+        thumbnail_format: str = THUMBNAIL_FORMAT,
+        thumbnail_quality: int = THUMBNAIL_QUALITY,
+        render_size: tuple[int, int] = THUMBNAIL_SIZE,
+        shadow_offset: int = SHADOW_OFFSET,
+    ):
+        if thumbnail_format not in THUMBNAIL_CODECS:
+            raise ValueError(f"未対応のサムネイル形式: {thumbnail_format}")
         self.image_dir = image_dir
         self.thumb_dir = thumb_dir
+        self.thumbnail_format = thumbnail_format
+        self.thumbnail_quality = thumbnail_quality
+        self.render_size = render_size
+        self.shadow_offset = shadow_offset
         self.supported_formats = SUPPORTED_FORMATS
 
     def _hash_path(self, path: Path) -> str:
         """パスのハッシュを生成"""
         return hashlib.md5(path.as_posix().encode("utf-8")).hexdigest()
 
-    def _is_valid_image(self, img_path: Path, registered: set[str]) -> bool:
-        """画像がサポート形式で、未登録かどうかを判定"""
-        return (
-            img_path.suffix.lower()
-            in self.supported_formats  # サポートされている形式か
-            and "_thumbnail" not in img_path.stem  # サムネイルでないか
-            and str(img_path) not in registered  # 登録されていないか
-        )
+    def iter_unregistered_images(self, registered: set[str]) -> Iterator[Path]:
+        """登録されていない画像のパスを見つかった順に返す"""
+        walker = ParallelWalker(self.image_dir, self.supported_formats)
+        for img_path in walker.iter_image_paths():
+            if img_path not in registered:
+                yield Path(img_path)
 
     def find_unregistered_images(self, registered: set[str]) -> list[Path]:
         """登録されていない画像のパスを探索"""
-        unregistered: list[Path] = []
-        for img_path in self.image_dir.rglob("*"):
-            if img_path.is_symlink():  # シンボリックリンク先のシンボリックは無視
-                for child_path in img_path.rglob("*"):
-                    if self._is_valid_image(child_path, registered):
-                        unregistered.append(child_path)
-            elif self._is_valid_image(img_path, registered):
-                unregistered.append(img_path)
-        return unregistered
+        return list(self.iter_unregistered_images(registered))
+
+    def scan_changes(self, manifest: ScanManifest, full: bool = False) -> ScanResult:
+        """マニフェストとの差分（追加・変更・削除）を検出"""
+        scanner = LibraryScanner(self.image_dir, self.supported_formats)
+        return scanner.scan(manifest, full=full)
+
+    def iter_changes(
+        self, manifest: ScanManifest, result: ScanResult, full: bool = False
+    ) -> Iterator[Path]:
+        """差分を result に蓄積しつつ、追加・変更された画像を逐次返す"""
+        scanner = LibraryScanner(self.image_dir, self.supported_formats)
+        return scanner.iter_changes(manifest, result, full=full)
 
     def _save_thumbnail(self, img: Image.Image, img_path: Path) -> Path:
         """PIL Imageをサムネイルパスに保存"""
         self.thumb_dir.mkdir(exist_ok=True)
-        thumb_hash = self._hash_path(img_path)
-        thumb_path = self.thumb_dir / f"{thumb_hash}_thumbnail.png"
-        img.save(thumb_path)
+        thumb_path = thumbnail_path_for(self.thumb_dir, img_path, self.thumbnail_format)
+        save_thumbnail(img, thumb_path, self.thumbnail_format, self.thumbnail_quality)
         return thumb_path
 
+    def iter_thumbnails(
+        self,
+        image_paths: Iterable[Path],
+        processor: ImageProcessor,
+        max_pending: int | None = None,
+        processes: int | None = None,
+    ) -> Iterator[tuple[Path, Path | None]]:
+        """画像を並列でサムネイル化し、(元画像, サムネイル) を投入順に返す
+
+        プールに投入済みで未回収の件数を max_pending までに抑えるので、
+        入力が巨大なジェネレータでも先読みしすぎない。
+        失敗した画像はサムネイルが None になる。
+        processes を省略するとCPUのコア数だけプロセスを起動する。
+        """
+        args = (
+            (
+                path,
+                processor.thumbnail_size,
+                self.thumb_dir,
+                processor.decode_mode,
+                self.thumbnail_format,
+                self.thumbnail_quality,
+                self.shadow_offset,
+            )
+            for path in image_paths
+        )
+        # プロセスプールは取り込むときだけ使うので、起動時には読み込まない
+        from multiprocessing import Pool
+
+        with Pool(processes=processes or os.cpu_count()) as pool:
+            for task, result in bounded_imap(
+                pool, _process_and_save, args, max_pending
+            ):
+                yield result if result is not None else (task[0], None)
+
     def generate_thumbnails(
-        self, image_paths: list[Path], processor: ImageProcessor
+        self, image_paths: Iterable[Path], processor: ImageProcessor
     ) -> list[tuple[Path, Path]]:
         """画像をサムネイルとして並列リサイズ＆保存"""
-        args = [
-            (path, processor.thumbnail_size, self.thumb_dir) for path in image_paths
+        return [
+            (path, thumb)
+            for path, thumb in self.iter_thumbnails(image_paths, processor)
+            if thumb is not None
         ]
-        with Pool(processes=cpu_count()) as pool:
-            results = list(pool.imap(_process_and_save, args))
-        return [r for r in results if r is not None]
+
+    def iter_reencoded_thumbnails(
+        self, rows: Iterable[tuple[int, Path, Path]], processes: int | None = None
+    ) -> Iterator[tuple[int, Path, Path | None]]:
+        """(id, 元画像, サムネイル) を現在の保存形式で並列に書き出す
+
+        (id, 古いパス, 新しいパス) を返し、失敗した場合は新しいパスが None になる。
+        古いファイルは削除しないので、DBを更新してから呼び出し側で消すこと。
+        """
+        args = (
+            (
+                image_id,
+                image_path,
+                thumb_path,
+                self.thumb_dir,
+                self.thumbnail_format,
+                self.thumbnail_quality,
+            )
+            for image_id, image_path, thumb_path in rows
+        )
+        from multiprocessing import Pool
+
+        with Pool(processes=processes or os.cpu_count()) as pool:
+            for task, result in bounded_imap(pool, _reencode_thumbnail, args):
+                yield result if result is not None else (task[0], task[2], None)
+
+    def invalidate_stale_renders(self) -> int:
+        """サムネイルサイズや影のずれ幅が変わっていたら古い影付き・ホバー画像を削除"""
+        key = render_key(self.render_size, self.shadow_offset)
+        stamp = self.thumb_dir / RENDER_KEY_FILE
+        try:
+            if stamp.read_text().strip() == key:
+                return 0
+        except FileNotFoundError:
+            pass
+
+        removed = 0
+        failed = 0
+        if self.thumb_dir.exists():
+            current = (f"_{key}_shadow{RENDER_EXT}", f"_{key}_hover{RENDER_EXT}")
+            with os.scandir(self.thumb_dir) as it:
+                for entry in it:
+                    name = entry.name
+                    if not name.endswith(
+                        (f"_shadow{RENDER_EXT}", f"_hover{RENDER_EXT}")
+                    ) or name.endswith(current):
+                        continue
+                    try:
+                        os.unlink(entry.path)
+                    except FileNotFoundError:
+                        continue  # 別の処理が先に消した
+                    except OSError as e:
+                        print(f"⚠ 古い影付き画像を削除できません: {entry.path} → {e}")
+                        failed += 1
+                        continue
+                    removed += 1
+        self.thumb_dir.mkdir(exist_ok=True)
+        # 消し残しがあれば次回の起動でもう一度掃除する
+        if not failed:
+            stamp.write_text(key)
+        return removed
+
+    def _rendered_files(self, thumbnail_path: Path) -> tuple[Path, Path]:
+        return rendered_paths(thumbnail_path, self.render_size, self.shadow_offset)
 
     def delete_image_files(self, image_path: Path, thumbnail_path: Path) -> None:
         """画像とサムネイルのファイルを削除"""
-        for path in [image_path, thumbnail_path]:
+        image_path, thumbnail_path = Path(image_path), Path(thumbnail_path)
+        for path in [image_path, thumbnail_path, *self._rendered_files(thumbnail_path)]:
             try:
                 if path.exists():
                     path.unlink()
-            except Exception as e:
+            except OSError as e:
+                print(f"[Error] ファイル削除失敗: {path} -> {e}")
+
+    def delete_thumbnail_file(
+        self, thumbnail_path: Path, with_renders: bool = True
+    ) -> None:
+        """サムネイルのファイルだけを削除"""
+        paths = [thumbnail_path]
+        if with_renders:
+            paths.extend(self._rendered_files(thumbnail_path))
+        for path in paths:
+            try:
+                path.unlink(missing_ok=True)
+            except OSError as e:
                 print(f"[Error] ファイル削除失敗: {path} -> {e}")
 
 
@@ -202,17 +581,36 @@ class ImageManager:
         thumb_dir: Path = THUMB_DIR,
         thumbnail_size: tuple[int, int] = THUMBNAIL_SIZE,
         enable_cache: bool = ENABLE_IMAGE_CACHE,
+        decode_mode: str = THUMBNAIL_DECODE_MODE,
+        shadow_offset: int = SHADOW_OFFSET,
     ):
-        self.processor = ImageProcessor(thumbnail_size)
+        self.processor = ImageProcessor(thumbnail_size, decode_mode)
         self.cache = ImageCache(enable_cache=enable_cache)
-        self.file_manager = ImageFileManager(image_dir, thumb_dir)
+        self.file_manager = ImageFileManager(
+            image_dir,
+            thumb_dir,
+            render_size=thumbnail_size,
+            shadow_offset=shadow_offset,
+        )
 
     def load_thumbnail_image(
-        self, image_path: Path, size: tuple[int, int], shadow_offset: int = 4
+        self,
+        image_path: Path,
+        size: tuple[int, int],
+        shadow_offset: int = SHADOW_OFFSET,
     ) -> tuple[ctk.CTkImage, ctk.CTkImage]:
         """サムネイル画像を読み込み"""
         return self.cache.get_thumbnail(image_path, size, shadow_offset, self.processor)
 
+    def load_thumbnail_images(
+        self,
+        image_path: Path,
+        size: tuple[int, int],
+        shadow_offset: int = SHADOW_OFFSET,
+    ) -> tuple[Image.Image, Image.Image]:
+        """サムネイル画像をPIL Imageで読み込み（ワーカースレッド用）"""
+        return self.cache.get_images(image_path, size, shadow_offset, self.processor)
+
     def load_full_image(
         self, parent: ctk.CTkBaseClass, image_path: Path
     ) -> ctk.CTkLabel:
@@ -223,7 +621,27 @@ class ImageManager:
         """未登録画像を検索"""
         return self.file_manager.find_unregistered_images(registered)
 
-    def generate_thumbnails(self, image_paths: list[Path]) -> list[tuple[Path, Path]]:
+    def scan_library(self, manifest: ScanManifest, full: bool = False) -> ScanResult:
+        """ライブラリの差分スキャン"""
+        return self.file_manager.scan_changes(manifest, full=full)
+
+    def iter_library_changes(
+        self, manifest: ScanManifest, result: ScanResult, full: bool = False
+    ) -> Iterator[Path]:
+        """追加・変更された画像を走査しながら逐次返す"""
+        return self.file_manager.iter_changes(manifest, result, full=full)
+
+    def iter_thumbnails(
+        self, image_paths: Iterable[Path], processes: int | None = None
+    ) -> Iterator[tuple[Path, Path | None]]:
+        """サムネイルを逐次生成"""
+        return self.file_manager.iter_thumbnails(
+            image_paths, self.processor, processes=processes
+        )
+
+    def generate_thumbnails(
+        self, image_paths: Iterable[Path]
+    ) -> list[tuple[Path, Path]]:
         """サムネイル生成"""
         return self.file_manager.generate_thumbnails(image_paths, self.processor)
 
@@ -235,9 +653,35 @@ class ImageManager:
         """画像ファイル削除"""
         self.file_manager.delete_image_files(image_path, thumbnail_path)
 
+    def delete_thumbnail_file(self, thumbnail_path: Path) -> None:
+        """サムネイルファイル削除"""
+        self.file_manager.delete_thumbnail_file(thumbnail_path)
+
+    def invalidate_stale_renders(self) -> int:
+        """古い条件で焼き込んだ影付き・ホバー画像を削除"""
+        return self.file_manager.invalidate_stale_renders()
+
+    def invalidate_thumbnail(self, thumbnail_path: Path) -> int:
+        """削除した画像のキャッシュを破棄"""
+        return self.cache.invalidate(thumbnail_path)
+
+    def cache_stats(self) -> CacheStats:
+        """キャッシュの統計情報"""
+        return self.cache.stats()
+
     def clear_cache(self):
         """キャッシュクリア"""
         self.cache.clear_cache()
 
 
-image_manager = ImageManager()
+@functools.cache
+def get_image_manager() -> ImageManager:
+    """共有の ImageManager（最初に使うときに作る）"""
+    return ImageManager()
+
+
+def __getattr__(name: str):
+    # モジュールを読み込んだだけでは作らず、image_manager を参照した時点で作る
+    if name == "image_manager":
+        return get_image_manager()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,251 @@
+import os
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from config import (
+    IMAGE_DIR,
+    LIBRARY_WATCH_DEBOUNCE_SEC,
+    LIBRARY_WATCH_MAX_DELAY_SEC,
+    SUPPORTED_FORMATS,
+)
+from utils.scanner import is_image_name
+
+try:
+    from watchdog.events import FileSystemEvent, FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # 監視は任意の機能なので、watchdog がなくても起動できるようにする
+    Observer = None
+    FileSystemEvent = FileSystemEventHandler = object
+
+
+def is_available() -> bool:
+    return Observer is not None
+
+
+@dataclass
+class LibraryChanges:
+    """まとめて取り込む変更（パスはDBと同じくライブラリ経由の表記）"""
+
+    added: set[str] = field(default_factory=set)
+    removed: set[str] = field(default_factory=set)
+    # 配下を走査し直して登録と突き合わせるディレクトリ
+    rescan_dirs: set[str] = field(default_factory=set)
+    # 配下の登録をすべて消すディレクトリ
+    removed_dirs: set[str] = field(default_factory=set)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.rescan_dirs or self.removed_dirs)
+
+
+def _is_under(path: str, directory: str) -> bool:
+    return path.startswith(directory.rstrip(os.sep) + os.sep)
+
+
+class ChangeCoalescer:
+    """ファイルシステムの通知をパスごとに畳み込み、落ち着いたらまとめて渡す
+
+    同じパスへの通知は最後の1件だけが残るので、書き込み途中の作成・更新や
+    一時ファイルの作成→削除は取り込まれない。通知が debounce 秒途切れるか、
+    最初の通知から max_delay 秒経ったところで pop_ready() が変更を返す。
+    """
+
+    def __init__(
+        self,
+        debounce: float = LIBRARY_WATCH_DEBOUNCE_SEC,
+        max_delay: float = LIBRARY_WATCH_MAX_DELAY_SEC,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._files: dict[str, bool] = {}  # パス → 存在するか
+        self._dirs: dict[str, bool] = {}
+        self._first: float | None = None
+        self._last = 0.0
+
+    def _touch(self) -> None:
+        self._last = self._clock()
+        if self._first is None:
+            self._first = self._last
+
+    def file_added(self, path: str) -> None:
+        with self._lock:
+            self._files[path] = True
+            self._touch()
+
+    def file_removed(self, path: str) -> None:
+        with self._lock:
+            self._files[path] = False
+            self._touch()
+
+    def file_modified(self, path: str) -> None:
+        """書き込み中のファイルの取り込みを、書き終わるまで待たせる"""
+        with self._lock:
+            if self._files.get(path):
+                self._touch()
+
+    def dir_added(self, path: str) -> None:
+        with self._lock:
+            self._dirs[path] = True
+            self._touch()
+
+    def dir_removed(self, path: str) -> None:
+        with self._lock:
+            # 配下への通知はディレクトリごとの削除に含まれる
+            for pending in (self._files, self._dirs):
+                for child in [p for p in pending if _is_under(p, path)]:
+                    del pending[child]
+            self._dirs[path] = False
+            self._touch()
+
+    def pop_ready(self) -> LibraryChanges | None:
+        """取り込んでよい変更があれば返して空にする"""
+        with self._lock:
+            if self._first is None:
+                return None
+            now = self._clock()
+            if now - self._last < self.debounce and now - self._first < self.max_delay:
+                return None
+            changes = LibraryChanges(
+                added={p for p, exists in self._files.items() if exists},
+                removed={p for p, exists in self._files.items() if not exists},
+                rescan_dirs={p for p, exists in self._dirs.items() if exists},
+                removed_dirs={p for p, exists in self._dirs.items() if not exists},
+            )
+            self._files.clear()
+            self._dirs.clear()
+            self._first = None
+            return changes
+
+
+class _RootHandler(FileSystemEventHandler):
+    """1つの監視ルートの通知を、ライブラリ経由のパスに直して振り分ける"""
+
+    def __init__(self, watcher: "LibraryWatcher", real_root: str, library_root: str):
+        self.watcher = watcher
+        self.real_root = real_root
+        self.library_root = library_root
+
+    def _library_path(self, path: str | bytes) -> str:
+        path = os.fsdecode(path)
+        return self.library_root + path[len(self.real_root) :]
+
+    def on_created(self, event: FileSystemEvent) -> None:
+        self.watcher._on_created(self._library_path(event.src_path), event.is_directory)
+
+    def on_deleted(self, event: FileSystemEvent) -> None:
+        self.watcher._on_deleted(self._library_path(event.src_path), event.is_directory)
+
+    def on_moved(self, event: FileSystemEvent) -> None:
+        self.on_deleted(event)
+        self.watcher._on_created(
+            self._library_path(event.dest_path), event.is_directory
+        )
+
+    def on_modified(self, event: FileSystemEvent) -> None:
+        if not event.is_directory:
+            self.watcher.coalescer.file_modified(self._library_path(event.src_path))
+
+
+class LibraryWatcher:
+    """IMAGE_DIR とリンク先の実体を監視し、まとまった変更を on_changes に渡す
+
+    inotify などはシンボリックリンクを辿らないため、リンク先は実体のパスで
+    別に監視し、通知されたパスをリンク経由の表記（DBに登録した表記）に戻す。
+    on_changes は監視用のスレッドから呼ばれる。
+    """
+
+    def __init__(
+        self,
+        on_changes: Callable[[LibraryChanges], None],
+        image_dir: Path = IMAGE_DIR,
+        supported_formats: tuple[str, ...] = SUPPORTED_FORMATS,
+        coalescer: ChangeCoalescer | None = None,
+    ):
+        if not is_available():
+            raise RuntimeError("ライブラリの監視には watchdog が必要です")
+        self.on_changes = on_changes
+        self.image_dir = image_dir
+        self.supported_formats = supported_formats
+        self.coalescer = coalescer or ChangeCoalescer()
+        self._observer = Observer()
+        self._lock = threading.Lock()
+        # ライブラリ経由のパス → (実体のパス, watchdog の監視)
+        self._roots: dict[str, tuple[str, object]] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="library-watch", daemon=True
+        )
+
+    def start(self) -> None:
+        self._watch(os.fspath(self.image_dir))
+        for link in self._find_links(os.fspath(self.image_dir)):
+            self._watch(link)
+        self._observer.start()
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._observer.stop()
+        self._observer.join()
+        self._thread.join()
+
+    @staticmethod
+    def _find_links(directory: str) -> list[str]:
+        """リンクを辿らずに、配下にあるディレクトリへのシンボリックリンクを探す"""
+        links = []
+        for parent, dirnames, _ in os.walk(directory):
+            for name in dirnames:
+                path = os.path.join(parent, name)
+                if os.path.islink(path):
+                    links.append(path)
+        return links
+
+    def _watch(self, library_path: str) -> None:
+        real = os.path.realpath(library_path)
+        with self._lock:
+            if library_path in self._roots:
+                return
+            handler = _RootHandler(self, real, library_path)
+            watch = self._observer.schedule(handler, real, recursive=True)
+            self._roots[library_path] = (real, watch)
+
+    def _unwatch(self, library_path: str) -> None:
+        with self._lock:
+            root = self._roots.pop(library_path, None)
+        if root is not None:
+            self._observer.unschedule(root[1])
+
+    def _on_created(self, path: str, is_directory: bool) -> None:
+        if os.path.islink(path) and os.path.isdir(path):
+            # リンクの作成は is_directory が立たない。リンク先を監視に加える
+            self._watch(path)
+            self.coalescer.dir_added(path)
+        elif is_directory:
+            self.coalescer.dir_added(path)
+        elif is_image_name(os.path.basename(path), self.supported_formats):
+            self.coalescer.file_added(path)
+
+    def _on_deleted(self, path: str, is_directory: bool) -> None:
+        if path in self._roots:
+            self._unwatch(path)
+            self.coalescer.dir_removed(path)
+        elif is_directory:
+            self.coalescer.dir_removed(path)
+        elif is_image_name(os.path.basename(path), self.supported_formats):
+            self.coalescer.file_removed(path)
+
+    def _run(self) -> None:
+        interval = min(self.coalescer.debounce / 2, 0.5)
+        while not self._stop.wait(interval):
+            changes = self.coalescer.pop_ready()
+            if not changes:
+                continue
+            try:
+                self.on_changes(changes)
+            except Exception as e:  # noqa: BLE001 監視は次の変更に備えて続ける
+                print(f"⚠ ライブラリの変更を取り込めませんでした: {e}")
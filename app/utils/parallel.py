@@ -0,0 +1,50 @@
+import os
+from collections import deque
+from collections.abc import Callable, Generator, Iterable, Iterator
+from itertools import islice
+from typing import TYPE_CHECKING, Any, TypeVar
+
+if TYPE_CHECKING:  # multiprocessing はプールを作る側で読み込む
+    from multiprocessing.pool import AsyncResult, Pool
+
+T = TypeVar("T")
+
+
+def chunked(items: Iterable[T], size: int) -> Generator[list[T], None, None]:
+    """イテラブルをsize件ずつのリストに分割"""
+    it = iter(items)
+    while chunk := list(islice(it, size)):
+        yield chunk
+
+
+def bounded_imap(
+    pool: "Pool",
+    func: Callable,
+    tasks: Iterable,
+    max_pending: int | None = None,
+    on_error: Callable[[Any, Exception], None] | None = None,
+) -> Iterator[tuple[Any, Any]]:
+    """未回収のタスクを max_pending 件までに抑えて並列実行し、(入力, 結果)を投入順に返す
+
+    Pool.imap は入力を別スレッドで読み切ってしまうため、
+    巨大なジェネレータを渡しても先読みしすぎないように自前で窓を管理する。
+    例外になったタスクの結果は None になる（on_error があれば入力と例外を渡す）。
+    """
+    max_pending = max_pending or (os.cpu_count() or 1) * 4
+    window: deque[tuple[Any, AsyncResult]] = deque()
+
+    def collect() -> tuple[Any, Any]:
+        task, async_result = window.popleft()
+        try:
+            return task, async_result.get()
+        except Exception as e:  # noqa: BLE001 タスクの例外はすべて on_error に渡す
+            if on_error is not None:
+                on_error(task, e)
+            return task, None
+
+    for task in tasks:
+        window.append((task, pool.apply_async(func, (task,))))
+        if len(window) >= max_pending:
+            yield collect()
+    while window:
+        yield collect()
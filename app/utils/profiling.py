@@ -1,5 +1,18 @@
+import json
+import os
+import threading
 import time
+from bisect import bisect_left
 from functools import wraps
+from pathlib import Path
+
+from config import METRICS_DUMP_INTERVAL_SEC, METRICS_DUMP_PATH, METRICS_ENABLED
+
+# Prometheus に書き出すときのメトリクス名の接頭辞
+METRICS_PREFIX = "tag_palette_"
+# 処理時間のヒストグラムの区切り（秒）。10µs から2倍ずつ約84秒まで
+LATENCY_BUCKETS = tuple(1e-5 * 2**i for i in range(24))
+QUANTILES = (0.5, 0.95, 0.99)
 
 
 def profile_time(label="処理"):
@@ -15,3 +28,307 @@ def profile_time(label="処理"):
         return wrapper
 
     return decorator
+
+
+# ---------------------------- Metrics ----------------------------
+
+
+class _NullTimer:
+    """集計が無効なときに返す、何もしないタイマー"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_start")
+
+    def __init__(self, histogram: "Histogram"):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        self._histogram.observe(time.perf_counter() - self._start)
+        return False
+
+
+class Counter:
+    """単調に増える件数"""
+
+    __slots__ = ("_lock", "_registry", "help", "name", "value")
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help: str = ""):
+        self.name = name
+        self.help = help
+        self.value = 0
+        self._registry = registry
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1) -> None:
+        if not self._registry.enabled:
+            return
+        with self._lock:
+            self.value += amount
+
+
+class Histogram:
+    """処理時間の分布。固定の区切りごとの件数だけを持ち、分位点は区切りの間で補間する"""
+
+    __slots__ = (
+        "_lock",
+        "_registry",
+        "buckets",
+        "count",
+        "counts",
+        "help",
+        "max",
+        "min",
+        "name",
+        "sum",
+    )
+
+    def __init__(
+        self,
+        registry: "MetricsRegistry",
+        name: str,
+        help: str = "",
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._registry = registry
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.counts = [0] * (len(self.buckets) + 1)  # 最後は上限を超えた分
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        if not self._registry.enabled:
+            return
+        i = bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += seconds
+            self.min = min(self.min, seconds)
+            self.max = max(self.max, seconds)
+
+    def time(self) -> _Timer | _NullTimer:
+        """with ブロックの処理時間を記録する"""
+        if not self._registry.enabled:
+            return _NULL_TIMER
+        return _Timer(self)
+
+    def quantile(self, q: float) -> float | None:
+        with self._lock:
+            counts, count = list(self.counts), self.count
+            lowest, highest = self.min, self.max
+        if not count:
+            return None
+        rank = q * count
+        cumulative = 0
+        for i, n in enumerate(counts):
+            if n and cumulative + n >= rank:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else highest
+                value = lower + (upper - lower) * (rank - cumulative) / n
+                return min(max(value, lowest), highest)
+            cumulative += n
+        return highest
+
+
+class MetricsRegistry:
+    """名前ごとのカウンターとヒストグラム
+
+    無効なあいだは記録の呼び出しが enabled を見て戻るだけなので、
+    ホットパスに入れたままでよい。メトリクスはモジュールの読み込み時に作っておき、
+    呼び出しのたびに名前で引かないこと。
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._metrics: dict[str, Counter | Histogram] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name: str, help: str):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(self, name, help)
+            elif not isinstance(metric, cls):
+                raise ValueError(
+                    f"{name} は {type(metric).__name__} として登録済みです"
+                )
+            return metric
+
+    def counter(self, name: str, help: str = "") -> Counter:
+        return self._get(Counter, name, help)
+
+    def histogram(self, name: str, help: str = "") -> Histogram:
+        return self._get(Histogram, name, help)
+
+    def _items(self) -> list[tuple[str, Counter | Histogram]]:
+        """登録中のメトリクスを名前順に（登録と競合しないようロックの中で写す）"""
+        with self._lock:
+            return sorted(self._metrics.items())
+
+    def reset(self) -> None:
+        for _, metric in self._items():
+            with metric._lock:
+                if isinstance(metric, Counter):
+                    metric.value = 0
+                else:
+                    metric.reset()
+
+    def snapshot(self) -> dict:
+        """JSON に書き出せる形の集計結果（時間はミリ秒）"""
+        counters = {}
+        histograms = {}
+        for name, metric in self._items():
+            if isinstance(metric, Counter):
+                counters[name] = metric.value
+                continue
+            if not metric.count:
+                continue
+            summary = {
+                "count": metric.count,
+                "mean_ms": metric.sum * 1000 / metric.count,
+                "max_ms": metric.max * 1000,
+            }
+            for q in QUANTILES:
+                summary[f"p{round(q * 100)}_ms"] = metric.quantile(q) * 1000
+            histograms[name] = summary
+        return {
+            "timestamp": time.time(),
+            "counters": counters,
+            "histograms": histograms,
+        }
+
+    def to_prometheus(self) -> str:
+        """Prometheus のテキスト形式（ヒストグラムは分位点付きの summary として出す）"""
+        lines = []
+        for name, metric in self._items():
+            full_name = METRICS_PREFIX + name
+            if metric.help:
+                lines.append(f"# HELP {full_name} {metric.help}")
+            if isinstance(metric, Counter):
+                lines.append(f"# TYPE {full_name} counter")
+                lines.append(f"{full_name} {metric.value}")
+                continue
+            lines.append(f"# TYPE {full_name} summary")
+            if metric.count:
+                for q in QUANTILES:
+                    lines.append(f'{full_name}{{quantile="{q}"}} {metric.quantile(q)}')
+            lines.append(f"{full_name}_sum {metric.sum}")
+            lines.append(f"{full_name}_count {metric.count}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: Path) -> None:
+        """拡張子が .json なら JSON、それ以外は Prometheus の形式で書き出す
+
+        読み取り側が書きかけのファイルを読まないよう、一時ファイルから置き換える。
+        """
+        path = Path(path)
+        if path.suffix.lower() == ".json":
+            text = json.dumps(self.snapshot(), indent=2, ensure_ascii=False)
+        else:
+            text = self.to_prometheus()
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(text, encoding="utf-8")
+        os.replace(tmp, path)
+
+
+registry = MetricsRegistry(enabled=METRICS_ENABLED)
+
+
+def counter(name: str, help: str = "") -> Counter:
+    return registry.counter(name, help)
+
+
+def histogram(name: str, help: str = "") -> Histogram:
+    return registry.histogram(name, help)
+
+
+def timed(name: str | None = None, help: str = ""):
+    """関数の処理時間を記録するデコレーター（名前の既定は "<関数名>_seconds"）"""
+
+    def decorator(func):
+        metric = registry.histogram(name or f"{func.__name__}_seconds", help)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not registry.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metric.observe(time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+class MetricsDumper:
+    """集計結果を一定間隔でファイルに書き出すスレッド（stop() でも最後に書き出す）"""
+
+    def __init__(
+        self,
+        path: Path = METRICS_DUMP_PATH,
+        interval: float = METRICS_DUMP_INTERVAL_SEC,
+        metrics: MetricsRegistry = registry,
+    ):
+        self.path = Path(path)
+        self.interval = interval
+        self.metrics = metrics
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="metrics-dump", daemon=True
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self._dump()
+
+    def _dump(self) -> None:
+        try:
+            self.metrics.dump(self.path)
+        except OSError as e:
+            print(f"⚠ メトリクスを書き出せませんでした: {self.path} → {e}")
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._dump()
+
+
+def start_dumper() -> MetricsDumper | None:
+    """集計が有効なら、定期的な書き出しを始める"""
+    if not registry.enabled:
+        return None
+    dumper = MetricsDumper()
+    dumper.start()
+    print(f"📈 メトリクスを {dumper.path} に {dumper.interval:g} 秒ごとに書き出します")
+    return dumper
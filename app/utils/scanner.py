@@ -0,0 +1,345 @@
+import os
+from collections import defaultdict, deque
+from collections.abc import Callable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from config import IMAGE_DIR, SCAN_MAX_WORKERS, SUPPORTED_FORMATS
+
+# 読めないエントリがあったディレクトリに記録する mtime。次回のスキャンで必ず列挙し直す
+RETRY_MTIME_NS = -1
+
+
+@dataclass(frozen=True)
+class FileState:
+    """マニフェストに記録するファイルの状態"""
+
+    directory: str
+    size: int
+    mtime_ns: int
+    inode: int
+
+    def same_content(self, other: "FileState") -> bool:
+        """サイズ・更新日時・inodeが一致するか"""
+        return (
+            self.size == other.size
+            and self.mtime_ns == other.mtime_ns
+            and self.inode == other.inode
+        )
+
+
+@dataclass(frozen=True)
+class DirState:
+    """マニフェストに記録するディレクトリの状態"""
+
+    parent: str | None
+    mtime_ns: int
+    in_link: bool = False  # シンボリックリンク先の配下か
+
+
+@dataclass
+class ScanManifest:
+    """前回スキャン時点のディレクトリ・ファイルの状態"""
+
+    dirs: dict[str, DirState] = field(default_factory=dict)
+    files: dict[str, FileState] = field(default_factory=dict)
+
+    def apply(self, result: "ScanResult") -> None:
+        """スキャン結果をマニフェストに反映"""
+        for path in result.removed_dirs:
+            self.dirs.pop(path, None)
+        for path in result.removed:
+            self.files.pop(str(path), None)
+        self.dirs.update(result.dir_states)
+        self.files.update(result.file_states)
+
+
+@dataclass
+class ScanResult:
+    """スキャンで検出した差分"""
+
+    added: set[Path] = field(default_factory=set)
+    modified: set[Path] = field(default_factory=set)
+    removed: set[Path] = field(default_factory=set)
+    file_states: dict[str, FileState] = field(default_factory=dict)  # 追加・変更分
+    dir_states: dict[str, DirState] = field(default_factory=dict)  # 再走査した分
+    removed_dirs: set[str] = field(default_factory=set)
+    skipped_dirs: int = 0
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.added or self.modified or self.removed)
+
+
+@dataclass
+class DirListing:
+    """1ディレクトリ分の走査結果"""
+
+    path: str
+    parent: str | None
+    in_link: bool
+    subdirs: list[tuple[str, bool]] = field(default_factory=list)  # (path, in_link)
+    files: list[str] = field(default_factory=list)
+    states: dict[str, FileState] = field(default_factory=dict)
+    mtime_ns: int | None = None
+    skipped: bool = False  # mtime不変のため列挙を省略した
+    # 読めなかったエントリ。あれば列挙が不完全なので、消えたものを削除扱いにしない
+    failed: list[str] = field(default_factory=list)
+
+
+Lister = Callable[[str, str | None, bool], DirListing | None]
+
+
+def is_image_name(name: str, supported_formats: tuple[str, ...]) -> bool:
+    """ファイル名がサポート形式の画像で、サムネイルでないか"""
+    stem, ext = os.path.splitext(name)
+    return ext.lower() in supported_formats and "_thumbnail" not in stem
+
+
+def _normalize_inode(inode: int) -> int:
+    """SQLiteのINTEGER(符号付き64bit)に収まるように変換"""
+    return inode - (1 << 64) if inode >= (1 << 63) else inode
+
+
+def stat_file_state(path: str, directory: str | None = None) -> FileState:
+    """ファイルを stat してマニフェスト用の状態を作る"""
+    st = os.stat(path)
+    return FileState(
+        directory=directory if directory is not None else os.path.dirname(path),
+        size=st.st_size,
+        mtime_ns=st.st_mtime_ns,
+        inode=_normalize_inode(st.st_ino),
+    )
+
+
+class ParallelWalker:
+    """os.scandir ベースの並列ディレクトリウォーカー
+
+    シンボリックリンクで繋がれたルートごとに作業キューを持ち、
+    有限個のスレッドへラウンドロビンでディレクトリを割り当てる。
+    遅いネットワークドライブが他のルートの走査を塞がないようにするため。
+    結果は届いた順にジェネレータで返すので、走査完了を待たずに後段を開始できる。
+    """
+
+    def __init__(
+        self,
+        image_dir: Path = IMAGE_DIR,
+        supported_formats: tuple[str, ...] = SUPPORTED_FORMATS,
+        max_workers: int = SCAN_MAX_WORKERS,
+    ):
+        self.image_dir = image_dir
+        self.supported_formats = supported_formats
+        self.max_workers = max(1, max_workers)
+
+    def iter_listings(self, lister: Lister | None = None) -> Iterator[DirListing]:
+        """ディレクトリごとの走査結果を完了順に返す"""
+        lister = lister or self._list_images
+        root = os.fspath(self.image_dir)
+        queues: dict[str, deque[tuple[str, str | None, bool]]] = {
+            root: deque([(root, None, False)])
+        }
+        seen = {root}
+        pending: dict[Future, str] = {}
+        next_queue = 0
+
+        with ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="scan"
+        ) as pool:
+            try:
+                while pending or any(queues.values()):
+                    # 空きスロットをキュー間のラウンドロビンで埋める
+                    keys = [k for k, q in queues.items() if q]
+                    while keys and len(pending) < self.max_workers:
+                        key = keys[next_queue % len(keys)]
+                        next_queue += 1
+                        pending[pool.submit(lister, *queues[key].popleft())] = key
+                        keys = [k for k, q in queues.items() if q]
+
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        key = pending.pop(future)
+                        listing = future.result()
+                        if listing is None:
+                            continue
+                        for sub, sub_in_link in listing.subdirs:
+                            if sub in seen:
+                                continue
+                            seen.add(sub)
+                            # リンク先に入った時点で専用のキューを割り当てる
+                            sub_key = (
+                                sub if sub_in_link and not listing.in_link else key
+                            )
+                            queues.setdefault(sub_key, deque()).append(
+                                (sub, listing.path, sub_in_link)
+                            )
+                        yield listing
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def iter_image_paths(self) -> Iterator[str]:
+        """サポート形式の画像パスを見つかった順に返す"""
+        for listing in self.iter_listings():
+            yield from listing.files
+
+    def _list_images(
+        self, dir_path: str, parent: str | None, in_link: bool
+    ) -> DirListing | None:
+        listing = DirListing(dir_path, parent, in_link)
+        try:
+            with os.scandir(dir_path) as it:
+                for entry in it:
+                    try:
+                        self._classify(entry, listing)
+                    except OSError as e:
+                        print(f"⚠ スキャン失敗: {entry.path} → {e}")
+                        listing.failed.append(entry.path)
+        except OSError as e:
+            print(f"⚠ ディレクトリを開けません: {dir_path} → {e}")
+            return None
+        return listing
+
+    def _classify(self, entry: os.DirEntry, listing: DirListing) -> None:
+        """エントリをサブディレクトリと画像ファイルに振り分け"""
+        if entry.is_dir(follow_symlinks=False):
+            listing.subdirs.append((entry.path, listing.in_link))
+        elif entry.is_symlink() and entry.is_dir():
+            # シンボリックリンク先のシンボリックは無視
+            if not listing.in_link:
+                listing.subdirs.append((entry.path, True))
+        # Path を作る前に拡張子で絞り込む
+        elif is_image_name(entry.name, self.supported_formats) and entry.is_file():
+            listing.files.append(entry.path)
+
+
+class LibraryScanner:
+    """マニフェストとの差分だけを検出するインクリメンタルスキャナ
+
+    ディレクトリのmtimeが前回と同じ場合、そのディレクトリの列挙と
+    配下ファイルのstatを省略し、マニフェストに記録済みのサブディレクトリだけを辿る。
+    ファイル内容の上書きはディレクトリのmtimeに現れないため、
+    確実に検出したい場合は full=True で全件を再走査する。
+    """
+
+    def __init__(
+        self,
+        image_dir: Path = IMAGE_DIR,
+        supported_formats: tuple[str, ...] = SUPPORTED_FORMATS,
+        max_workers: int = SCAN_MAX_WORKERS,
+    ):
+        self.walker = ParallelWalker(image_dir, supported_formats, max_workers)
+
+    def scan(self, manifest: ScanManifest, full: bool = False) -> ScanResult:
+        """前回のマニフェストと比較して追加・変更・削除されたファイルを返す"""
+        result = ScanResult()
+        for _ in self.iter_changes(manifest, result, full=full):
+            pass
+        return result
+
+    def iter_changes(
+        self, manifest: ScanManifest, result: ScanResult, full: bool = False
+    ) -> Iterator[Path]:
+        """追加・変更された画像を見つかった順に返し、差分を result に蓄積する
+
+        削除の検出は走査が終わるまで確定しないため、
+        ジェネレータを最後まで消費してから result.removed を参照すること。
+        """
+        subdirs_of: dict[str, list[str]] = defaultdict(list)
+        for path, state in manifest.dirs.items():
+            if state.parent is not None:
+                subdirs_of[state.parent].append(path)
+        files_of: dict[str, list[str]] = defaultdict(list)
+        for path, state in manifest.files.items():
+            files_of[state.directory].append(path)
+
+        def lister(dir_path: str, parent: str | None, in_link: bool):
+            try:
+                dir_mtime = os.stat(dir_path).st_mtime_ns
+            except OSError as e:
+                # オフラインのNASなど。配下は削除扱いにせず、マニフェストを残す
+                print(f"⚠ ディレクトリを開けません: {dir_path} → {e}")
+                return None
+            previous = manifest.dirs.get(dir_path)
+            if (
+                not full
+                and previous is not None
+                and previous.mtime_ns == dir_mtime
+                and previous.in_link == in_link
+            ):
+                # 変更なし: 列挙せず既知のサブディレクトリだけを辿る
+                return DirListing(
+                    dir_path,
+                    parent,
+                    in_link,
+                    subdirs=[
+                        (s, manifest.dirs[s].in_link) for s in subdirs_of[dir_path]
+                    ],
+                    mtime_ns=dir_mtime,
+                    skipped=True,
+                )
+            listing = self.walker._list_images(dir_path, parent, in_link)
+            if listing is None:
+                return None
+            listing.mtime_ns = dir_mtime
+            for path in listing.files:
+                try:
+                    listing.states[path] = stat_file_state(path, dir_path)
+                except OSError as e:  # 列挙の後に消えた・名前が変わったなど
+                    print(f"⚠ スキャン失敗: {path} → {e}")
+                    listing.failed.append(path)
+            return listing
+
+        visited: set[str] = set()
+        # 最後まで読めたディレクトリ → その中にあったサブディレクトリ
+        listed_subdirs: dict[str, set[str]] = {}
+        for listing in self.walker.iter_listings(lister):
+            visited.add(listing.path)
+            if listing.skipped:
+                result.skipped_dirs += 1
+                continue
+            mtime_ns = RETRY_MTIME_NS if listing.failed else listing.mtime_ns
+            result.dir_states[listing.path] = DirState(
+                listing.parent, mtime_ns, listing.in_link
+            )
+            for path, state in listing.states.items():
+                change = self._compare(path, state, manifest, result)
+                if change is not None:
+                    yield change
+            if listing.failed:
+                continue
+            listed_subdirs[listing.path] = {sub for sub, _ in listing.subdirs}
+            for path in files_of[listing.path]:
+                if path not in listing.states:
+                    result.removed.add(Path(path))
+
+        # 親を読めたのにその中から消えていたディレクトリだけを、配下ごと削除扱いにする。
+        # 開けなかったディレクトリ（オフラインのリンク先など）の配下は分からないので残す
+        gone = deque(
+            path
+            for path in manifest.dirs.keys() - visited
+            if manifest.dirs[path].parent in listed_subdirs
+            and path not in listed_subdirs[manifest.dirs[path].parent]
+        )
+        while gone:
+            path = gone.popleft()
+            if path in result.removed_dirs or path in visited:
+                continue
+            result.removed_dirs.add(path)
+            result.removed.update(Path(p) for p in files_of[path])
+            gone.extend(subdirs_of[path])
+
+    def _compare(
+        self, path: str, state: FileState, manifest: ScanManifest, result: ScanResult
+    ) -> Path | None:
+        previous = manifest.files.get(path)
+        if previous is None:
+            changes = result.added
+        elif not previous.same_content(state) or previous.directory != state.directory:
+            changes = result.modified
+        else:
+            return None
+        changed = Path(path)
+        changes.add(changed)
+        result.file_states[path] = state
+        return changed
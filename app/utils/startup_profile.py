@@ -0,0 +1,108 @@
+import os
+import re
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+
+# 計測対象のプロセスに起動時刻を渡す環境変数（設定されていれば計測モード）
+PROFILE_ENV = "TAG_PALETTE_STARTUP_PROFILE"
+# 計測対象が stderr に書く区切り。-X importtime の出力と同じ流れに混ぜて順序を保つ
+MARK_PREFIX = "startup-profile:"
+IMPORTTIME_PATTERN = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+@dataclass(slots=True)
+class ImportTiming:
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int  # 0 なら、すでに読み込み済みのモジュールから直接インポートされた
+
+
+@dataclass
+class StartupProfile:
+    marks: dict[str, float]  # 区切りの名前 → 起動からの秒数
+    imports: dict[str, list[ImportTiming]]  # 区切りの名前 → その区切りまでのインポート
+
+    def report(self, top: int = 15) -> str:
+        lines = ["⏱ 起動プロファイル"]
+        for name, seconds in self.marks.items():
+            imported = sum(t.cumulative_us for t in self.imports[name] if not t.depth)
+            lines.append(
+                f"   {name:<14} {seconds * 1000:8.1f} ms"
+                f"（うちインポート {imported / 1000:.1f} ms）"
+            )
+        if not self.marks:
+            return "\n".join(lines)
+        first = next(iter(self.marks))
+        lines.append(f"   {first} までの重いインポート（累積 / 自身）:")
+        for t in sorted(self.imports[first], key=lambda t: -t.cumulative_us)[:top]:
+            lines.append(
+                f"   {t.cumulative_us / 1000:8.1f} ms / {t.self_us / 1000:6.1f} ms  "
+                f"{'  ' * t.depth}{t.module}"
+            )
+        return "\n".join(lines)
+
+
+def is_enabled() -> bool:
+    return PROFILE_ENV in os.environ
+
+
+def mark(name: str) -> None:
+    """計測モードなら、起動からの経過時間を区切りとして書き出す"""
+    started = os.environ.get(PROFILE_ENV)
+    if started:
+        elapsed = time.time() - float(started)
+        print(f"{MARK_PREFIX} {name} {elapsed:.6f}", file=sys.stderr, flush=True)
+
+
+def parse(lines) -> StartupProfile:
+    """-X importtime の出力と区切りを、区切りごとのインポートにまとめる"""
+    marks: dict[str, float] = {}
+    imports: dict[str, list[ImportTiming]] = {}
+    pending: list[ImportTiming] = []
+    for line in lines:
+        line = line.rstrip("\n")
+        if line.startswith(MARK_PREFIX):
+            name, seconds = line[len(MARK_PREFIX) :].split()
+            marks[name] = float(seconds)
+            imports[name], pending = pending, []
+            continue
+        match = IMPORTTIME_PATTERN.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            depth = (len(indent) - 1) // 2
+            pending.append(
+                ImportTiming(module, int(self_us), int(cumulative_us), depth)
+            )
+    return StartupProfile(marks, imports)
+
+
+def run(script: str, args: list[str] | None = None) -> StartupProfile:
+    """script を -X importtime 付きの別プロセスで起動し、終了まで待って集計する
+
+    計測対象は mark() で区切りを書き、計測が済んだら自分で終了すること。
+    """
+    env = dict(os.environ, **{PROFILE_ENV: f"{time.time():.6f}"})
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", script, *(args or [])],
+        check=False,
+        env=env,
+        stderr=subprocess.PIPE,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+    )
+    profile = parse(process.stderr.splitlines())
+    if process.returncode or not profile.marks:
+        # 計測以外の出力（エラーなど）はそのまま見せる
+        print(
+            "\n".join(
+                line
+                for line in process.stderr.splitlines()
+                if not IMPORTTIME_PATTERN.match(line)
+            ),
+            file=sys.stderr,
+        )
+    return profile
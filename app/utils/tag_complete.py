@@ -0,0 +1,250 @@
+import bisect
+import heapq
+import re
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+
+from utils.tag_index import TagInfo, normalize_tag
+
+# カタカナ → ひらがな（「ネコ」と「ねこ」を同じ読みとして扱う）
+_KANA_FOLD = str.maketrans(
+    {chr(c): chr(c - 0x60) for c in range(ord("ァ"), ord("ヶ") + 1)}
+)
+# 検索式の末尾で入力中の語（直前の - は否定なので語に含めない）
+LAST_TERM_PATTERN = re.compile(r"(?:^|(?<=[\s(]))-?([^\s()]*)$")
+# 一致する件数がこれより多い接頭辞は、上位の結果をキャッシュする
+RANGE_CACHE_THRESHOLD = 256
+# キャッシュに持つ候補数（表示件数より多めに持ち、重複除去に備える）
+CACHED_CANDIDATES = 40
+# 構築時に上位を求めておく接頭辞の長さ（1〜2文字目の入力で待たせない）
+WARM_PREFIX_LENGTH = 2
+# 上位の候補を持っておく区画の大きさ（キーの数）
+RANK_BUCKET_SIZE = 256
+# 接頭辞の範囲の末尾を求めるための番兵
+_KEY_END = "\U0010ffff"
+
+
+def completion_key(name: str) -> str:
+    """補完の照合に使う名前（NFKC・小文字・ひらがなに揃える）"""
+    if name.isascii():  # 大半を占める英語のタグは正規化を省く
+        return name.strip().lower().replace(" ", "_")
+    return normalize_tag(name).translate(_KANA_FOLD)
+
+
+def split_last_term(text: str) -> tuple[str, str]:
+    """検索式を (入力中の語より前, 入力中の語) に分ける"""
+    match = LAST_TERM_PATTERN.search(text)
+    return text[: match.start(1)], match.group(1)
+
+
+@dataclass(slots=True)
+class TagSuggestion:
+    id: int
+    tag: str
+    tag_ja: str | None
+    count: int
+
+
+class TagCompleter:
+    """tag と tag_ja の接頭辞からタグを補完する
+
+    照合用の名前を昇順に並べたリストを二分探索し、一致した範囲から
+    使用回数の多い順に返す。一致が多い短い接頭辞は上位の結果をキャッシュし、
+    使用回数やタグが増えたときは影響する接頭辞のキャッシュだけを捨てる。
+    キーの並びは区画に分けて区画ごとの上位を持ち、キャッシュのない広い範囲は
+    範囲内の区画の上位と両端の残りだけから順位を求める。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys: list[str] = []
+        self._key_tags: list[int] = []
+        self._tags: dict[int, TagInfo] = {}
+        self._counts: dict[int, int] = {}
+        self._cache: dict[str, list[int]] = {}
+        # 区画の先頭のキーと、区画内のタグの上位（使用回数の多い順）
+        self._bounds: list[str] = [""]
+        self._bucket_tops: list[list[int]] = [[]]
+
+    def __len__(self) -> int:
+        return len(self._tags)
+
+    def unknown_tags(self, tag_ids) -> list[int]:
+        """登録していないタグの id"""
+        with self._lock:
+            return sorted({int(t) for t in tag_ids} - self._tags.keys())
+
+    def build(self, tags: list[TagInfo], counts: dict[int, int]) -> None:
+        """全タグから作り直す"""
+        keys: list[str] = []
+        key_tags: list[int] = []
+        for tag in tags:
+            if not tag.disable:
+                for name in {tag.tag, tag.tag_ja} - {None, ""}:
+                    keys.append(completion_key(name))
+                    key_tags.append(tag.id)
+        # タプルの比較を避け、キーだけで並べ替えた順番を求める
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        with self._lock:
+            self._keys = [keys[i] for i in order]
+            self._key_tags = [key_tags[i] for i in order]
+            self._tags = {tag.id: tag for tag in tags}
+            self._counts = dict(counts)
+            self._cache.clear()
+            self._warm()
+
+    def _warm(self) -> None:
+        key_counts = np.fromiter(
+            (self._counts.get(t, 0) for t in self._key_tags),
+            dtype=np.int64,
+            count=len(self._key_tags),
+        )
+        for length in range(1, WARM_PREFIX_LENGTH + 1):
+            for prefix in dict.fromkeys(key[:length] for key in self._keys):
+                lo, hi = self._range(prefix)
+                if hi - lo > RANGE_CACHE_THRESHOLD:
+                    counts = key_counts[lo:hi]
+                    n = min(CACHED_CANDIDATES, len(counts))
+                    top = np.argpartition(-counts, n - 1)[:n]
+                    # 使用回数の多い順、同数ならキーの順
+                    top = top[np.lexsort((top, -counts[top]))]
+                    self._cache[prefix] = list(
+                        dict.fromkeys(self._key_tags[lo + i] for i in top)
+                    )
+        self._build_buckets(key_counts)
+
+    def _build_buckets(self, key_counts: np.ndarray) -> None:
+        # 同じキーが区画の境目をまたがないよう、境目は異なるキーで区切る
+        bounds = [""]
+        for pos in range(RANK_BUCKET_SIZE, len(self._keys), RANK_BUCKET_SIZE):
+            if self._keys[pos] != bounds[-1]:
+                bounds.append(self._keys[pos])
+        starts = [bisect.bisect_left(self._keys, bound) for bound in bounds]
+        bucket_of = np.searchsorted(starts, np.arange(len(key_counts)), "right")
+        # 区画ごとに、使用回数の多い順（同数ならキーの順）に並べる
+        order = np.lexsort((-key_counts, bucket_of)).tolist()
+        tops = []
+        for start, end in zip(starts, [*starts[1:], len(order)], strict=True):
+            top: dict[int, None] = {}
+            for i in order[start:end]:
+                top[self._key_tags[i]] = None
+                if len(top) >= CACHED_CANDIDATES:
+                    break
+            tops.append(list(top))
+        self._bounds = bounds
+        self._bucket_tops = tops
+
+    def add_tags(self, tags: list[TagInfo]) -> None:
+        """新しいタグを挿入（登録済みのタグは無視）"""
+        with self._lock:
+            for tag in tags:
+                if tag.id in self._tags:
+                    continue
+                self._tags[tag.id] = tag
+                if tag.disable:
+                    continue
+                for name in {tag.tag, tag.tag_ja} - {None, ""}:
+                    key = completion_key(name)
+                    pos = bisect.bisect_left(self._keys, key)
+                    self._keys.insert(pos, key)
+                    self._key_tags.insert(pos, tag.id)
+                    self._rerank_cached(key, tag.id)
+
+    def add_usage(self, counts: dict[int, int]) -> None:
+        """タグの使用回数を加算"""
+        with self._lock:
+            for tag_id, count in counts.items():
+                self._counts[tag_id] = self._counts.get(tag_id, 0) + count
+                tag = self._tags.get(tag_id)
+                if tag is not None and not tag.disable:
+                    for name in {tag.tag, tag.tag_ja} - {None, ""}:
+                        self._rerank_cached(completion_key(name), tag_id)
+
+    def _rerank_cached(self, key: str, tag_id: int) -> None:
+        """key の区画と接頭辞のキャッシュに tag_id の新しい使用回数を反映
+
+        使用回数は増えるだけなので、キャッシュの最下位を超えたタグだけを
+        入れ替えれば、範囲全体を数え直さなくても上位は正しいまま保たれる。
+        """
+        bucket = bisect.bisect_right(self._bounds, key) - 1
+        self._rerank(self._bucket_tops[bucket], tag_id)
+        if not self._cache:
+            return
+        for end in range(1, len(key) + 1):
+            ranked = self._cache.get(key[:end])
+            if ranked is not None:
+                self._rerank(ranked, tag_id)
+
+    def _rerank(self, ranked: list[int], tag_id: int) -> None:
+        count = self._counts.get(tag_id, 0)
+        if tag_id not in ranked:
+            last = self._counts.get(ranked[-1], 0) if ranked else -1
+            if len(ranked) >= CACHED_CANDIDATES and count <= last:
+                return
+            ranked.append(tag_id)
+        ranked.sort(key=lambda t: -self._counts.get(t, 0))
+        del ranked[CACHED_CANDIDATES:]
+
+    def suggest(self, prefix: str, limit: int = 20) -> list[TagSuggestion]:
+        """接頭辞に一致するタグを使用回数の多い順に最大 limit 件返す"""
+        prefix = completion_key(prefix)
+        if not prefix:
+            return []
+        with self._lock:
+            lo, hi = self._range(prefix)
+            if hi - lo > RANGE_CACHE_THRESHOLD and limit <= CACHED_CANDIDATES:
+                ranked = self._cache.get(prefix)
+                if ranked is None:
+                    ranked = self._rank_buckets(prefix, lo, hi)
+                    self._cache[prefix] = ranked
+            else:
+                ranked = self._rank(lo, hi, limit * 2)
+            return [
+                TagSuggestion(
+                    tag_id,
+                    self._tags[tag_id].tag,
+                    self._tags[tag_id].tag_ja,
+                    self._counts.get(tag_id, 0),
+                )
+                for tag_id in ranked[:limit]
+            ]
+
+    def _range(self, prefix: str) -> tuple[int, int]:
+        lo = bisect.bisect_left(self._keys, prefix)
+        return lo, bisect.bisect_left(self._keys, prefix + _KEY_END, lo)
+
+    def _rank(self, lo: int, hi: int, n: int) -> list[int]:
+        """範囲内のタグを使用回数の多い順に重複なく並べる"""
+        counts, key_tags = self._counts, self._key_tags
+        best = heapq.nlargest(
+            n, range(lo, hi), key=lambda i: counts.get(key_tags[i], 0)
+        )
+        return list(dict.fromkeys(key_tags[i] for i in best))
+
+    def _rank_buckets(self, prefix: str, lo: int, hi: int) -> list[int]:
+        """範囲内の区画の上位と両端の残りから CACHED_CANDIDATES 件を求める
+
+        区画の上位は使用回数の順に並んでいるので、併合して先頭から取れば
+        範囲内のキーを全部数えなくても上位は範囲全体を数えた場合と一致する。
+        """
+        first = bisect.bisect_left(self._bounds, prefix)
+        last = bisect.bisect_left(self._bounds, prefix + _KEY_END) - 1
+        if first >= last:  # 範囲に収まる区画がない
+            return self._rank(lo, hi, CACHED_CANDIDATES)
+        inner_lo = bisect.bisect_left(self._keys, self._bounds[first], lo, hi)
+        inner_hi = bisect.bisect_left(self._keys, self._bounds[last], lo, hi)
+        counts = self._counts
+        merged = heapq.merge(
+            self._rank(lo, inner_lo, CACHED_CANDIDATES),
+            self._rank(inner_hi, hi, CACHED_CANDIDATES),
+            *self._bucket_tops[first:last],
+            key=lambda t: -counts.get(t, 0),
+        )
+        ranked: dict[int, None] = {}
+        for tag_id in merged:
+            ranked[tag_id] = None
+            if len(ranked) >= CACHED_CANDIDATES:
+                break
+        return list(ranked)
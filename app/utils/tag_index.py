@@ -0,0 +1,259 @@
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass
+
+import numpy as np
+
+EMPTY = np.empty(0, dtype=np.int64)
+
+# 括弧は単独のトークン。ただし saber_(fate) のように語の途中の括弧は名前の一部
+TOKEN_PATTERN = re.compile(r"\(|\)|[^\s()]+(?:\([^\s()]*\)[^\s()]*)*")
+OPERATORS = {"AND": "and", "&": "and", "OR": "or", "|": "or", "NOT": "not"}
+
+
+class TagQueryError(ValueError):
+    """タグの検索式が読めない"""
+
+
+@dataclass(slots=True)
+class TagInfo:
+    id: int
+    tag: str
+    tag_ja: str | None
+    is_r18: bool
+    disable: bool
+
+
+def normalize_tag(name: str) -> str:
+    """全角・半角や大文字小文字の違いを吸収した照合用の名前"""
+    return unicodedata.normalize("NFKC", name).strip().lower().replace(" ", "_")
+
+
+def parse_tag_query(text: str):
+    """タグの検索式を構文木にする
+
+    例: ``cat dog``（AND）、``cat OR dog``、``cat -dog``、``NOT (cat | dog)``。
+    演算子の優先順位は NOT > AND > OR。構文木は
+    ("tag", name) / ("not", node) / ("and", [nodes]) / ("or", [nodes])。
+    """
+    tokens = TOKEN_PATTERN.findall(text)
+    if not tokens:
+        raise TagQueryError("検索式が空です")
+    pos = 0
+
+    def peek():
+        return tokens[pos] if pos < len(tokens) else None
+
+    def take():
+        nonlocal pos
+        pos += 1
+        return tokens[pos - 1]
+
+    def parse_or():
+        nodes = [parse_and()]
+        while OPERATORS.get(peek()) == "or":
+            take()
+            nodes.append(parse_and())
+        return nodes[0] if len(nodes) == 1 else ("or", nodes)
+
+    def parse_and():
+        nodes = [parse_not()]
+        while peek() is not None and peek() != ")" and OPERATORS.get(peek()) != "or":
+            if OPERATORS.get(peek()) == "and":
+                take()
+            nodes.append(parse_not())
+        return nodes[0] if len(nodes) == 1 else ("and", nodes)
+
+    def parse_not():
+        token = peek()
+        if token is None:
+            raise TagQueryError("式が途中で終わっています")
+        if token == "-" or OPERATORS.get(token) == "not":
+            take()
+            return ("not", parse_not())
+        if token.startswith("-") and len(token) > 1:
+            take()
+            return ("not", ("tag", token[1:]))
+        if token == "(":
+            take()
+            node = parse_or()
+            if take_optional(")") is None:
+                raise TagQueryError("閉じ括弧がありません")
+            return node
+        if token == ")" or token in OPERATORS:
+            raise TagQueryError(f"予期しない '{token}'")
+        return ("tag", take())
+
+    def take_optional(expected):
+        return take() if peek() == expected else None
+
+    node = parse_or()
+    if peek() is not None:
+        raise TagQueryError(f"予期しない '{peek()}'")
+    return node
+
+
+# 昇順で重複のない配列どうしの集合演算。
+# np.intersect1d などは入力を毎回ソートし直すため、二分探索とマージで済ませる
+
+
+def _contains(haystack: np.ndarray, needles: np.ndarray) -> np.ndarray:
+    """needles の各要素が haystack に含まれるか"""
+    if len(haystack) == 0:
+        return np.zeros(len(needles), dtype=bool)
+    pos = np.searchsorted(haystack, needles)
+    return haystack[np.minimum(pos, len(haystack) - 1)] == needles
+
+
+def intersect_sorted(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    if len(a) > len(b):
+        a, b = b, a
+    return a[_contains(b, a)]
+
+
+def difference_sorted(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return a[~_contains(b, a)] if len(a) and len(b) else a
+
+
+def union_sorted(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    if len(a) == 0 or len(b) == 0:
+        return b if len(a) == 0 else a
+    merged = np.concatenate([a, b])
+    merged.sort(kind="stable")  # 整列済みの2つの並びはマージだけで済む
+    return merged[np.concatenate(([True], merged[1:] != merged[:-1]))]
+
+
+def _sorted_unique(ids) -> np.ndarray:
+    ids = np.sort(np.asarray(ids, dtype=np.int64))
+    return ids[np.concatenate(([True], ids[1:] != ids[:-1]))] if len(ids) else ids
+
+
+class TagIndex:
+    """タグ id → 画像 id の昇順配列による転置索引
+
+    image_tags を一括で読み込んで作り、書き込みの通知で差分を反映する。
+    AND / OR / NOT は昇順配列の積・和・差で求める。無効なタグは一致せず、
+    R18の画像（画像自体のフラグかR18タグを持つもの）は既定で結果から除く。
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings: dict[int, np.ndarray] = {}
+        self._tags: dict[int, TagInfo] = {}
+        self._names: dict[str, int] = {}
+        # 登録済みの画像（NOT の全体集合）と、画像自体に R18 フラグがあるもの
+        self._images = EMPTY
+        self._r18_images = EMPTY
+        # 削除した画像。id が再利用されたときだけ転置リストから取り除く
+        self._removed = EMPTY
+
+    @property
+    def max_image_id(self) -> int:
+        with self._lock:
+            return int(self._images[-1]) if len(self._images) else 0
+
+    def __len__(self) -> int:
+        return len(self._images)
+
+    def postings(self, tag_id: int) -> np.ndarray:
+        with self._lock:
+            return self._postings.get(tag_id, EMPTY)
+
+    # ---------------- 構築・更新 ----------------
+
+    def set_tags(self, tags) -> None:
+        """タグの名前とフラグを登録（既存のタグは置き換える）"""
+        with self._lock:
+            for tag in tags:
+                self._tags[tag.id] = tag
+                for name in (tag.tag, tag.tag_ja):
+                    if name:
+                        self._names[normalize_tag(name)] = tag.id
+
+    def add_images(self, image_ids: np.ndarray, r18_ids: np.ndarray = EMPTY) -> None:
+        """画像を全体集合に加える"""
+        image_ids = _sorted_unique(image_ids)
+        with self._lock:
+            reused = intersect_sorted(self._removed, image_ids)
+            if len(reused):
+                self._purge(reused)
+            self._images = union_sorted(self._images, image_ids)
+            self._r18_images = union_sorted(self._r18_images, _sorted_unique(r18_ids))
+
+    def add_pairs(self, image_ids: np.ndarray, tag_ids: np.ndarray) -> None:
+        """(画像, タグ) の組をまとめて転置リストに加える"""
+        image_ids = np.asarray(image_ids, dtype=np.int64)
+        tag_ids = np.asarray(tag_ids, dtype=np.int64)
+        if len(image_ids) == 0:
+            return
+        order = np.lexsort((image_ids, tag_ids))
+        image_ids, tag_ids = image_ids[order], tag_ids[order]
+        tags, starts = np.unique(tag_ids, return_index=True)
+        with self._lock:
+            for tag_id, chunk in zip(tags.tolist(), np.split(image_ids, starts[1:])):
+                chunk = chunk[np.concatenate(([True], chunk[1:] != chunk[:-1]))]
+                self._postings[tag_id] = union_sorted(self.postings(tag_id), chunk)
+
+    def remove_images(self, image_ids) -> None:
+        image_ids = _sorted_unique(list(image_ids))
+        with self._lock:
+            self._images = difference_sorted(self._images, image_ids)
+            self._r18_images = difference_sorted(self._r18_images, image_ids)
+            self._removed = union_sorted(self._removed, image_ids)
+
+    def _purge(self, image_ids: np.ndarray) -> None:
+        for tag_id, ids in self._postings.items():
+            self._postings[tag_id] = difference_sorted(ids, image_ids)
+        self._removed = difference_sorted(self._removed, image_ids)
+
+    # ---------------- 検索 ----------------
+
+    def unknown_tags(self, tag_ids) -> list[int]:
+        """名前を登録していないタグの id"""
+        with self._lock:
+            return sorted({int(t) for t in tag_ids} - self._tags.keys())
+
+    def tag_id(self, name: str) -> int | None:
+        """有効なタグの id（無効なタグや未登録なら None）"""
+        tag_id = self._names.get(normalize_tag(name))
+        if tag_id is None or self._tags[tag_id].disable:
+            return None
+        return tag_id
+
+    def excluded_images(self) -> np.ndarray:
+        """R18として検索結果から除く画像"""
+        with self._lock:
+            r18_tags = [t.id for t in self._tags.values() if t.is_r18]
+            excluded = self._r18_images
+            for tag_id in r18_tags:
+                excluded = union_sorted(excluded, self.postings(tag_id))
+            return excluded
+
+    def search(self, text: str, include_r18: bool = False) -> np.ndarray:
+        """検索式に一致する画像 id を昇順で返す"""
+        node = parse_tag_query(text)
+        with self._lock:
+            result = intersect_sorted(self._evaluate(node), self._images)
+            if not include_r18:
+                result = difference_sorted(result, self.excluded_images())
+            return result
+
+    def _evaluate(self, node) -> np.ndarray:
+        kind, arg = node
+        if kind == "tag":
+            tag_id = self.tag_id(arg)
+            return EMPTY if tag_id is None else self.postings(tag_id)
+        if kind == "not":
+            return difference_sorted(self._images, self._evaluate(arg))
+        # 小さい集合から積を取ると途中の配列が小さく済む
+        parts = sorted((self._evaluate(n) for n in arg), key=len)
+        result = parts[0]
+        for part in parts[1:]:
+            if kind == "and":
+                if len(result) == 0:
+                    break
+                result = intersect_sorted(result, part)
+            else:
+                result = union_sorted(result, part)
+        return result
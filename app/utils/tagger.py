@@ -0,0 +1,171 @@
+import hashlib
+import importlib
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from multiprocessing import Pool, cpu_count, get_context
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from config import EMBEDDING_DIM, TAGGER_BATCH_SIZE
+from utils.parallel import bounded_imap, chunked
+
+if TYPE_CHECKING:
+    from multiprocessing.queues import SimpleQueue
+    from typing import Self
+
+# 名前で指定できるタガー。"module:Class" の形式でプラグインを直接指定してもよい
+TAGGERS = {
+    "hash": "utils.tagger:HashTagger",
+}
+
+
+@dataclass(slots=True)
+class TaggerResult:
+    tags: list[str]
+    embedding: np.ndarray | None = None
+
+
+class Tagger(ABC):
+    """自動タグ付けのプラグイン
+
+    ワーカープロセスごとに1回だけ作られ、load() でモデルを読み込んだ後は
+    tag_batch() が画像のまとまりごとに呼ばれる。読めなかった画像の結果は None にする。
+    """
+
+    name = "base"
+
+    def load(self) -> None:
+        pass
+
+    @abstractmethod
+    def tag_batch(self, image_paths: list[Path]) -> list[TaggerResult | None]: ...
+
+
+class HashTagger(Tagger):
+    """ファイルの内容から決定的にタグと埋め込みを作る、テスト・計測用のタガー
+
+    モデルを使わないため結果に意味はないが、同じ画像には常に同じ結果を返す。
+    cost_ms で1枚あたりの推論時間を模擬できる。
+    """
+
+    name = "hash"
+    VOCABULARY = tuple(f"hash_{i:03d}" for i in range(256))
+    TAGS_PER_IMAGE = 8
+
+    def __init__(self, cost_ms: float = 0.0):
+        self.cost_ms = cost_ms
+
+    def tag_batch(self, image_paths: list[Path]) -> list[TaggerResult | None]:
+        results = []
+        for path in image_paths:
+            try:
+                digest = hashlib.sha256(Path(path).read_bytes()).digest()
+            except OSError:
+                results.append(None)
+                continue
+            rng = np.random.default_rng(int.from_bytes(digest[:8], "little"))
+            picks = rng.choice(len(self.VOCABULARY), self.TAGS_PER_IMAGE, False)
+            embedding = rng.standard_normal(EMBEDDING_DIM).astype(np.float32)
+            results.append(
+                TaggerResult(sorted(self.VOCABULARY[i] for i in picks), embedding)
+            )
+        if self.cost_ms:
+            time.sleep(self.cost_ms * len(image_paths) / 1000)
+        return results
+
+
+def load_tagger_class(spec: str) -> type[Tagger]:
+    """タガーの名前か "module:Class" からクラスを取り出す"""
+    module_name, _, class_name = TAGGERS.get(spec, spec).partition(":")
+    if not class_name:
+        raise ValueError(f"不明なタガーです: {spec}（{', '.join(TAGGERS)}）")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+# ワーカープロセスごとのタガー（初期化時に1回だけ作る）
+_worker_tagger: Tagger | None = None
+# 初期化に失敗した理由。初期化の例外でワーカーが落ちると Pool が作り直し続けるので、
+# 例外は投げずに覚えておき、タスクを受けたときに報告する
+_worker_error: str | None = None
+
+
+def _init_worker(spec: str, options: dict, ready: "SimpleQueue") -> None:
+    """タガーを読み込み、成否（失敗なら理由、成功なら None）を ready に送る"""
+    global _worker_tagger, _worker_error
+    try:
+        _worker_tagger = load_tagger_class(spec)(**options)
+        _worker_tagger.load()
+    except Exception as e:  # noqa: BLE001 プラグインの例外はすべて親に報告する
+        _worker_error = f"{type(e).__name__}: {e}"
+    ready.put(_worker_error)
+
+
+def _tag_batch(task: tuple[list[int], list[Path]]) -> list[TaggerResult | None]:
+    if _worker_error is not None:
+        raise RuntimeError(f"タガーの初期化に失敗しています: {_worker_error}")
+    return _worker_tagger.tag_batch(task[1])
+
+
+def _report_failure(task: tuple[list[int], list[Path]], error: Exception) -> None:
+    image_ids = task[0]
+    print(
+        f"⚠ タグ付けに失敗しました（画像 id {image_ids[0]}〜{image_ids[-1]}、"
+        f"{len(image_ids)} 件は次回に再試行）: {error}"
+    )
+
+
+class TaggerPool:
+    """タガーを常駐させたプロセスプール
+
+    プロセスとモデルは close() まで使い回すので、呼び出しのたびに読み込み直さない。
+    """
+
+    def __init__(
+        self,
+        spec: str = "hash",
+        processes: int | None = None,
+        batch_size: int = TAGGER_BATCH_SIZE,
+        **options,
+    ):
+        self.name = load_tagger_class(spec).name
+        self.batch_size = batch_size
+        self.processes = processes or cpu_count()
+        ready = get_context().SimpleQueue()
+        self._pool = Pool(self.processes, _init_worker, (spec, options, ready))
+        # モデルを読めないまま全件を流さないよう、全ワーカーの読み込みを待って確かめる
+        errors = [ready.get() for _ in range(self.processes)]
+        error = next((e for e in errors if e is not None), None)
+        if error is not None:
+            self._pool.terminate()
+            self._pool.join()
+            raise RuntimeError(f"タガー {spec} を読み込めません: {error}")
+
+    def __enter__(self) -> "Self":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._pool.close()
+        self._pool.join()
+
+    def iter_results(
+        self, images: Iterable[tuple[int, Path]]
+    ) -> Iterator[list[tuple[int, TaggerResult | None]]]:
+        """(画像id, パス) をまとめてワーカーに渡し、バッチごとに結果を投入順で返す"""
+        batches = (
+            ([i for i, _ in chunk], [p for _, p in chunk])
+            for chunk in chunked(images, self.batch_size)
+        )
+        tasks = bounded_imap(
+            self._pool, _tag_batch, batches, self.processes * 2, _report_failure
+        )
+        for (image_ids, _), results in tasks:
+            if results is None:  # バッチごと失敗したときは全件を未処理のままにする
+                results = [None] * len(image_ids)
+            yield list(zip(image_ids, results))